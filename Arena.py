@@ -1,9 +1,32 @@
 import logging
+import multiprocessing
+import sys
 
 from tqdm import tqdm
 
 log = logging.getLogger(__name__)
 
+arenaWorker = None  # the Arena of an arena worker process, see arenaWorkerInit
+
+
+def arenaWorkerInit(player1, player2, game):
+    """
+    Builds the players of an arena worker process from their specs, once for
+    all games the worker plays.
+    """
+    global arenaWorker
+    torch = sys.modules.get('torch')
+    if torch is not None:
+        torch.set_num_threads(1)  # the workers already use every core
+    arenaWorker = Arena(player1.build(game), player2.build(game), game)
+
+
+def arenaWorkerGame(swapped):
+    """
+    Plays one game in an arena worker, see Arena.playGameSwapped.
+    """
+    return arenaWorker.playGameSwapped(swapped)
+
 
 class Arena():
     """
@@ -21,6 +44,10 @@ class Arena():
 
         see othello/OthelloPlayers.py for an example. See pit.py for pitting
         human players/other baselines with each other.
+
+        A player can also be given as a spec, an object with a build(game)
+        method returning the player (see MCTS.MCTSPlayerSpec). Specs are
+        picklable, which playGames needs to play games in other processes.
         """
         self.player1 = player1
         self.player2 = player2
@@ -78,16 +105,50 @@ class Arena():
             self.display(board)
         return curPlayer * self.game.getGameEnded(board, curPlayer)
 
-    def playGames(self, num, verbose=False):
+    def playGameSwapped(self, swapped, verbose=False):
+        """
+        Plays one game, with player2 moving first if swapped.
+
+        Returns:
+            the result of the game for player1, as playGame returns it
+        """
+        if swapped:
+            self.player1, self.player2 = self.player2, self.player1
+        try:
+            result = self.playGame(verbose=verbose)
+        finally:
+            if swapped:
+                self.player1, self.player2 = self.player2, self.player1
+        return -result if swapped else result
+
+    def playGames(self, num, verbose=False, numWorkers=1, stop=None):
         """
         Plays num games in which player1 starts num/2 games and player2 starts
         num/2 games.
 
+        With numWorkers > 1 the games are spread over a pool of numWorkers
+        processes. Both players must then be specs: every worker builds its
+        own players once and keeps them for all the games it plays.
+
+        stop is an optional function called with (oneWon, twoWon, draws)
+        after every game; once it returns True no more games are played. The
+        starting player then alternates from game to game, so the players
+        have started the same number of games (give or take one) whenever the
+        match stops.
+
         Returns:
             oneWon: games won by player1
             twoWon: games won by player2
             draws:  games won by nobody
         """
+        if numWorkers > 1:
+            return self.playGamesParallel(num, numWorkers, stop)
+        if hasattr(self.player1, 'build'):
+            self.player1 = self.player1.build(self.game)
+        if hasattr(self.player2, 'build'):
+            self.player2 = self.player2.build(self.game)
+        if stop is not None:
+            return self.playGamesAlternating(num, verbose, stop)
 
         num = int(num / 2)
         oneWon = 0
@@ -114,3 +175,57 @@ class Arena():
                 draws += 1
 
         return oneWon, twoWon, draws
+
+    def playGamesAlternating(self, num, verbose, stop):
+        """
+        playGames with a stop function: player1 starts the even games,
+        player2 the odd ones.
+        """
+        oneWon = 0
+        twoWon = 0
+        draws = 0
+        for game in tqdm(range(int(num / 2) * 2), desc="Arena.playGames"):
+            gameResult = self.playGameSwapped(game % 2 == 1, verbose=verbose)
+            if gameResult == 1:
+                oneWon += 1
+            elif gameResult == -1:
+                twoWon += 1
+            else:
+                draws += 1
+            if stop(oneWon, twoWon, draws):
+                break
+
+        return oneWon, twoWon, draws
+
+    def playGamesParallel(self, num, numWorkers, stop=None):
+        """
+        playGames over a pool of numWorkers processes. Each game result is
+        counted for player1 or player2 exactly as playGames counts it. When
+        stop ends the match, the games still being played are dropped.
+        """
+        num = int(num / 2)
+        oneWon = 0
+        twoWon = 0
+        draws = 0
+        if stop is None:
+            order = [False] * num + [True] * num
+        else:
+            order = [game % 2 == 1 for game in range(2 * num)]
+        context = multiprocessing.get_context('spawn')
+        with context.Pool(numWorkers, initializer=arenaWorkerInit,
+                          initargs=(self.player1, self.player2, self.game)) as pool:
+            games = pool.imap_unordered(arenaWorkerGame, order)
+            for gameResult in tqdm(games, total=2 * num, desc="Arena.playGames"):
+                if gameResult == 1:
+                    oneWon += 1
+                elif gameResult == -1:
+                    twoWon += 1
+                else:
+                    draws += 1
+                if stop is not None and stop(oneWon, twoWon, draws):
+                    break
+
+        if stop is None:
+            self.player1, self.player2 = self.player2, self.player1
+
+        return oneWon, twoWon, draws
@@ -1,33 +1,696 @@
 import logging
+import math
+import multiprocessing
 import os
+import queue
+import re
+import shutil
 import sys
+import tempfile
+import threading
+import traceback
 from collections import deque
-from pickle import Pickler, Unpickler
-from random import shuffle
+from pickle import Unpickler
 
 import numpy as np
 from tqdm import tqdm
 
 from Arena import Arena
-from MCTS import MCTS
+from EvalCache import CachedNNet, EvalCache, SharedEvalCache
+from ExampleStore import ExampleStore
+from MCTS import MCTSPlayer, MCTSPlayerSpec, NodeMCTS, mctsClass
+from RemoteSelfPlay import Coordinator, RemoteWorker
+from ReplayBuffer import ReplayBuffer
 
 log = logging.getLogger(__name__)
 
 
-class Coach():
+def episodeSeed(seed, iteration, episode):
     """
-    This class executes the self-play + learning. It uses the functions defined
-    in Game and NeuralNet. args are specified in main.py.
+    Seed of the random number generator for one self-play episode. It only
+    depends on args.seed, the iteration and the episode number, so a run
+    plays the same games whichever worker picks up which episode.
+    """
+    return int(np.random.SeedSequence([seed, iteration, episode]).generate_state(1)[0])
+
+
+def trainingForms(game, args, canonicalBoard, pi):
+    """
+    Returns the (board, pi) forms of a position that go into the training
+    examples: all of its symmetries, or with args.lazySymmetries only the
+    position itself, the replay buffer drawing a random symmetry of it every
+    time it is sampled (see Coach.newReplayBuffer).
+    """
+    if args.get('lazySymmetries', False):
+        return [(np.asarray(canonicalBoard), pi)]
+    return game.getSymmetries(canonicalBoard, pi)
+
+
+def playEpisodes(player, lockstep, iteration, episodes):
+    """
+    Plays the episodes (numbers) of iteration with the SelfPlayer player, as
+    SelfPlayer.executeEpisode does, or all at once with LockstepSelfPlay lockstep
+    if args.lockstepGames > 1, each seeded by episodeSeed.
+
+    Yields:
+        (episode, trainExamples) for every episode as soon as it ends
+    """
+    args = player.args
+    player.setSelfPlayVersion(iteration)
+    if args.get('lockstepGames', 1) > 1:
+        seeded = ((episode, episodeSeed(args.get('seed', 0), iteration, episode)) for episode in episodes)
+        yield from lockstep.play(seeded)
+        return
+    for episode in episodes:
+        np.random.seed(episodeSeed(args.get('seed', 0), iteration, episode))
+        player.mcts = player.newMCTS(player.selfPlayNet)
+        yield episode, player.executeEpisode()
+
+
+def selfPlayWorker(game, nnetClass, args, tasks, episodes, results, evalCache=None):
+    """
+    Main loop of a self-play worker process. For every iteration it gets the
+    network weights once from its own tasks queue, then plays the episodes it
+    takes from the shared episodes queue until it takes a None, putting
+    (episode, examples) on results. A None task ends the worker. evalCache
+    is the SharedEvalCache of the pool, if any.
+    """
+    torch = sys.modules.get('torch')
+    if torch is not None:
+        torch.set_num_threads(1)  # the workers already use every core
+    try:
+        player = SelfPlayer(game, nnetClass(game), args)
+        if evalCache is not None:
+            player.useEvalCache(evalCache)
+        lockstep = LockstepSelfPlay(game, player.selfPlayNet, args)
+        while True:
+            task = tasks.get()
+            if task is None:
+                return
+            iteration, weights = task
+            player.nnet.restore(weights)
+            for episode, examples in playEpisodes(player, lockstep, iteration, iter(episodes.get, None)):
+                results.put((episode, examples))
+    except Exception:
+        results.put((None, traceback.format_exc()))
+
+
+def remoteSelfPlayWorker(address, authkey, threads=0):
+    """
+    Main loop of a self-play worker on another machine, see RemoteSelfPlay:
+    plays the episodes the coordinator at address hands out until it stops.
+    With threads > 0 the network uses that many threads (torch only).
+    """
+    worker = RemoteWorker(address, authkey)
+    try:
+        game, nnetClass, args = worker.register()
+        torch = sys.modules.get('torch')
+        if torch is not None and threads > 0:
+            torch.set_num_threads(threads)
+        player = SelfPlayer(game, nnetClass(game), args)
+        lockstep = LockstepSelfPlay(game, player.selfPlayNet, args)
+        for iteration, episodes, weights in worker.jobs(args.get('lockstepGames', 1)):
+            if weights is not None:
+                log.info(f'Playing iteration {iteration} with new weights')
+                player.nnet.restore(weights)
+            for episode, examples in playEpisodes(player, lockstep, iteration, episodes):
+                worker.send(iteration, episode, examples)
+    except (EOFError, ConnectionError):
+        log.info('The coordinator has gone')
+    finally:
+        worker.close()
+
+
+class SelfPlayWorkers():
+    """
+    Persistent pool of args.numSelfPlayWorkers processes playing self-play
+    episodes. The network weights are sent to every worker once per
+    iteration (see NeuralNet.snapshot) and episodes are handed out one at a
+    time, so faster workers play more of them.
+
+    With args.evalCacheSize and args.evalCacheShared the workers share one
+    SharedEvalCache, evalCache, instead of having a cache each.
+    """
+
+    def __init__(self, game, nnet, args):
+        context = multiprocessing.get_context('spawn')
+        self.episodes = context.Queue()
+        self.results = context.Queue()
+        self.tasks = []
+        self.processes = []
+        self.evalCache = newSharedEvalCache(game, args)
+        for _ in range(args.numSelfPlayWorkers):
+            tasks = context.Queue()
+            process = context.Process(target=selfPlayWorker, daemon=True,
+                                      args=(game, nnet.__class__, args, tasks, self.episodes, self.results,
+                                            self.evalCache))
+            process.start()
+            self.tasks.append(tasks)
+            self.processes.append(process)
+
+    def play(self, iteration, nnet, numEps):
+        """
+        Plays numEps episodes with the weights of nnet and yields the examples
+        of every episode as soon as it finishes.
+        """
+        weights = nnet.snapshot()
+        for tasks in self.tasks:
+            tasks.put((iteration, weights))
+        for episode in range(numEps):
+            self.episodes.put(episode)
+        for _ in self.tasks:
+            self.episodes.put(None)
+
+        for _ in range(numEps):
+            episode, examples = self.results.get()
+            if episode is None:
+                raise RuntimeError('Self-play worker failed:\n' + examples)
+            yield examples
+
+    def close(self):
+        for tasks in self.tasks:
+            tasks.put(None)
+        for process in self.processes:
+            process.join(timeout=10)
+            if process.is_alive():
+                process.terminate()
+        if self.evalCache is not None:
+            self.evalCache.close()
+
+
+def newSharedEvalCache(game, args):
+    """
+    Returns the SharedEvalCache for the self-play processes of a pool, or
+    None unless args.evalCacheSize and args.evalCacheShared are set.
+    """
+    if not (args.get('evalCacheSize', 0) and args.get('evalCacheShared', False)):
+        return None
+    return SharedEvalCache(args.evalCacheSize, game.getActionSize())
+
+
+def putUnlessStopped(q, item, stop):
+    """
+    Puts item on the bounded queue q, waiting while it is full, unless stop
+    is set first. Returns whether the item was put.
+    """
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+def pipelineActor(game, nnetClass, args, actor, models, examples, stop, evalCache=None):
+    """
+    Main loop of a self-play actor of Pipeline. It plays episodes nonstop
+    with the latest accepted network, taking the (version, weights) put on
+    its own models queue between episodes, and puts (version, examples) of
+    every episode on the shared bounded examples queue, waiting while it is
+    full. The actor ends when stop is set. evalCache is the SharedEvalCache
+    of the actors, if any.
+    """
+    torch = sys.modules.get('torch')
+    if torch is not None:
+        torch.set_num_threads(1)  # the learner trains on the other cores
+    try:
+        player = SelfPlayer(game, nnetClass(game), args)
+        if evalCache is not None:
+            player.useEvalCache(evalCache)
+        version = None
+
+        def refresh():
+            nonlocal version
+            latest = None
+            try:
+                # waits for the first weights, then only takes the newest
+                latest = models.get() if version is None else models.get_nowait()
+                while True:
+                    latest = models.get_nowait()
+            except queue.Empty:
+                pass
+            if latest is not None:
+                version, weights = latest
+                player.nnet.restore(weights)
+                player.setSelfPlayVersion(version)
+
+        def seeded():
+            episode = 0
+            while not stop.is_set():
+                refresh()
+                yield episode, episodeSeed(args.get('seed', 0), actor, episode)
+                episode += 1
+
+        if args.get('lockstepGames', 1) > 1:
+            # the games already being played go on with the new weights
+            episodes = LockstepSelfPlay(game, player.selfPlayNet, args).play(seeded())
+        else:
+            def executeEpisodes():
+                for episode, seed in seeded():
+                    np.random.seed(seed)
+                    player.mcts = player.newMCTS(player.selfPlayNet)
+                    yield episode, player.executeEpisode()
+            episodes = executeEpisodes()
+        for _, trainExamples in episodes:
+            if not putUnlessStopped(examples, (version, trainExamples), stop):
+                break
+    except Exception:
+        putUnlessStopped(examples, (None, traceback.format_exc()), stop)
+    # examples not yet sent when stopping are dropped, the learner is done
+    examples.cancel_join_thread()
+
+
+def pipelineEvaluator(game, nnetClass, args, best, candidates, results):
+    """
+    Main loop of the evaluator of Pipeline. It pits every candidate
+    (iteration, weights) taken from candidates against the best network so
+    far, which starts with the weights best, as Coach.learn does, and puts
+    (iteration, accepted, pwins, nwins, draws) on results. A None candidate
+    ends it.
+    """
+    torch = sys.modules.get('torch')
+    if torch is not None:
+        torch.set_num_threads(1)
+    try:
+        pnet, nnet = nnetClass(game), nnetClass(game)
+        pnet.restore(best)
+        while True:
+            task = candidates.get()
+            if task is None:
+                return
+            iteration, weights = task
+            nnet.restore(weights)
+            sprt, stop = arenaGate(args)
+            arena = Arena(MCTSPlayer(mctsClass(args)(game, pnet, args)),
+                          MCTSPlayer(mctsClass(args)(game, nnet, args)), game)
+            pwins, nwins, draws = arena.playGames(args.arenaCompare, stop=stop)
+            accepted = arenaAccepts(args, sprt, pwins, nwins, draws)
+            if accepted:
+                pnet.restore(weights)
+            results.put((iteration, accepted, pwins, nwins, draws))
+    except Exception:
+        results.put((None, traceback.format_exc(), 0, 0, 0))
+
+
+class Pipeline():
+    """
+    Processes of Coach.learnPipelined: max(1, args.numSelfPlayWorkers)
+    self-play actors and one evaluator, see pipelineActor and
+    pipelineEvaluator. The learner is the process that creates the pipeline.
+
+    The actors share an examples queue of args.pipelineQueueSize episodes
+    (default args.numEps): once it is full they wait for the learner. The
+    candidates queue holds one network waiting for the evaluator; a
+    candidate offered while one is already waiting is not evaluated.
+    """
+
+    def __init__(self, game, nnet, args):
+        context = multiprocessing.get_context('spawn')
+        self.examples = context.Queue(args.get('pipelineQueueSize', 0) or args.numEps)
+        self.candidates = context.Queue(1)
+        self.results = context.Queue()
+        self.stop = context.Event()
+        self.models = []
+        self.processes = []
+        self.evalCache = newSharedEvalCache(game, args)
+        best = nnet.snapshot()
+        for actor in range(max(1, args.get('numSelfPlayWorkers', 1))):
+            models = context.Queue()
+            models.put((0, best))
+            process = context.Process(target=pipelineActor, daemon=True,
+                                      args=(game, nnet.__class__, args, actor, models, self.examples, self.stop,
+                                            self.evalCache))
+            process.start()
+            self.models.append(models)
+            self.processes.append(process)
+        self.evaluator = context.Process(target=pipelineEvaluator, daemon=True,
+                                         args=(game, nnet.__class__, args, best, self.candidates, self.results))
+        self.evaluator.start()
+
+    def episode(self, timeout):
+        """
+        Returns (version, examples) of the next episode played by an actor,
+        version being the iteration of the network that played it (0 for the
+        initial one), or None if none came within timeout seconds.
+        """
+        try:
+            version, examples = self.examples.get(timeout=timeout)
+        except queue.Empty:
+            if not any(process.is_alive() for process in self.processes):
+                raise RuntimeError('Every self-play actor has stopped')
+            return None
+        if version is None:
+            raise RuntimeError('Self-play actor failed:\n' + examples)
+        return version, examples
+
+    def evaluate(self, iteration, weights):
+        """
+        Hands the candidate to the evaluator unless another one is already
+        waiting. Returns whether it was taken.
+        """
+        try:
+            self.candidates.put_nowait((iteration, weights))
+            return True
+        except queue.Full:
+            return False
+
+    def decisions(self, timeout=0):
+        """
+        Returns the (iteration, accepted, pwins, nwins, draws) of the
+        candidates decided so far, waiting up to timeout seconds for the
+        first one.
+        """
+        decided = []
+        try:
+            decided.append(self.results.get(timeout=timeout) if timeout else self.results.get_nowait())
+            while True:
+                decided.append(self.results.get_nowait())
+        except queue.Empty:
+            if timeout and not decided and not self.evaluator.is_alive():
+                raise RuntimeError('The evaluator has stopped')
+        for iteration, accepted, _, _, _ in decided:
+            if iteration is None:
+                raise RuntimeError('Evaluator failed:\n' + accepted)
+        return decided
+
+    def publish(self, version, weights):
+        """
+        Makes the actors play their next episodes with weights.
+        """
+        for models in self.models:
+            models.put((version, weights))
+
+    def close(self):
+        self.stop.set()
+        try:
+            self.candidates.put_nowait(None)
+        except queue.Full:
+            pass
+        for process in self.processes + [self.evaluator]:
+            process.join(timeout=10)
+            if process.is_alive():
+                process.terminate()
+        if self.evalCache is not None:
+            self.evalCache.close()
+
+
+class CheckpointWriter():
+    """
+    Writes checkpoints in a background thread so the training loop does not
+    wait for the disk. save takes an in-memory snapshot of the network right
+    away; the thread writes it with NeuralNet.save_snapshot. Every file is
+    written to a temporary folder next to its destination and renamed into
+    place, so readers never see a partial checkpoint.
+
+    With keep > 0 only the keep latest checkpoint_<i> files (see
+    Coach.getCheckpointFile) written by this writer are kept, older ones are
+    deleted after every write. Other files in the folder, such as the
+    checkpoint_<i>.pth.tar.examples files of older versions, are left alone.
+    """
+
+    def __init__(self, keep=0):
+        self.keep = keep
+        self.written = {}  # (folder, i) -> names of the checkpoint_<i> files written
+        self.queue = queue.Queue()
+        self.errors = []
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def save(self, nnet, folder, filename):
+        self.queue.put((nnet, nnet.snapshot(), folder, filename))
+
+    def run(self):
+        while True:
+            task = self.queue.get()
+            try:
+                if task is None:
+                    return
+                self.write(*task)
+            except Exception:
+                log.error('Writing checkpoint %s failed:\n%s' % (task[3], traceback.format_exc()))
+                self.errors.append(task[3])
+            finally:
+                self.queue.task_done()
+
+    def write(self, nnet, weights, folder, filename):
+        os.makedirs(folder, exist_ok=True)
+        partial = tempfile.mkdtemp(prefix='.partial-', dir=folder)
+        try:
+            nnet.save_snapshot(weights, partial, filename)
+            names = os.listdir(partial)
+            for name in names:
+                os.replace(os.path.join(partial, name), os.path.join(folder, name))
+        finally:
+            shutil.rmtree(partial, ignore_errors=True)
+        match = re.match(r'checkpoint_(\d+)\.', filename)
+        if match:
+            self.written.setdefault((folder, int(match.group(1))), set()).update(names)
+        if self.keep > 0:
+            self.retain(folder)
+
+    def retain(self, folder):
+        iterations = sorted(i for f, i in self.written if f == folder)
+        for i in iterations[:-self.keep]:
+            for name in self.written.pop((folder, i)):
+                os.remove(os.path.join(folder, name))
+                log.debug('Removed old checkpoint %s' % name)
+
+    def flush(self):
+        """
+        Waits until every checkpoint saved so far is written.
+        """
+        self.queue.join()
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+
+
+class LockstepGame():
+    """
+    State of one episode played by LockstepSelfPlay.
+    """
+
+    def __init__(self, game, nnet, args, episode, seed):
+        self.episode = episode
+        self.rng = np.random.RandomState(seed)
+        self.mcts = NodeMCTS(game, nnet, args)
+        self.board = game.getInitBoard()
+        self.curPlayer = 1
+        self.episodeStep = 0
+        self.trainExamples = []
+        self.canonicalBoard = None
+        self.sims = 0
+        self.budget = 0
+
+
+class LockstepSelfPlay():
+    """
+    Plays args.lockstepGames self-play episodes at once in this process. Every
+    round descends args.mctsBatchSize (default 1) paths in the search tree of
+    each game, evaluates the new leaves of all games with one
+    nnet.predict_batch call and backs them up. A game moves as soon as its
+    tree has had its simulations, and a new episode takes its place when it
+    ends.
+
+    Each game plays exactly as Coach.executeEpisode with a NodeMCTS does,
+    with its own random number generator seeded per episode.
     """
 
     def __init__(self, game, nnet, args):
         self.game = game
         self.nnet = nnet
-        self.pnet = self.nnet.__class__(self.game)  # the competitor network
         self.args = args
-        self.mcts = MCTS(self.game, self.nnet, self.args)
-        self.trainExamplesHistory = []  # history of examples from args.numItersForTrainExamplesHistory latest iterations
-        self.skipFirstSelfPlay = False  # can be overriden in loadTrainExamples()
+
+    def play(self, episodes):
+        """
+        Plays the episodes given as (episode, seed) pairs; the next pair is
+        only taken when a game slot is free.
+
+        Yields:
+            (episode, trainExamples) for every episode as soon as it ends,
+            trainExamples as Coach.executeEpisode returns them
+        """
+        episodes = iter(episodes)
+        numGames = self.args.get('lockstepGames', 1)
+        leavesPerGame = self.args.get('mctsBatchSize', 1)
+        games = []
+        while True:
+            while len(games) < numGames:
+                episode = next(episodes, None)
+                if episode is None:
+                    break
+                state = LockstepGame(self.game, self.nnet, self.args, *episode)
+                self.startMove(state)
+                games.append(state)
+            if not games:
+                return
+
+            gathered = []
+            boards = []
+            for state in games:
+                k = min(leavesPerGame, state.budget - state.sims)
+                leaves, done = state.mcts.gatherLeaves(state.canonicalBoard, k)
+                state.sims += done + len(leaves)
+                if leaves:
+                    gathered.append((state, leaves))
+                    boards.extend(leaf.board for leaf, _, _, _ in leaves)
+            if boards:
+                pis, vs = self.nnet.predict_batch(boards)
+                start = 0
+                for state, leaves in gathered:
+                    end = start + len(leaves)
+                    state.mcts.expandLeaves(leaves, pis[start:end], vs[start:end])
+                    start = end
+
+            playing = []
+            for state in games:
+                if state.sims < state.budget:
+                    playing.append(state)
+                    continue
+                trainExamples = self.move(state)
+                if trainExamples is None:
+                    self.startMove(state)
+                    playing.append(state)
+                else:
+                    yield state.episode, trainExamples
+            games = playing
+
+    def startMove(self, state):
+        state.episodeStep += 1
+        state.canonicalBoard = self.game.getCanonicalForm(state.board, state.curPlayer)
+        state.mcts.root = state.mcts.getNode(state.canonicalBoard)
+        state.budget = state.mcts.simulationBudget(state.mcts.root)
+        state.sims = 0
+
+    def move(self, state):
+        """
+        Plays the move chosen by the search of state, as Coach.executeEpisode
+        does.
+
+        Returns:
+            trainExamples of the episode if the move ended it, else None
+        """
+        temp = int(state.episodeStep < self.args.tempThreshold)
+        pi = state.mcts.actionProb(state.mcts.root, temp, state.rng)
+        for b, p in trainingForms(self.game, self.args, state.canonicalBoard, pi):
+            state.trainExamples.append([b, state.curPlayer, p, None])
+
+        action = state.rng.choice(len(pi), p=pi)
+        state.mcts.advance(action)
+        state.board, state.curPlayer = self.game.getNextState(state.board, state.curPlayer, action)
+
+        r = self.game.getGameEndedAfter(state.board, state.curPlayer, action)
+        if r != 0:
+            return [(x[0], x[2], r * ((-1) ** (x[1] != state.curPlayer))) for x in state.trainExamples]
+        return None
+
+
+class SPRT():
+    """
+    Sequential probability ratio test for the arena gate. Draws are left out,
+    as in the fixed-length gate: the test is on p, the share of decisive
+    games won by the new network, with H0: p = threshold - delta against
+    H1: p = threshold + delta, and error rates alpha (accepting a network
+    that is not better) and beta (rejecting one that is).
+    """
+
+    def __init__(self, threshold, alpha=0.05, beta=0.05, delta=0.05):
+        p0, p1 = threshold - delta, threshold + delta
+        assert 0 < p0 < p1 < 1
+        self.winLLR = math.log(p1 / p0)
+        self.lossLLR = math.log((1 - p1) / (1 - p0))
+        self.upper = math.log((1 - beta) / alpha)
+        self.lower = math.log(beta / (1 - alpha))
+
+    def llr(self, wins, losses):
+        return wins * self.winLLR + losses * self.lossLLR
+
+    def test(self, wins, losses):
+        """
+        Returns:
+            True to accept the new network, False to reject it, None while
+            more games are needed
+        """
+        llr = self.llr(wins, losses)
+        if llr >= self.upper:
+            return True
+        if llr <= self.lower:
+            return False
+        return None
+
+
+def arenaGate(args):
+    """
+    Returns (sprt, stop) for the arena games deciding on a new network: the
+    SPRT of args.sprt (else None) and the stop function Arena.playGames takes
+    to end the match as soon as the test decides.
+    """
+    if not args.get('sprt', False):
+        return None, None
+    sprt = SPRT(args.updateThreshold, args.get('sprtAlpha', 0.05), args.get('sprtBeta', 0.05),
+                args.get('sprtDelta', 0.05))
+    return sprt, lambda pwins, nwins, draws: sprt.test(nwins, pwins) is not None
+
+
+def arenaAccepts(args, sprt, pwins, nwins, draws):
+    """
+    Returns whether the new network is accepted after the arena games: by the
+    decision of sprt if it made one, else if it won at least
+    args.updateThreshold of the decisive games.
+    """
+    decision = None
+    if sprt is not None:
+        decision = sprt.test(nwins, pwins)
+        log.info('SPRT %s after %d of %d games (LLR %.2f)' % (
+            {True: 'accepted', False: 'rejected', None: 'undecided'}[decision],
+            pwins + nwins + draws, args.arenaCompare, sprt.llr(nwins, pwins)))
+    if decision is not None:
+        return decision
+    return pwins + nwins > 0 and float(nwins) / (pwins + nwins) >= args.updateThreshold
+
+
+class SelfPlayer():
+    """
+    Plays self-play episodes with a network, nnet. This is all the self-play
+    workers, the actors of Pipeline and the remote workers need of Coach,
+    without the competitor network and the replay buffer.
+    """
+
+    def __init__(self, game, nnet, args):
+        self.game = game
+        self.nnet = nnet
+        self.args = args
+        self.evalCache = None
+        self.selfPlayNet = self.nnet  # the network self-play searches with, see useEvalCache
+        if self.args.get('evalCacheSize', 0):
+            self.useEvalCache(EvalCache(self.args.evalCacheSize))
+        self.mcts = self.newMCTS(self.selfPlayNet)
+
+    def useEvalCache(self, cache):
+        """
+        Makes self-play evaluate positions through cache (an EvalCache, see
+        EvalCache.CachedNNet).
+        """
+        self.evalCache = cache
+        self.selfPlayNet = CachedNNet(self.game, self.nnet, cache)
+
+    def setSelfPlayVersion(self, version):
+        """
+        Tells the evaluation cache, if any, that self-play now uses the
+        weights of version (an iteration), which no earlier evaluation was
+        made with.
+        """
+        if self.evalCache is not None:
+            self.selfPlayNet.setVersion(version)
+
+    def newMCTS(self, nnet):
+        """
+        Returns a fresh search tree for nnet, of the class given by
+        MCTS.mctsClass.
+        """
+        return mctsClass(self.args)(self.game, nnet, self.args)
 
     def executeEpisode(self):
         """
@@ -56,18 +719,106 @@ class Coach():
             temp = int(episodeStep < self.args.tempThreshold)
 
             pi = self.mcts.getActionProb(canonicalBoard, temp=temp)
-            sym = self.game.getSymmetries(canonicalBoard, pi)
+            sym = trainingForms(self.game, self.args, canonicalBoard, pi)
             for b, p in sym:
                 trainExamples.append([b, self.curPlayer, p, None])
 
             action = np.random.choice(len(pi), p=pi)
+            if hasattr(self.mcts, 'advance'):
+                self.mcts.advance(action)  # keep the subtree of the move played
             board, self.curPlayer = self.game.getNextState(board, self.curPlayer, action)
 
-            r = self.game.getGameEnded(board, self.curPlayer)
+            r = self.game.getGameEndedAfter(board, self.curPlayer, action)
 
             if r != 0:
                 return [(x[0], x[2], r * ((-1) ** (x[1] != self.curPlayer))) for x in trainExamples]
 
+
+class Coach(SelfPlayer):
+    """
+    This class executes the self-play + learning. It uses the functions defined
+    in Game and NeuralNet. args are specified in main.py.
+    """
+
+    def __init__(self, game, nnet, args):
+        super().__init__(game, nnet, args)
+        self.pnet = self.nnet.__class__(self.game)  # the competitor network
+        self.trainExamplesHistory = self.newReplayBuffer()  # examples from args.numItersForTrainExamplesHistory latest iterations
+        self.skipFirstSelfPlay = False  # can be overriden in loadTrainExamples()
+        self.workers = None  # SelfPlayWorkers while learn runs with args.numSelfPlayWorkers > 1
+        self.checkpoints = None  # CheckpointWriter while learn runs
+
+    def newReplayBuffer(self):
+        """
+        Returns an empty ReplayBuffer for the examples of the latest
+        args.numItersForTrainExamplesHistory iterations. It holds
+        args.replayCapacity examples, by default enough for that many
+        iterations of args.maxlenOfQueue examples, with boards stored as
+        args.replayBoardDtype (int8 by default). Its arrays grow as the
+        iterations arrive, so nothing that large is allocated here.
+
+        With args.lazySymmetries the examples are stored in one form only and
+        the buffer draws their symmetries with Game.getRandomSymmetries, for
+        the networks that support it (NeuralNet.lazySymmetries). The
+        default capacity stays the same: an iteration keeps up to
+        args.maxlenOfQueue examples in either case, so the buffer still holds
+        args.numItersForTrainExamplesHistory full iterations.
+        """
+        capacity = self.args.get('replayCapacity', 0) or \
+            self.args.maxlenOfQueue * self.args.numItersForTrainExamplesHistory
+        augment, symmetries = None, 1
+        if self.args.get('lazySymmetries', False):
+            if not getattr(self.nnet, 'lazySymmetries', False):
+                raise ValueError(f'{self.nnet.__class__.__name__} does not draw the symmetries of its examples, '
+                                 f'args.lazySymmetries would train it on one form of every position only')
+            board = self.game.getInitBoard()
+            pi = np.ones(self.game.getActionSize()) / self.game.getActionSize()
+            augment, symmetries = self.game.getRandomSymmetries, len(self.game.getSymmetries(board, pi))
+        buffer = ReplayBuffer(np.asarray(self.game.getInitBoard()).shape, self.game.getActionSize(),
+                              capacity, self.args.numItersForTrainExamplesHistory,
+                              self.args.get('replayBoardDtype', 'int8'), augment, symmetries)
+        log.debug(f'Replay buffer of up to {capacity} examples')
+        return buffer
+
+    def selfPlay(self, iteration):
+        """
+        Plays args.numEps episodes of self-play with the current network, in
+        this process or, with args.numSelfPlayWorkers > 1, in the worker pool
+        (with args.coordinatorAddress, on the remote workers, see
+        RemoteSelfPlay).
+        With args.lockstepGames > 1 every process plays that many episodes at
+        once, see LockstepSelfPlay. With args.evalCacheSize the games share
+        the network evaluations of the iteration, see EvalCache.
+
+        Returns:
+            iterationTrainExamples: the examples of all episodes, in the order
+                                    the episodes finished
+        """
+        iterationTrainExamples = deque([], maxlen=self.args.maxlenOfQueue)
+        evalCache = self.evalCache
+        if self.workers is None:
+            self.setSelfPlayVersion(iteration)
+        else:
+            # the cache the workers share, else theirs are out of reach
+            evalCache = getattr(self.workers, 'evalCache', None)
+        if self.workers is None and self.args.get('lockstepGames', 1) > 1:
+            seeded = ((episode, episodeSeed(self.args.get('seed', 0), iteration, episode))
+                      for episode in range(self.args.numEps))
+            episodes = LockstepSelfPlay(self.game, self.selfPlayNet, self.args).play(seeded)
+            for _, examples in tqdm(episodes, total=self.args.numEps, desc="Self Play"):
+                iterationTrainExamples += examples
+        elif self.workers is None:
+            for _ in tqdm(range(self.args.numEps), desc="Self Play"):
+                self.mcts = self.newMCTS(self.selfPlayNet)  # reset search tree
+                iterationTrainExamples += self.executeEpisode()
+        else:
+            episodes = self.workers.play(iteration, self.nnet, self.args.numEps)
+            for examples in tqdm(episodes, total=self.args.numEps, desc="Self Play"):
+                iterationTrainExamples += examples
+        if evalCache is not None:
+            log.info(f'Evaluation cache: {evalCache.stats()}')
+        return iterationTrainExamples
+
     def learn(self):
         """
         Performs numIters iterations with numEps episodes of self-play in each
@@ -76,73 +827,167 @@ class Coach():
         It then pits the new neural network against the old one and accepts it
         only if it wins >= updateThreshold fraction of games.
         """
+        if self.args.get('pipeline', False):
+            return self.learnPipelined()
+        if self.args.get('coordinatorAddress'):
+            self.workers = Coordinator(self.game, self.nnet, self.args)
+        elif self.args.get('numSelfPlayWorkers', 1) > 1:
+            self.workers = SelfPlayWorkers(self.game, self.nnet, self.args)
+        self.checkpoints = CheckpointWriter(self.args.get('keepCheckpoints', 0))
+        try:
+            for i in range(1, self.args.numIters + 1):
+                # bookkeeping
+                log.info(f'Starting Iter #{i} ...')
+                # examples of the iteration
+                if not self.skipFirstSelfPlay or i > 1:
+                    iterationTrainExamples = self.selfPlay(i)
+
+                    # save the iteration examples to the history, retiring the oldest
+                    # iteration beyond args.numItersForTrainExamplesHistory
+                    self.trainExamplesHistory.append(iterationTrainExamples)
+
+                    # backup the new examples to the example store
+                    self.saveTrainExamples()
+
+                # training new network, keeping a copy of the old one in memory
+                previous = self.nnet.snapshot()
+                self.pnet.restore(previous)
+
+                # the networks draw their minibatches at random from the whole history
+                self.nnet.train(self.trainExamplesHistory)
+
+                log.info('PITTING AGAINST PREVIOUS VERSION')
+                sprt, stop = arenaGate(self.args)
+                numArenaWorkers = self.args.get('numArenaWorkers', 1)
+                if numArenaWorkers > 1:
+                    # the workers build their own players from the snapshots of both networks
+                    arena = Arena(MCTSPlayerSpec(self.pnet.__class__, self.args, weights=previous),
+                                  MCTSPlayerSpec(self.nnet.__class__, self.args, weights=self.nnet.snapshot()),
+                                  self.game)
+                    pwins, nwins, draws = arena.playGames(self.args.arenaCompare, numWorkers=numArenaWorkers, stop=stop)
+                else:
+                    pmcts = self.newMCTS(self.pnet)
+                    nmcts = self.newMCTS(self.nnet)
+                    arena = Arena(MCTSPlayer(pmcts), MCTSPlayer(nmcts), self.game)
+                    pwins, nwins, draws = arena.playGames(self.args.arenaCompare, stop=stop)
+                    if hasattr(pmcts, 'stats'):
+                        log.debug('Arena MCTS, previous: %s ; new: %s' % (pmcts.stats(), nmcts.stats()))
+
+                log.info('NEW/PREV WINS : %d / %d ; DRAWS : %d' % (nwins, pwins, draws))
+                if not arenaAccepts(self.args, sprt, pwins, nwins, draws):
+                    log.info('REJECTING NEW MODEL')
+                    self.nnet.restore(previous)
+                else:
+                    log.info('ACCEPTING NEW MODEL')
+                    self.checkpoints.save(self.nnet, self.args.checkpoint, self.getCheckpointFile(i))
+                    self.checkpoints.save(self.nnet, self.args.checkpoint, 'best.pth.tar')
+        finally:
+            self.checkpoints.close()
+            self.checkpoints = None
+            if self.workers is not None:
+                self.workers.close()
+                self.workers = None
+
+    def learnPipelined(self):
+        """
+        learn with self-play, training and the arena games running at the
+        same time (args.pipeline), see Pipeline. The actors keep playing with
+        the latest accepted network. This process is the learner: every
+        iteration it waits for args.numEps new episodes, adds them to the
+        replay buffer as one iteration, trains and hands the new network to
+        the evaluator, which pits it against the best network while the
+        learner goes on. An accepted network goes to the actors and is saved
+        as checkpoint_<iteration> and best. A rejected one is only not used
+        for self-play: the learner keeps training its own weights.
+        """
+        self.checkpoints = CheckpointWriter(self.args.get('keepCheckpoints', 0))
+        pipeline = Pipeline(self.game, self.nnet, self.args)
+        pending = {}  # weights of the candidates handed to the evaluator, by iteration
+        try:
+            for i in range(1, self.args.numIters + 1):
+                log.info(f'Starting Iter #{i} ...')
+                if not self.skipFirstSelfPlay or i > 1:
+                    iterationTrainExamples = deque([], maxlen=self.args.maxlenOfQueue)
+                    versions = []
+                    with tqdm(total=self.args.numEps, desc="Self Play") as progress:
+                        while len(versions) < self.args.numEps:
+                            self.applyDecisions(pipeline, pending)
+                            played = pipeline.episode(timeout=1)
+                            if played is not None:
+                                versions.append(played[0])
+                                iterationTrainExamples += played[1]
+                                progress.update()
+                    log.info(f'Episodes played by the networks of iterations {sorted(set(versions))}')
+                    self.trainExamplesHistory.append(iterationTrainExamples)
+                    self.saveTrainExamples()
+
+                self.nnet.train(self.trainExamplesHistory)
+
+                weights = self.nnet.snapshot()
+                if pipeline.evaluate(i, weights):
+                    pending[i] = weights
+                else:
+                    log.info(f'Evaluator busy, network of iteration {i} is not evaluated')
+                self.applyDecisions(pipeline, pending)
 
-        for i in range(1, self.args.numIters + 1):
-            # bookkeeping
-            log.info(f'Starting Iter #{i} ...')
-            # examples of the iteration
-            if not self.skipFirstSelfPlay or i > 1:
-                iterationTrainExamples = deque([], maxlen=self.args.maxlenOfQueue)
-
-                for _ in tqdm(range(self.args.numEps), desc="Self Play"):
-                    self.mcts = MCTS(self.game, self.nnet, self.args)  # reset search tree
-                    iterationTrainExamples += self.executeEpisode()
-
-                # save the iteration examples to the history 
-                self.trainExamplesHistory.append(iterationTrainExamples)
-
-            if len(self.trainExamplesHistory) > self.args.numItersForTrainExamplesHistory:
-                log.warning(
-                    f"Removing the oldest entry in trainExamples. len(trainExamplesHistory) = {len(self.trainExamplesHistory)}")
-                self.trainExamplesHistory.pop(0)
-            # backup history to a file
-            # NB! the examples were collected using the model from the previous iteration, so (i-1)  
-            self.saveTrainExamples(i - 1)
-
-            # shuffle examples before training
-            trainExamples = []
-            for e in self.trainExamplesHistory:
-                trainExamples.extend(e)
-            shuffle(trainExamples)
-
-            # training new network, keeping a copy of the old one
-            self.nnet.save_checkpoint(folder=self.args.checkpoint, filename='temp.pth.tar')
-            self.pnet.load_checkpoint(folder=self.args.checkpoint, filename='temp.pth.tar')
-            pmcts = MCTS(self.game, self.pnet, self.args)
-
-            self.nnet.train(trainExamples)
-            nmcts = MCTS(self.game, self.nnet, self.args)
-
-            log.info('PITTING AGAINST PREVIOUS VERSION')
-            arena = Arena(lambda x: np.argmax(pmcts.getActionProb(x, temp=0)),
-                          lambda x: np.argmax(nmcts.getActionProb(x, temp=0)), self.game)
-            pwins, nwins, draws = arena.playGames(self.args.arenaCompare)
-
-            log.info('NEW/PREV WINS : %d / %d ; DRAWS : %d' % (nwins, pwins, draws))
-            if pwins + nwins == 0 or float(nwins) / (pwins + nwins) < self.args.updateThreshold:
+            while pending:
+                self.applyDecisions(pipeline, pending, timeout=1)
+        finally:
+            pipeline.close()
+            self.checkpoints.close()
+            self.checkpoints = None
+
+    def applyDecisions(self, pipeline, pending, timeout=0):
+        """
+        Takes the decisions of the pipeline evaluator on the candidates in
+        pending (see Pipeline.decisions), sending every accepted network to
+        the actors and to the checkpoint writer.
+        """
+        for iteration, accepted, pwins, nwins, draws in pipeline.decisions(timeout):
+            weights = pending.pop(iteration)
+            log.info('Iter #%d NEW/PREV WINS : %d / %d ; DRAWS : %d' % (iteration, nwins, pwins, draws))
+            if not accepted:
                 log.info('REJECTING NEW MODEL')
-                self.nnet.load_checkpoint(folder=self.args.checkpoint, filename='temp.pth.tar')
-            else:
-                log.info('ACCEPTING NEW MODEL')
-                self.nnet.save_checkpoint(folder=self.args.checkpoint, filename=self.getCheckpointFile(i))
-                self.nnet.save_checkpoint(folder=self.args.checkpoint, filename='best.pth.tar')
+                continue
+            log.info('ACCEPTING NEW MODEL')
+            pipeline.publish(iteration, weights)
+            self.pnet.restore(weights)  # holds the best network for the checkpoint writer
+            self.checkpoints.save(self.pnet, self.args.checkpoint, self.getCheckpointFile(iteration))
+            self.checkpoints.save(self.pnet, self.args.checkpoint, 'best.pth.tar')
 
     def getCheckpointFile(self, iteration):
         return 'checkpoint_' + str(iteration) + '.pth.tar'
 
-    def saveTrainExamples(self, iteration):
-        folder = self.args.checkpoint
-        if not os.path.exists(folder):
-            os.makedirs(folder)
-        filename = os.path.join(folder, self.getCheckpointFile(iteration) + ".examples")
-        with open(filename, "wb+") as f:
-            Pickler(f).dump(self.trainExamplesHistory)
-        f.closed
+    def getExampleStore(self, folder):
+        return ExampleStore(os.path.join(folder, 'examples'))
+
+    def saveTrainExamples(self):
+        """
+        Appends the latest iteration of examples to the example store in
+        args.checkpoint as its own shard, numbered after the shards already
+        there (those of an earlier run too, see ExampleStore.append); the
+        earlier shards are not rewritten.
+        """
+        boards, pis, vs = self.trainExamplesHistory.iteration(-1)
+        self.getExampleStore(self.args.checkpoint).append(boards, pis, vs)
 
     def loadTrainExamples(self):
+        """
+        Loads the examples of the latest args.numItersForTrainExamplesHistory
+        iterations from the example store in args.load_folder_file[0], or
+        from the pickled examples file next to the model written by earlier
+        versions.
+        """
+        store = self.getExampleStore(self.args.load_folder_file[0])
         modelFile = os.path.join(self.args.load_folder_file[0], self.args.load_folder_file[1])
         examplesFile = modelFile + ".examples"
-        if not os.path.isfile(examplesFile):
+        if store.shards:
+            log.info(f'Loading trainExamples from the example store in "{store.folder}"...')
+            self.trainExamplesHistory = self.newReplayBuffer()
+            store.load(self.trainExamplesHistory, self.args.numItersForTrainExamplesHistory)
+            log.info('Loading done!')
+            self.skipFirstSelfPlay = True
+        elif not os.path.isfile(examplesFile):
             log.warning(f'File "{examplesFile}" with trainExamples not found!')
             r = input("Continue? [y|n]")
             if r != "y":
@@ -150,7 +995,15 @@ class Coach():
         else:
             log.info("File with trainExamples found. Loading it...")
             with open(examplesFile, "rb") as f:
-                self.trainExamplesHistory = Unpickler(f).load()
+                history = Unpickler(f).load()
+            # files written before the replay buffer hold a list of iterations
+            self.trainExamplesHistory = self.newReplayBuffer()
+            if isinstance(history, ReplayBuffer):
+                for boards, pis, vs in history.iterations():
+                    self.trainExamplesHistory.appendArrays(boards, pis, vs)
+            else:
+                for iterationTrainExamples in history:
+                    self.trainExamplesHistory.append(iterationTrainExamples)
             log.info('Loading done!')
 
             # examples based on the model were already collected (loaded)
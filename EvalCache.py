@@ -0,0 +1,243 @@
+"""
+Caches of network evaluations shared by the self-play games of an
+iteration (args.evalCacheSize, see Coach).
+
+Positions are cached by their symmetry class: of the forms
+Game.getSymmetryForms gives, the one with the smallest bytes is the one
+evaluated and stored, and the policy is mapped back to the form asked for.
+The key is a hash of that form and of the version of the network, so
+evaluations of earlier networks are never returned; they are simply the
+least recently used entries once the network changes.
+"""
+import hashlib
+import multiprocessing
+import time
+from collections import OrderedDict
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+
+def positionKey(board, version):
+    """
+    Returns the 16 byte cache key of board (the form evaluated) for the
+    network version.
+    """
+    data = np.ascontiguousarray(board).tobytes() + int(version).to_bytes(8, 'little', signed=True)
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+class EvalCache():
+    """
+    Bounded LRU cache of (pi, v) by positionKey, in this process only.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """
+        Returns (pi, v) stored for key, or None.
+        """
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key, pi, v):
+        self.entries[key] = (pi, v)
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def counts(self):
+        """
+        Returns (hits, misses, evictions, entries held).
+        """
+        return self.hits, self.misses, self.evictions, len(self.entries)
+
+    def stats(self):
+        hits, misses, evictions, entries = self.counts()
+        lookups = hits + misses
+        return '%d of %d lookups hit (%.1f%%), %d entries, %d evicted' % (
+            hits, lookups, 100.0 * hits / max(lookups, 1), entries, evictions)
+
+
+class SharedEvalCache(EvalCache):
+    """
+    EvalCache held in shared memory, for all the self-play processes the
+    creator passes it to (it pickles as a handle to the same memory).
+
+    The table is set associative: a key can only be stored in the WAYS
+    slots of its bucket, and a new key replaces the least recently used of
+    them, so the LRU order is kept per bucket. Buckets are guarded by a few
+    process-shared locks. The counts cover every process using the cache.
+    """
+
+    WAYS = 8
+    LOCKS = 16
+
+    def __init__(self, capacity, actionSize):
+        self.buckets = max(1, -(-capacity // self.WAYS))
+        self.capacity = self.buckets * self.WAYS
+        self.actionSize = actionSize
+        self.locks = [multiprocessing.get_context('spawn').Lock() for _ in range(self.LOCKS)]
+        self.memory = shared_memory.SharedMemory(create=True, size=self.layout()[-1])
+        self.owner = True
+        self.attach()
+        self.keys[:] = 0
+        self.stamps[:] = 0
+        self.counters[:] = 0
+
+    def layout(self):
+        """
+        Returns the byte offsets of keys, stamps, vs, pis, counters and the
+        total size.
+        """
+        slots = self.capacity
+        sizes = [slots * 16, slots * 8, slots * 4, slots * self.actionSize * 4, self.LOCKS * 3 * 8]
+        return np.concatenate([[0], np.cumsum(sizes)]).tolist()
+
+    def attach(self):
+        offsets = self.layout()
+        buf = self.memory.buf
+
+        def view(i, dtype, shape):
+            return np.ndarray(shape, dtype=dtype, buffer=buf, offset=offsets[i])
+
+        self.keys = view(0, np.uint64, (self.buckets, self.WAYS, 2))
+        self.stamps = view(1, np.int64, (self.buckets, self.WAYS))
+        self.vs = view(2, np.float32, (self.buckets, self.WAYS))
+        self.pis = view(3, np.float32, (self.buckets, self.WAYS, self.actionSize))
+        self.counters = view(4, np.int64, (self.LOCKS, 3))  # hits, misses, evictions of every lock
+
+    def slot(self, key):
+        """
+        Returns (key as two words, bucket, lock) of key.
+        """
+        words = np.frombuffer(key, dtype=np.uint64)
+        bucket = int(words[0] % self.buckets)
+        return words, bucket, bucket % self.LOCKS
+
+    def find(self, words, bucket):
+        ways = self.keys[bucket]
+        match = np.flatnonzero((ways[:, 0] == words[0]) & (ways[:, 1] == words[1]))
+        return int(match[0]) if len(match) else None
+
+    def get(self, key):
+        words, bucket, lock = self.slot(key)
+        with self.locks[lock]:
+            way = self.find(words, bucket)
+            if way is None:
+                self.counters[lock, 1] += 1
+                return None
+            self.stamps[bucket, way] = time.monotonic_ns()
+            self.counters[lock, 0] += 1
+            return self.pis[bucket, way].copy(), float(self.vs[bucket, way])
+
+    def put(self, key, pi, v):
+        words, bucket, lock = self.slot(key)
+        with self.locks[lock]:
+            way = self.find(words, bucket)
+            if way is None:
+                way = int(np.argmin(self.stamps[bucket]))  # empty slots have stamp 0
+                if self.stamps[bucket, way]:
+                    self.counters[lock, 2] += 1
+            self.pis[bucket, way] = pi
+            self.vs[bucket, way] = v
+            self.keys[bucket, way] = words
+            self.stamps[bucket, way] = time.monotonic_ns()
+
+    def counts(self):
+        hits, misses, evictions = self.counters.sum(axis=0).tolist()
+        return hits, misses, evictions, int(np.count_nonzero(self.stamps))
+
+    def close(self):
+        """
+        Detaches this process from the cache; the creator also frees it.
+        """
+        self.keys = self.stamps = self.vs = self.pis = self.counters = None
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+
+    def __getstate__(self):
+        return {'buckets': self.buckets, 'actionSize': self.actionSize, 'locks': self.locks,
+                'name': self.memory.name}
+
+    def __setstate__(self, state):
+        self.buckets = state['buckets']
+        self.capacity = self.buckets * self.WAYS
+        self.actionSize = state['actionSize']
+        self.locks = state['locks']
+        self.memory = shared_memory.SharedMemory(name=state['name'])
+        # the creator frees the memory, not the tracker when this process ends
+        resource_tracker.unregister(self.memory._name, 'shared_memory')
+        self.owner = False
+        self.attach()
+
+
+class CachedNNet():
+    """
+    Network nnet with cache (an EvalCache) in front of predict and
+    predict_batch; every other attribute is the one of nnet. A position
+    missing from the cache is evaluated in the form it is stored in, so the
+    result for a position does not depend on which of its forms was asked
+    for first, nor in which process. version is the version of the weights
+    of nnet, to be changed with setVersion whenever they change.
+    """
+
+    def __init__(self, game, nnet, cache, version=0):
+        self.game = game
+        self.nnet = nnet
+        self.cache = cache
+        self.version = version
+
+    def __getattr__(self, name):
+        return getattr(self.nnet, name)
+
+    def setVersion(self, version):
+        self.version = version
+
+    def predict(self, board):
+        pis, vs = self.predict_batch([board])
+        return pis[0], vs[0]
+
+    def predict_batch(self, boards):
+        pis, vs = [None] * len(boards), [None] * len(boards)
+        missing = OrderedDict()  # key -> (form evaluated, [(index, permutation)])
+        for i, board in enumerate(boards):
+            forms, permutations = self.game.getSymmetryForms(board)
+            k = min(range(len(forms)), key=lambda j: forms[j].tobytes())
+            key = positionKey(forms[k], self.version)
+            cached = self.cache.get(key)
+            if cached is None:
+                missing.setdefault(key, (forms[k], []))[1].append((i, permutations[k]))
+            else:
+                pis[i], vs[i] = self.orient(cached, permutations[k])
+        if missing:
+            newPis, newVs = self.nnet.predict_batch([form for form, _ in missing.values()])
+            for key, pi, v, (_, waiting) in zip(missing, newPis, newVs, missing.values()):
+                entry = (np.asarray(pi, dtype=np.float32), float(np.asarray(v).item()))
+                self.cache.put(key, *entry)
+                for i, permutation in waiting:
+                    pis[i], vs[i] = self.orient(entry, permutation)
+        return pis, vs
+
+    def orient(self, entry, permutation):
+        """
+        Returns (pi, v) of entry, stored for the form whose policy is
+        pi[permutation], for the board asked for, as predict returns them.
+        """
+        pi, v = entry
+        oriented = np.empty_like(pi)
+        oriented[permutation] = pi
+        return oriented, np.array([v], dtype=np.float32)
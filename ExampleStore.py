@@ -0,0 +1,185 @@
+"""
+Append-only on-disk store for training examples.
+
+A store is a folder with one shard per iteration and a small index:
+
+    folder/index.json          list of shards, oldest first
+    folder/iteration_00012/    one shard: a few .npy files
+
+Shards are written once and never touched again; adding an iteration writes
+its shard and replaces index.json. Every array of a shard is a plain .npy
+file, so it can be memory-mapped, and the examples are stored compactly:
+
+    boards      boards whose cells are all -1, 0 or 1 (every board game here
+                but RTS) are packed into two bit planes, other boards are
+                kept as they are
+    pis         policies are sparse (only the moves the search visited), so
+                they are kept as the nonzero entries of every row (indices,
+                values and row offsets)
+    vs          float32
+
+To import the pickled example files of older versions of Coach and the
+outputs of the gen_data*.py scripts:
+
+    python ExampleStore.py OUTPUT_FOLDER FILE [FILE ...]
+"""
+import argparse
+import json
+import os
+import pickle
+import shutil
+
+import numpy as np
+
+INDEX = 'index.json'
+
+
+class ExampleStore():
+    """
+    Reads and writes the shards of the store in folder, see the module
+    docstring.
+    """
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.shards = []  # index entries, oldest iteration first
+        if ExampleStore.exists(folder):
+            with open(os.path.join(folder, INDEX)) as f:
+                self.shards = json.load(f)['shards']
+
+    @staticmethod
+    def exists(folder):
+        return os.path.isfile(os.path.join(folder, INDEX))
+
+    def write(self, iteration, boards, pis, vs):
+        """
+        Writes the examples of one iteration, given as arrays, as a new shard
+        (replacing an earlier shard of the same iteration) and updates the
+        index.
+        """
+        boards, pis, vs = np.asarray(boards), np.asarray(pis, dtype=np.float32), np.asarray(vs, dtype=np.float32)
+        name = 'iteration_%05d' % iteration
+        entry = {'iteration': iteration, 'name': name, 'count': len(boards),
+                 'boardShape': list(boards.shape[1:]), 'actionSize': pis.shape[1]}
+
+        if np.isin(boards, (-1, 0, 1)).all():
+            entry['boardEncoding'] = 'bits'
+            cells = int(np.prod(boards.shape[1:]))
+            planes = np.stack([boards == 1, boards == -1], axis=1).reshape(len(boards), 2, cells)
+            arrays = {'boards': np.packbits(planes, axis=2)}
+        else:
+            entry['boardEncoding'] = str(boards.dtype)
+            arrays = {'boards': boards}
+        rows, actions = np.nonzero(pis)
+        arrays['piIndices'] = actions.astype(np.uint16 if pis.shape[1] < 2 ** 16 else np.uint32)
+        arrays['piValues'] = pis[rows, actions]
+        arrays['piOffsets'] = np.concatenate([[0], np.cumsum(np.bincount(rows, minlength=len(pis)))])
+        arrays['vs'] = vs
+
+        # write the shard next to its final place and move it there in one step
+        os.makedirs(self.folder, exist_ok=True)
+        path = os.path.join(self.folder, name)
+        partial = path + '.partial'
+        shutil.rmtree(partial, ignore_errors=True)
+        os.makedirs(partial)
+        for key, array in arrays.items():
+            np.save(os.path.join(partial, key + '.npy'), array)
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(partial, path)
+
+        self.shards = [shard for shard in self.shards if shard['iteration'] != iteration] + [entry]
+        self.shards.sort(key=lambda shard: shard['iteration'])
+        self.writeIndex()
+
+    def append(self, boards, pis, vs):
+        """
+        Writes the examples of one iteration as a new shard, numbered after
+        the latest shard of the store, so that no shard is ever overwritten
+        (a resumed run goes on after the iterations of the runs before it).
+        Returns the iteration number of the shard.
+        """
+        iteration = self.shards[-1]['iteration'] + 1 if self.shards else 0
+        self.write(iteration, boards, pis, vs)
+        return iteration
+
+    def writeIndex(self):
+        path = os.path.join(self.folder, INDEX)
+        with open(path + '.partial', 'w') as f:
+            json.dump({'shards': self.shards}, f, indent=1)
+        os.replace(path + '.partial', path)
+
+    def read(self, shard):
+        """
+        Returns the examples of shard (an entry of shards) as arrays boards
+        (int8, or the dtype of boards that were not packed), pis and vs
+        (float32). The files of the shard are memory-mapped, only the arrays
+        returned are built in memory.
+        """
+        path = os.path.join(self.folder, shard['name'])
+
+        def load(key):
+            return np.load(os.path.join(path, key + '.npy'), mmap_mode='r')
+
+        count, shape = shard['count'], tuple(shard['boardShape'])
+        if shard['boardEncoding'] == 'bits':
+            cells = int(np.prod(shape))
+            planes = np.unpackbits(load('boards'), axis=2, count=cells).astype(np.int8)
+            boards = (planes[:, 0] - planes[:, 1]).reshape((count,) + shape)
+        else:
+            boards = np.array(load('boards'))
+
+        offsets = load('piOffsets')
+        pis = np.zeros((count, shard['actionSize']), dtype=np.float32)
+        pis[np.repeat(np.arange(count), np.diff(offsets)), load('piIndices')] = load('piValues')
+        return boards, pis, np.array(load('vs'))
+
+    def load(self, buffer, window=None):
+        """
+        Appends the latest window shards (all of them if window is None) to
+        ReplayBuffer buffer, oldest first. Older shards are not opened.
+        """
+        shards = self.shards if window is None else self.shards[len(self.shards) - window:]
+        for shard in shards:
+            buffer.appendArrays(*self.read(shard))
+
+
+def exampleIterations(data):
+    """
+    Returns the iterations of examples in data, loaded from a pickled
+    examples file: a ReplayBuffer, a list of iterations (deques or lists of
+    (board, pi, v)) as Coach used to write, or a flat list of examples as
+    the gen_data*.py scripts write. Each iteration is returned as arrays
+    (boards, pis, vs).
+    """
+    if hasattr(data, 'iterations'):
+        return data.iterations()
+    data = list(data)
+    if data and len(data[0]) == 3 and np.ndim(data[0][0]) >= 2:
+        data = [data]  # one flat list of examples
+    iterations = []
+    for examples in data:
+        boards, pis, vs = zip(*examples)
+        iterations.append((np.asarray(boards), np.asarray(pis, dtype=np.float32), np.asarray(vs, dtype=np.float32)))
+    return iterations
+
+
+def convert(folder, files):
+    """
+    Appends the examples of the pickled files to the store in folder, one
+    shard per iteration, numbered after the shards already there.
+    """
+    store = ExampleStore(folder)
+    for filename in files:
+        with open(filename, 'rb') as f:
+            data = pickle.load(f)
+        for boards, pis, vs in exampleIterations(data):
+            iteration = store.append(boards, pis, vs)
+            print('%s: iteration %d, %d examples' % (filename, iteration, len(boards)))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('folder', help='example store to append to (created if missing)')
+    parser.add_argument('files', nargs='+', help='pickled examples files')
+    opts = parser.parse_args()
+    convert(opts.folder, opts.files)
@@ -1,3 +1,6 @@
+import numpy as np
+
+
 class Game():
     """
     This class specifies the base Game class. To define your own game, subclass
@@ -59,6 +62,21 @@ class Game():
         """
         pass
 
+    def getValidMovesAfter(self, board, player, action, prevValids):
+        """
+        Input:
+            board: board after action has been played
+            player: current player
+            action: the last action that was applied to reach board
+            prevValids: getValidMoves of the board action was played on
+
+        Returns:
+            validMoves: same as getValidMoves(board, player). Games may
+                        override this to update prevValids incrementally
+                        instead of recomputing the vector from scratch.
+        """
+        return self.getValidMoves(board, player)
+
     def getGameEnded(self, board, player):
         """
         Input:
@@ -72,6 +90,20 @@ class Game():
         """
         pass
 
+    def getGameEndedAfter(self, board, player, action):
+        """
+        Input:
+            board: board after action has been played
+            player: current player (1 or -1)
+            action: the last action that was applied to reach board
+
+        Returns:
+            r: same as getGameEnded(board, player). Games may override this to
+               only inspect the part of the board touched by action, assuming
+               the board before action was not already a finished game.
+        """
+        return self.getGameEnded(board, player)
+
     def getCanonicalForm(self, board, player):
         """
         Input:
@@ -101,6 +133,43 @@ class Game():
         """
         pass
 
+    def getRandomSymmetries(self, boards, pis, rng=np.random):
+        """
+        Input:
+            boards: array of boards, as stacked by a ReplayBuffer
+            pis: array of the matching policy vectors
+            rng: random number generator (np.random or a RandomState)
+
+        Returns:
+            boards, pis: every example replaced by one of its symmetrical
+                         forms from getSymmetries, drawn uniformly. Used to
+                         augment training batches when only one form of
+                         every position is stored. Games may override this
+                         with a version vectorized over the batch.
+        """
+        forms = [self.getSymmetries(board, pi) for board, pi in zip(boards, pis)]
+        forms = [f[rng.randint(len(f))] for f in forms]
+        return (np.array([b for b, _ in forms], dtype=boards.dtype),
+                np.array([p for _, p in forms], dtype=pis.dtype))
+
+    def getSymmetryForms(self, board):
+        """
+        Input:
+            board: current board
+
+        Returns:
+            forms: array of the symmetrical forms of board, as getSymmetries
+                   gives them
+            permutations: array of the matching action permutations: the
+                          policy of form k is pi[permutations[k]], pi being
+                          the policy of board. Used to cache network
+                          evaluations once for all forms of a position (see
+                          EvalCache). Games may override this with a faster
+                          version.
+        """
+        forms = self.getSymmetries(board, np.arange(self.getActionSize()))
+        return np.array([b for b, _ in forms]), np.array([p for _, p in forms], dtype=np.int64)
+
     def stringRepresentation(self, board):
         """
         Input:
@@ -1,16 +1,73 @@
 import logging
 import math
+import sys
+from collections import OrderedDict
 
 import numpy as np
 
 EPS = 1e-8
 
+# rough sizes for the memory budget of MCTS: an (s, a) edge is its key tuple,
+# its Q float and an entry in Qsa and Nsa; a state is its key, its two arrays
+# and an entry in each of Es, Ps, Vs, Ns and the LRU order
+DICT_ENTRY_BYTES = 3 * 8
+EDGE_BYTES = sys.getsizeof((None, 0)) + sys.getsizeof(0.0) + 2 * DICT_ENTRY_BYTES
+STATE_BYTES = 5 * DICT_ENTRY_BYTES
+ARRAY_BYTES = sys.getsizeof(np.empty(0))
+
 log = logging.getLogger(__name__)
 
 
+def maskPolicy(pi, valids):
+    """
+    Returns the network policy pi restricted to the valid moves and
+    renormalized.
+    """
+    pi = pi * valids  # masking invalid moves
+    sum_pi = np.sum(pi)
+    if sum_pi > 0:
+        pi /= sum_pi  # renormalize
+    else:
+        # if all valid moves were masked make all valid moves equally probable
+
+        # NB! All valid moves may be masked if either your NNet architecture is insufficient or you've get overfitting or something else.
+        # If you have got dozens or hundreds of these messages you should pay attention to your NNet and/or training process.   
+        log.error("All valid moves were masked, doing a workaround.")
+        pi = pi + valids
+        pi /= np.sum(pi)
+    return pi
+
+
+def valueOf(v):
+    """
+    Returns the value predicted by the network as a python float. Networks
+    return it as a one element float32 array; keeping the statistics in
+    float64 makes every MCTS implementation round the same way.
+    """
+    return np.asarray(v, dtype=np.float64).item()
+
+
+def mctsClass(args):
+    """
+    Returns the search class args ask for: NodeMCTS if args.nodeMCTS is set or
+    batched leaf evaluation is requested, MCTS otherwise. Both give the same
+    visit counts.
+    """
+    if args.get('nodeMCTS', False) or args.get('mctsBatchSize', 1) > 1:
+        return NodeMCTS
+    return MCTS
+
+
 class MCTS():
     """
     This class handles the MCTS tree.
+
+    With args.mctsMaxNodes and/or args.mctsMaxBytes (0 or missing for no
+    limit) the tree is kept within a budget: after every simulation the
+    least recently visited states other than the root are evicted, together
+    with their edges, until the tree fits again. An evicted state that is
+    reached again is simply a new leaf. stats() reports the resident size and
+    the number of evictions.
     """
 
     def __init__(self, game, nnet, args):
@@ -25,6 +82,16 @@ class MCTS():
         self.Es = {}  # stores game.getGameEnded ended for board s
         self.Vs = {}  # stores game.getValidMoves for board s
 
+        # (s, a) edges of the current simulation, reused by every search
+        self.path = [None] * (game.getActionSize() + 1)
+
+        self.maxNodes = args.get('mctsMaxNodes', 0)
+        self.maxBytes = args.get('mctsMaxBytes', 0)
+        self.bounded = bool(self.maxNodes or self.maxBytes)
+        self.lru = OrderedDict()  # states by last visit, oldest first (bounded trees only)
+        self.residentBytes = 0
+        self.evictions = 0
+
     def getActionProb(self, canonicalBoard, temp=1):
         """
         This function performs numMCTSSims simulations of MCTS starting from
@@ -52,11 +119,12 @@ class MCTS():
         probs = [x / counts_sum for x in counts]
         return probs
 
-    def search(self, canonicalBoard):
+    def search(self, canonicalBoard, action=None, prevValids=None):
         """
-        This function performs one iteration of MCTS. It is recursively called
-        till a leaf node is found. The action chosen at each node is one that
-        has the maximum upper confidence bound as in the paper.
+        This function performs one iteration of MCTS. It walks down from
+        canonicalBoard until a leaf node is found, choosing at each node the
+        action with the maximum upper confidence bound as in the paper, and
+        records the (s, a) edges it takes.
 
         Once a leaf node is found, the neural network is called to return an
         initial policy P and a value v for the state. This value is propagated
@@ -64,73 +132,507 @@ class MCTS():
         outcome is propagated up the search path. The values of Ns, Nsa, Qsa are
         updated.
 
-        NOTE: the return values are the negative of the value of the current
-        state. This is done since v is in [-1,1] and if v is the value of a
-        state for the current player, then its value is -v for the other player.
+        NOTE: the value is negated at every level of the path. This is done
+        since v is in [-1,1] and if v is the value of a state for the current
+        player, then its value is -v for the other player.
+
+        action is the move that led to canonicalBoard (None for the root) and
+        prevValids the valid moves of the parent board. They let the game
+        check for the end of the game around that move only and derive the
+        valid moves of a new leaf from its parent, see Game.getGameEndedAfter
+        and Game.getValidMovesAfter.
 
         Returns:
             v: the negative of the value of the current canonicalBoard
         """
+        path = self.path
+        depth = 0
+        lru = self.lru if self.bounded else None
+
+        while True:
+            s = self.game.stringRepresentation(canonicalBoard)
+            if depth == 0:
+                root = s
+
+            if s not in self.Es:
+                if action is None:
+                    self.Es[s] = self.game.getGameEnded(canonicalBoard, 1)
+                else:
+                    self.Es[s] = self.game.getGameEndedAfter(canonicalBoard, 1, action)
+                if lru is not None:
+                    lru[s] = None
+                    self.residentBytes += sys.getsizeof(s) + STATE_BYTES
+            elif lru is not None:
+                lru.move_to_end(s)
+            if self.Es[s] != 0:
+                # terminal node
+                v = -self.Es[s]
+                break
+
+            if s not in self.Ps:
+                # leaf node
+                pi, v = self.nnet.predict(canonicalBoard)
+                if action is None or prevValids is None:
+                    valids = self.game.getValidMoves(canonicalBoard, 1)
+                else:
+                    valids = self.game.getValidMovesAfter(canonicalBoard, 1, action, prevValids)
+                self.Ps[s] = maskPolicy(pi, valids)
+                self.Vs[s] = valids
+                self.Ns[s] = 0
+                if lru is not None:
+                    self.residentBytes += 2 * ARRAY_BYTES + self.Ps[s].nbytes + valids.nbytes
+                v = -valueOf(v)
+                break
+
+            valids = self.Vs[s]
+            cur_best = -float('inf')
+            best_act = -1
+
+            # pick the action with the highest upper confidence bound
+            for a in range(self.game.getActionSize()):
+                if valids[a]:
+                    if (s, a) in self.Qsa:
+                        u = self.Qsa[(s, a)] + self.args.cpuct * self.Ps[s][a] * math.sqrt(self.Ns[s]) / (
+                                1 + self.Nsa[(s, a)])
+                    else:
+                        u = self.args.cpuct * self.Ps[s][a] * math.sqrt(self.Ns[s] + EPS)  # Q = 0 ?
+
+                    if u > cur_best:
+                        cur_best = u
+                        best_act = a
+
+            a = best_act
+            if depth == len(path):
+                path.extend([None] * len(path))
+            path[depth] = (s, a)
+            depth += 1
+
+            next_s, next_player = self.game.getNextState(canonicalBoard, 1, a)
+            canonicalBoard = self.game.getCanonicalForm(next_s, next_player)
+            action, prevValids = a, valids
+
+        # back up along the path, leaf first
+        for i in range(depth - 1, -1, -1):
+            sa = path[i]
+            if sa in self.Qsa:
+                n = self.Nsa[sa]
+                self.Qsa[sa] = (n * self.Qsa[sa] + v) / (n + 1)
+                self.Nsa[sa] = n + 1
+
+            else:
+                self.Qsa[sa] = v
+                self.Nsa[sa] = 1
+                if lru is not None:
+                    self.residentBytes += EDGE_BYTES
+
+            self.Ns[sa[0]] += 1
+            v = -v
+
+        if lru is not None:
+            self.evict(root)
+        return v
+
+    def evict(self, root):
+        """
+        Evicts the least recently visited states other than root until the
+        tree is within its node and byte budgets.
+        """
+        lru = self.lru
+        while len(lru) > 1 and ((self.maxNodes and len(lru) > self.maxNodes) or
+                                (self.maxBytes and self.residentBytes > self.maxBytes)):
+            s, _ = lru.popitem(last=False)
+            if s == root:
+                lru[s] = None
+                continue
 
+            self.residentBytes -= sys.getsizeof(s) + STATE_BYTES
+            del self.Es[s]
+            if s in self.Ps:
+                valids = self.Vs.pop(s)
+                self.residentBytes -= 2 * ARRAY_BYTES + self.Ps.pop(s).nbytes + valids.nbytes
+                del self.Ns[s]
+                for a in np.flatnonzero(valids).tolist():
+                    if self.Nsa.pop((s, a), None) is not None:
+                        del self.Qsa[(s, a)]
+                        self.residentBytes -= EDGE_BYTES
+            self.evictions += 1
+
+    def stats(self):
+        """
+        Returns a dict with the number of states and the estimated bytes held
+        by the tree and the number of states evicted so far. Bytes are only
+        tracked for bounded trees.
+        """
+        return {'nodes': len(self.Es), 'bytes': self.residentBytes, 'evictions': self.evictions}
+
+
+class Node():
+    """
+    One state of the NodeMCTS tree. The statistics of its edges are stored in
+    arrays over the valid actions only: actions[i] is the action of edge i,
+    P[i] its prior, N[i] its visit count and Q[i] its mean value. VL[i]
+    counts the simulations through edge i that are still waiting for the
+    network in a batched search (virtual losses).
+    """
+    __slots__ = ('board', 'ended', 'actions', 'P', 'N', 'Q', 'Ns', 'children', 'VL', 'vlTotal', 'evaluating')
+
+    def __init__(self, board, ended):
+        self.board = board  # canonical board of this state
+        self.ended = ended  # game.getGameEnded for this state
+        self.actions = None  # None until the node is expanded by the network
+        self.P = None
+        self.N = None
+        self.Q = None
+        self.Ns = 0
+        self.children = None  # child Node of each edge, filled lazily
+        self.VL = None
+        self.vlTotal = 0
+        self.evaluating = False  # True while the leaf is queued for the network
+
+    def expand(self, P, valids):
+        self.actions = np.flatnonzero(valids)
+        self.P = P[self.actions]
+        self.N = np.zeros(len(self.actions), dtype=np.int64)
+        self.Q = np.zeros(len(self.actions), dtype=np.float64)
+        self.children = [None] * len(self.actions)
+
+    def validMoves(self, actionSize):
+        valids = np.zeros(actionSize, dtype=np.int64)
+        valids[self.actions] = 1
+        return valids
+
+
+class NodeMCTS():
+    """
+    Drop-in replacement for MCTS that keeps one Node per state instead of six
+    dicts keyed by (s, a). Selection is one vectorized argmax of Q + U over
+    the valid actions of a node, children are linked from their parent so a
+    simulation only hashes boards it has not seen before, and the search walks
+    down and backs up along an explicit path instead of recursing.
+
+    States are still shared by their stringRepresentation, and the arithmetic
+    and tie breaking follow MCTS exactly, so both produce identical visit
+    counts for the same network.
+
+    With args.mctsBatchSize = K > 1 every round descends K paths, each adding
+    a virtual loss of args.virtualLoss (default 1) to the edges it takes so
+    the following paths spread out, evaluates all new leaves with one
+    nnet.predict_batch call, then backs up the results and removes the
+    virtual losses.
+
+    The tree keeps track of its root. advance(action) promotes the subtree of
+    the move that was played and frees every node that is no longer linked
+    from it; with args.countReusedVisits the visits already made from the new
+    root count towards numMCTSSims.
+    """
+
+    def __init__(self, game, nnet, args):
+        self.game = game
+        self.nnet = nnet
+        self.args = args
+        self.nodes = {}  # stores the Node of every state s seen so far
+        self.root = None  # Node of the last board getActionProb searched from
+
+    def getActionProb(self, canonicalBoard, temp=1):
+        """
+        This function performs numMCTSSims simulations of MCTS starting from
+        canonicalBoard.
+
+        Returns:
+            probs: a policy vector where the probability of the ith action is
+                   proportional to N[a]**(1./temp)
+        """
+        node = self.root = self.getNode(canonicalBoard)
+        numSims = self.simulationBudget(node)
+
+        batchSize = self.args.get('mctsBatchSize', 1)
+        if batchSize > 1:
+            sims = 0
+            while sims < numSims:
+                sims += self.searchBatch(canonicalBoard, min(batchSize, numSims - sims))
+        else:
+            for i in range(numSims):
+                self.search(canonicalBoard)
+
+        return self.actionProb(node, temp)
+
+    def simulationBudget(self, node):
+        """
+        Returns the number of simulations to run from root node: numMCTSSims,
+        less the visits it already has with args.countReusedVisits.
+        """
+        if self.args.get('countReusedVisits', False):
+            return max(0, self.args.numMCTSSims - node.Ns)
+        return self.args.numMCTSSims
+
+    def actionProb(self, node, temp=1, rng=np.random):
+        """
+        Returns the policy getActionProb returns for the visit counts of
+        root node. Ties at temp=0 are broken with rng.
+        """
+        counts = np.zeros(self.game.getActionSize(), dtype=np.int64)
+        if node.actions is not None:
+            counts[node.actions] = node.N
+        counts = counts.tolist()
+
+        if temp == 0:
+            bestAs = np.array(np.argwhere(counts == np.max(counts))).flatten()
+            bestA = rng.choice(bestAs)
+            probs = [0] * len(counts)
+            probs[bestA] = 1
+            return probs
+
+        counts = [x ** (1. / temp) for x in counts]
+        counts_sum = float(sum(counts))
+        probs = [x / counts_sum for x in counts]
+        return probs
+
+    def advance(self, action):
+        """
+        Moves the root to the state reached by playing action from it and
+        frees all nodes that can not be reached from the new root any more.
+        If that state is not in the tree the whole tree is dropped.
+        """
+        root, child = self.root, None
+        if root is not None and root.actions is not None:
+            i = int(np.searchsorted(root.actions, action))
+            if i < len(root.actions) and root.actions[i] == action:
+                child = self.child(root, i)
+        self.root = child
+        if child is None:
+            self.nodes = {}
+            return
+
+        reachable = set()
+        stack = [child]
+        while stack:
+            node = stack.pop()
+            if id(node) in reachable:
+                continue
+            reachable.add(id(node))
+            if node.children is not None:
+                stack.extend(c for c in node.children if c is not None)
+        self.nodes = {s: node for s, node in self.nodes.items() if id(node) in reachable}
+
+    def getNode(self, canonicalBoard, parent=None, action=None):
+        """
+        Returns the Node of canonicalBoard, creating it if the state has not
+        been seen before. parent and action, when known, let the game check
+        for the end of the game around the last move only.
+        """
         s = self.game.stringRepresentation(canonicalBoard)
+        node = self.nodes.get(s)
+        if node is None:
+            if parent is None:
+                ended = self.game.getGameEnded(canonicalBoard, 1)
+            else:
+                ended = self.game.getGameEndedAfter(canonicalBoard, 1, action)
+            node = Node(canonicalBoard, ended)
+            self.nodes[s] = node
+        return node
+
+    def expand(self, node, pi, parent=None, action=None):
+        """
+        Expands a leaf node with the network policy pi.
+        """
+        if parent is None:
+            valids = self.game.getValidMoves(node.board, 1)
+        else:
+            prevValids = parent.validMoves(self.game.getActionSize())
+            valids = self.game.getValidMovesAfter(node.board, 1, action, prevValids)
+        node.expand(maskPolicy(pi, valids), valids)
+
+    def select(self, node):
+        """
+        Returns the index of the edge of node with the highest upper
+        confidence bound. Pending virtual losses count as visits that lost.
+        """
+        cpuct = self.args.cpuct
+        N, Q, Ns = node.N, node.Q, node.Ns
+        if node.vlTotal:
+            loss = self.args.get('virtualLoss', 1)
+            Q = np.where(N + node.VL > 0, (N * Q - loss * node.VL) / np.maximum(N + node.VL, 1), 0)
+            N = N + node.VL
+            Ns = Ns + node.vlTotal
+        visited = cpuct * node.P * math.sqrt(Ns) / (1 + N)
+        visited += Q
+        unvisited = cpuct * node.P * math.sqrt(Ns + EPS)  # Q = 0 ?
+        return int(np.argmax(np.where(N > 0, visited, unvisited)))
+
+    def child(self, node, i):
+        child = node.children[i]
+        if child is None:
+            a = int(node.actions[i])
+            next_s, next_player = self.game.getNextState(node.board, 1, a)
+            next_s = self.game.getCanonicalForm(next_s, next_player)
+            child = self.getNode(next_s, node, a)
+            node.children[i] = child
+        return child
+
+    def descend(self, node, virtualLoss=False):
+        """
+        Walks down from node along the edges with the highest upper confidence
+        bound until it reaches a terminal or unexpanded node.
+
+        Returns:
+            leaf: the node reached
+            parent, action: the node and action leaf was reached from (None
+                            if leaf is node itself)
+            path: the list of (node, edge index) taken
+        """
+        parent = action = None
+        path = []
+        while node.ended == 0 and node.actions is not None:
+            i = self.select(node)
+            path.append((node, i))
+            if virtualLoss:
+                if node.VL is None:
+                    node.VL = np.zeros(len(node.actions), dtype=np.int64)
+                node.VL[i] += 1
+                node.vlTotal += 1
+            parent, action = node, int(node.actions[i])
+            node = self.child(node, i)
+        return node, parent, action, path
 
-        if s not in self.Es:
-            self.Es[s] = self.game.getGameEnded(canonicalBoard, 1)
-        if self.Es[s] != 0:
+    def backup(self, path, v, virtualLoss=False):
+        """
+        Propagates the value v of the leaf at the end of path up to its root,
+        negating it at every level, and removes the virtual losses of the path
+        if it was taken with them.
+
+        Returns:
+            v: the negative of the value of the root of the path
+        """
+        for node, i in reversed(path):
+            if virtualLoss:
+                node.VL[i] -= 1
+                node.vlTotal -= 1
+            n = node.N[i]
+            if n:
+                node.Q[i] = (n * node.Q[i] + v) / (n + 1)
+            else:
+                node.Q[i] = v
+            node.N[i] = n + 1
+            node.Ns += 1
+            v = -v
+        return v
+
+    def search(self, canonicalBoard):
+        """
+        This function performs one iteration of MCTS. It walks down from
+        canonicalBoard choosing the edge with the highest upper confidence
+        bound until it reaches a leaf, which is evaluated by the neural network
+        (or by the game if it is terminal). The value is then backed up along
+        the path, negated at every level, updating N, Q and Ns.
+
+        Returns:
+            v: the negative of the value of the current canonicalBoard
+        """
+        leaf, parent, action, path = self.descend(self.getNode(canonicalBoard))
+        if leaf.ended != 0:
             # terminal node
-            return -self.Es[s]
-
-        if s not in self.Ps:
-            # leaf node
-            self.Ps[s], v = self.nnet.predict(canonicalBoard)
-            valids = self.game.getValidMoves(canonicalBoard, 1)
-            self.Ps[s] = self.Ps[s] * valids  # masking invalid moves
-            sum_Ps_s = np.sum(self.Ps[s])
-            if sum_Ps_s > 0:
-                self.Ps[s] /= sum_Ps_s  # renormalize
+            return self.backup(path, -leaf.ended)
+
+        # leaf node
+        pi, v = self.nnet.predict(leaf.board)
+        self.expand(leaf, pi, parent, action)
+        return self.backup(path, -valueOf(v))
+
+    def gatherLeaves(self, canonicalBoard, k):
+        """
+        Descends up to k paths from canonicalBoard with virtual losses. Paths
+        ending in a terminal state are backed up right away, paths ending in a
+        leaf another path of this round already reached are dropped.
+
+        Returns:
+            leaves: list of (leaf, parent, action, path) to evaluate with the
+                    network and pass to expandLeaves
+            done: number of simulations completed on terminal states
+        """
+        root = self.getNode(canonicalBoard)
+        leaves = []
+        done = 0
+        for _ in range(k):
+            leaf, parent, action, path = self.descend(root, virtualLoss=True)
+            if leaf.ended != 0:
+                self.backup(path, -leaf.ended, virtualLoss=True)
+                done += 1
+            elif leaf.evaluating:
+                # collision with an earlier path of this round
+                for node, i in path:
+                    node.VL[i] -= 1
+                    node.vlTotal -= 1
             else:
-                # if all valid moves were masked make all valid moves equally probable
-
-                # NB! All valid moves may be masked if either your NNet architecture is insufficient or you've get overfitting or something else.
-                # If you have got dozens or hundreds of these messages you should pay attention to your NNet and/or training process.   
-                log.error("All valid moves were masked, doing a workaround.")
-                self.Ps[s] = self.Ps[s] + valids
-                self.Ps[s] /= np.sum(self.Ps[s])
-
-            self.Vs[s] = valids
-            self.Ns[s] = 0
-            return -v
-
-        valids = self.Vs[s]
-        cur_best = -float('inf')
-        best_act = -1
-
-        # pick the action with the highest upper confidence bound
-        for a in range(self.game.getActionSize()):
-            if valids[a]:
-                if (s, a) in self.Qsa:
-                    u = self.Qsa[(s, a)] + self.args.cpuct * self.Ps[s][a] * math.sqrt(self.Ns[s]) / (
-                            1 + self.Nsa[(s, a)])
-                else:
-                    u = self.args.cpuct * self.Ps[s][a] * math.sqrt(self.Ns[s] + EPS)  # Q = 0 ?
+                leaf.evaluating = True
+                leaves.append((leaf, parent, action, path))
+        return leaves, done
 
-                if u > cur_best:
-                    cur_best = u
-                    best_act = a
+    def expandLeaves(self, leaves, pis, vs):
+        """
+        Expands the leaves returned by gatherLeaves with the network outputs
+        pis, vs and backs their values up.
+        """
+        for (leaf, parent, action, path), pi, v in zip(leaves, pis, vs):
+            self.expand(leaf, pi, parent, action)
+            leaf.evaluating = False
+            self.backup(path, -valueOf(v), virtualLoss=True)
 
-        a = best_act
-        next_s, next_player = self.game.getNextState(canonicalBoard, 1, a)
-        next_s = self.game.getCanonicalForm(next_s, next_player)
+    def searchBatch(self, canonicalBoard, k):
+        """
+        Performs one round of batched MCTS: up to k simulations whose leaves
+        are evaluated with a single nnet.predict_batch call.
 
-        v = self.search(next_s)
+        Returns:
+            sims: number of simulations completed (at least 1)
+        """
+        leaves, done = self.gatherLeaves(canonicalBoard, k)
+        if leaves:
+            pis, vs = self.nnet.predict_batch([leaf.board for leaf, _, _, _ in leaves])
+            self.expandLeaves(leaves, pis, vs)
+        return done + len(leaves)
 
-        if (s, a) in self.Qsa:
-            self.Qsa[(s, a)] = (self.Nsa[(s, a)] * self.Qsa[(s, a)] + v) / (self.Nsa[(s, a)] + 1)
-            self.Nsa[(s, a)] += 1
 
-        else:
-            self.Qsa[(s, a)] = v
-            self.Nsa[(s, a)] = 1
+class MCTSPlayer():
+    """
+    Arena player that picks the most visited move of an MCTS. If the search
+    tree supports it (NodeMCTS), the root follows the game: it is advanced
+    after the player's own moves and, through Arena's notify hook, after the
+    opponent's moves, so the subtree of the position reached is reused.
+    """
+
+    def __init__(self, mcts, temp=0):
+        self.mcts = mcts
+        self.temp = temp
+
+    def __call__(self, canonicalBoard):
+        action = int(np.argmax(self.mcts.getActionProb(canonicalBoard, temp=self.temp)))
+        if hasattr(self.mcts, 'advance'):
+            self.mcts.advance(action)
+        return action
+
+    def notify(self, board, action):
+        if hasattr(self.mcts, 'advance'):
+            self.mcts.advance(action)
+
+
+class MCTSPlayerSpec():
+    """
+    Picklable description of an MCTSPlayer, for Arena games played in other
+    processes: the network class, the search args, and where the weights
+    come from, either a checkpoint (folder, filename) or a
+    NeuralNet.snapshot. build(game) creates the network and the player.
+    """
+
+    def __init__(self, nnetClass, args, checkpoint=None, weights=None):
+        self.nnetClass = nnetClass
+        self.args = args
+        self.checkpoint = checkpoint
+        self.weights = weights
 
-        self.Ns[s] += 1
-        return -v
+    def build(self, game):
+        nnet = self.nnetClass(game)
+        if self.checkpoint is not None:
+            nnet.load_checkpoint(*self.checkpoint)
+        if self.weights is not None:
+            nnet.restore(self.weights)
+        return MCTSPlayer(mctsClass(self.args)(game, nnet, self.args))
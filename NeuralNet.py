@@ -1,3 +1,7 @@
+import os
+import tempfile
+
+
 class NeuralNet():
     """
     This class specifies the base NeuralNet class. To define your own neural
@@ -6,7 +10,13 @@ class NeuralNet():
     the canonical form of the board.
 
     See othello/NNet.py for an example implementation.
+
+    Wrappers whose train draws the symmetries of a ReplayBuffer with augment
+    (see ReplayBuffer.sample) set lazySymmetries to True; Coach refuses
+    args.lazySymmetries with the others, which would train on one form of
+    every position only.
     """
+    lazySymmetries = False
 
     def __init__(self, game):
         pass
@@ -36,6 +46,21 @@ class NeuralNet():
         """
         pass
 
+    def predict_batch(self, boards):
+        """
+        Input:
+            boards: a list of boards in their canonical form.
+
+        Returns:
+            pis: the policy vector of every board, as predict returns it
+            vs: the value of every board, as predict returns it
+
+        The default implementation calls predict on every board. Wrappers
+        should override it to evaluate all boards in one forward pass.
+        """
+        results = [self.predict(board) for board in boards]
+        return [pi for pi, _ in results], [v for _, v in results]
+
     def save_checkpoint(self, folder, filename):
         """
         Saves the current neural network (with its parameters) in
@@ -48,3 +73,52 @@ class NeuralNet():
         Loads parameters of the neural network from folder/filename
         """
         pass
+
+    def snapshot(self):
+        """
+        Returns the parameters of the neural network as a picklable object
+        held in memory, to be passed to restore (possibly of a network of the
+        same class in another process).
+
+        The default implementation saves a checkpoint to a temporary folder
+        and returns the contents of the files written. Wrappers should
+        override it to copy their weights directly.
+        """
+        with tempfile.TemporaryDirectory() as folder:
+            self.save_checkpoint(folder, 'snapshot.pth.tar')
+            files = {}
+            for name in os.listdir(folder):
+                with open(os.path.join(folder, name), 'rb') as f:
+                    files[name] = f.read()
+        return files
+
+    def restore(self, snapshot):
+        """
+        Loads parameters returned by snapshot.
+        """
+        with tempfile.TemporaryDirectory() as folder:
+            for name, data in snapshot.items():
+                with open(os.path.join(folder, name), 'wb') as f:
+                    f.write(data)
+            self.load_checkpoint(folder, 'snapshot.pth.tar')
+
+    def save_snapshot(self, snapshot, folder, filename):
+        """
+        Saves parameters returned by snapshot in folder/filename as
+        save_checkpoint would save them, without changing this network: it
+        is called from another thread while the network goes on training
+        (see Coach.CheckpointWriter).
+
+        The default implementation writes the files of the default snapshot,
+        which are those save_checkpoint wrote for 'snapshot.pth.tar', under
+        filename (or its part before the first dot for wrappers that change
+        the extension). Wrappers that override snapshot should override it
+        too, to write their weights directly.
+        """
+        for name, data in snapshot.items():
+            if name.startswith('snapshot.pth.tar'):
+                name = filename + name[len('snapshot.pth.tar'):]
+            else:
+                name = filename.split('.')[0] + name[len('snapshot'):]
+            with open(os.path.join(folder, name), 'wb') as f:
+                f.write(data)
@@ -0,0 +1,277 @@
+"""
+Self-play on other machines: Coach.learn runs a Coordinator when
+args.coordinatorAddress is set, and every machine runs workers that connect
+to it:
+
+    python selfplay_worker.py HOST:PORT --authkey KEY --processes 4
+
+The coordinator and the workers talk over TCP with the pickled messages of
+multiprocessing.connection, authenticated with args.coordinatorAuthkey.
+A worker registers and gets the game, the network class and the args; it
+then asks for episodes to play. The weights of the network are fetched only
+when the content hash the coordinator gives with an episode differs from
+the one the worker has. The examples of every episode are sent back as one
+compressed batch, and end up in the replay buffer and example store of
+Coach as the examples of the local workers do.
+"""
+import hashlib
+import logging
+import pickle
+import queue
+import socket
+import threading
+import time
+import zlib
+from collections import deque
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+
+def parseAddress(address):
+    """
+    Returns (host, port) of 'HOST:PORT', or of a (host, port) pair.
+    """
+    if isinstance(address, str):
+        host, port = address.rsplit(':', 1)
+        return host, int(port)
+    host, port = address
+    return host, int(port)
+
+
+def packExamples(examples):
+    """
+    Returns the examples of an episode, a list of (board, pi, v), as
+    compressed bytes for unpackExamples.
+    """
+    boards, pis, vs = zip(*examples)
+    arrays = (np.asarray(boards), np.asarray(pis, dtype=np.float32), np.asarray(vs, dtype=np.float32))
+    return zlib.compress(pickle.dumps(arrays, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+def unpackExamples(data):
+    boards, pis, vs = pickle.loads(zlib.decompress(data))
+    return [(board, pi, float(v)) for board, pi, v in zip(boards, pis, vs)]
+
+
+class Coordinator():
+    """
+    Hands out the self-play episodes of every iteration to the remote
+    workers connected to args.coordinatorAddress, in the place of
+    Coach.SelfPlayWorkers: play and close behave the same.
+
+    Episodes are handed out a few at a time (args.lockstepGames per
+    request). The episodes a worker holds when it disconnects, or has not
+    sent back args.remoteJobTimeout seconds after it got them, are handed
+    out again, and examples of an earlier iteration or of an episode already
+    received are dropped. play gives up with an error when no episode
+    arrives for args.remoteStallTimeout seconds.
+    """
+
+    def __init__(self, game, nnet, args):
+        authkey = args.get('coordinatorAuthkey')
+        if not authkey:
+            raise ValueError('args.coordinatorAuthkey is needed to accept remote workers')
+        self.game = game
+        self.nnetClass = nnet.__class__
+        self.args = args
+        self.jobTimeout = args.get('remoteJobTimeout', 1800)
+        self.stallTimeout = args.get('remoteStallTimeout', 3600)
+        self.lock = threading.Lock()
+        self.iteration = None
+        self.model = (None, None)  # (content hash, pickled weights) of the network playing
+        self.todo = deque()  # episodes of the iteration not handed out
+        self.handedOut = {}  # episode -> (deadline, worker) for the episodes of the iteration being played
+        self.done = set()  # episodes of the iteration received
+        self.results = queue.Queue()
+        self.closed = False
+        self.listener = Listener(parseAddress(args.coordinatorAddress),
+                                 authkey=authkey.encode() if isinstance(authkey, str) else authkey)
+        self.address = self.listener.address
+        log.info('Waiting for self-play workers on %s:%d' % self.address)
+        threading.Thread(target=self.accept, daemon=True).start()
+
+    def accept(self):
+        while True:
+            try:
+                connection = self.listener.accept()
+            except (OSError, AuthenticationError):
+                if self.closed:
+                    return
+                log.warning('Refused a connection to the coordinator', exc_info=True)
+                continue
+            threading.Thread(target=self.serve, args=(connection,), daemon=True).start()
+
+    def serve(self, connection):
+        """
+        Answers the requests of one worker until it disconnects.
+        """
+        name = None
+        worker = object()  # marks the episodes handed to this worker
+        try:
+            while True:
+                request = connection.recv()
+                if request[0] == 'register':
+                    name = request[1]
+                    log.info(f'Self-play worker {name} registered')
+                    connection.send((self.game, self.nnetClass, self.args))
+                elif request[0] == 'job':
+                    connection.send(self.job(worker, request[1]))
+                elif request[0] == 'model':
+                    with self.lock:
+                        modelHash, weights = self.model
+                    connection.send(('model', modelHash, weights))
+                elif request[0] == 'examples':
+                    self.receive(*request[1:])
+                    connection.send(('ok',))
+        except (EOFError, OSError):
+            pass
+        finally:
+            connection.close()
+            with self.lock:
+                lost = sorted(episode for episode, (_, holder) in self.handedOut.items() if holder is worker)
+                for episode in lost:
+                    del self.handedOut[episode]
+                self.todo.extendleft(reversed(lost))
+            if name is not None:
+                log.info(f'Self-play worker {name} left' + (f', handing out episodes {lost} again' if lost else ''))
+
+    def job(self, worker, count):
+        with self.lock:
+            if self.closed:
+                return ('stop',)
+            self.expire()
+            episodes = [self.todo.popleft() for _ in range(min(count, len(self.todo)))]
+            if not episodes:
+                return ('wait', 0.5)
+            deadline = time.time() + self.jobTimeout
+            for episode in episodes:
+                self.handedOut[episode] = (deadline, worker)
+            return ('play', self.iteration, episodes, self.model[0])
+
+    def expire(self):
+        """
+        Hands out again the episodes whose worker is past its deadline; a
+        worker that stays connected but hangs would hold them forever.
+        Called with the lock held.
+        """
+        now = time.time()
+        expired = sorted(episode for episode, (deadline, _) in self.handedOut.items() if deadline < now)
+        for episode in expired:
+            del self.handedOut[episode]
+        if expired:
+            log.warning(f'Episodes {expired} not received within {self.jobTimeout} s, handing them out again')
+            self.todo.extendleft(reversed(expired))
+
+    def receive(self, iteration, episode, data):
+        with self.lock:
+            if iteration != self.iteration or episode in self.done:
+                return
+            # a late worker may still send an episode handed out again since
+            self.handedOut.pop(episode, None)
+            if episode in self.todo:
+                self.todo.remove(episode)
+            self.done.add(episode)
+            self.results.put(data)
+
+    def play(self, iteration, nnet, numEps):
+        """
+        Has the workers play numEps episodes with the weights of nnet and
+        yields the examples of every episode as soon as it arrives. Raises
+        RuntimeError when no episode arrives for args.remoteStallTimeout
+        seconds.
+        """
+        weights = pickle.dumps(nnet.snapshot(), protocol=pickle.HIGHEST_PROTOCOL)
+        with self.lock:
+            self.iteration = iteration
+            self.model = (hashlib.sha256(weights).hexdigest(), weights)
+            self.todo = deque(range(numEps))
+            self.handedOut = {}
+            self.done = set()
+            self.results = results = queue.Queue()
+        for received in range(numEps):
+            waited = 0
+            while True:
+                try:
+                    data = results.get(timeout=min(60, self.stallTimeout - waited))
+                    break
+                except queue.Empty:
+                    waited += min(60, self.stallTimeout - waited)
+                    if waited >= self.stallTimeout:
+                        raise RuntimeError(f'No episode from the self-play workers for {waited} s, '
+                                           f'{numEps - received} of {numEps} to go')
+                    log.warning(f'No episode from the self-play workers for {waited} s, '
+                                f'{numEps - received} of {numEps} to go')
+            yield unpackExamples(data)
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+        self.listener.close()
+
+
+class RemoteWorker():
+    """
+    Connection of a self-play worker to a Coordinator. register returns
+    what the worker needs to play, jobs yields the episodes to play with the
+    weights to play them with.
+    """
+
+    def __init__(self, address, authkey, timeout=300):
+        """
+        Connects to the coordinator at address, retrying for up to timeout
+        seconds while it is not listening yet.
+        """
+        address = parseAddress(address)
+        authkey = authkey.encode() if isinstance(authkey, str) else authkey
+        deadline = time.time() + timeout
+        while True:
+            try:
+                self.connection = Client(address, authkey=authkey)
+                break
+            except ConnectionRefusedError:
+                if time.time() > deadline:
+                    raise
+                time.sleep(2)
+        self.modelHash = None
+        self.downloads = 0
+
+    def request(self, *message):
+        self.connection.send(message)
+        return self.connection.recv()
+
+    def register(self):
+        """
+        Returns (game, nnetClass, args) of the coordinator.
+        """
+        return self.request('register', socket.gethostname())
+
+    def jobs(self, count):
+        """
+        Yields (iteration, episodes, weights) until the coordinator stops,
+        asking for count episodes at a time. weights is None when the
+        network is the one of the previous job.
+        """
+        while True:
+            job = self.request('job', count)
+            if job[0] == 'stop':
+                return
+            if job[0] == 'wait':
+                time.sleep(job[1])
+                continue
+            _, iteration, episodes, modelHash = job
+            weights = None
+            if modelHash != self.modelHash:
+                _, self.modelHash, data = self.request('model')
+                weights = pickle.loads(data)
+                self.downloads += 1
+            yield iteration, episodes, weights
+
+    def send(self, iteration, episode, examples):
+        self.request('examples', iteration, episode, packExamples(examples))
+
+    def close(self):
+        self.connection.close()
@@ -0,0 +1,198 @@
+import logging
+from collections import deque
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+
+class ReplayBuffer():
+    """
+    Training examples of the latest iterations, stored in numpy arrays used
+    as a ring: boards as int8 (or boardDtype), policies and values as
+    float32. The arrays start empty and grow, doubling, as iterations arrive,
+    up to capacity examples (see nbytes), so a large capacity costs nothing
+    until the examples are there.
+
+    Examples are added one whole iteration at a time. Once the buffer holds
+    window iterations, or an iteration does not fit in the free space, the
+    oldest iterations are retired as a whole.
+
+    The buffer behaves as a read-only sequence of (board, pi, v) examples,
+    oldest first, so NeuralNet.train implementations that index or iterate
+    over their examples accept it as it is. sample draws a random minibatch
+    as arrays without building any list of examples.
+
+    With augment the buffer holds one form of every position only, and sample
+    hands each drawn example to augment (Game.getRandomSymmetries) to get one
+    of its symmetries; symmetries is how many forms every position stands for.
+    """
+
+    def __init__(self, boardShape, actionSize, capacity, window, boardDtype=np.int8, augment=None, symmetries=1):
+        """
+        Input:
+            boardShape: shape of a board, e.g. (n, n)
+            actionSize: length of a policy vector
+            capacity: maximum number of examples held
+            window: maximum number of iterations held
+            boardDtype: dtype boards are stored as, every board must fit in it
+            augment: function (boards, pis, rng) -> (boards, pis) applied to
+                     the batches sample draws, or None
+            symmetries: number of forms every example held stands for
+        """
+        self.capacity = capacity
+        self.window = window
+        self.boards = np.zeros((0,) + tuple(boardShape), dtype=boardDtype)
+        self.pis = np.zeros((0, actionSize), dtype=np.float32)
+        self.vs = np.zeros(0, dtype=np.float32)
+        self.start = 0  # index of the oldest example
+        self.size = 0  # number of examples held
+        self.sizes = deque()  # number of examples of every iteration held, oldest first
+        self.augment = augment
+        self.symmetries = symmetries
+
+    @property
+    def nbytes(self):
+        """
+        Memory the arrays take now.
+        """
+        return self.boards.nbytes + self.pis.nbytes + self.vs.nbytes
+
+    def grow(self, size):
+        """
+        Makes room for size examples, at least doubling the arrays (up to
+        capacity), which then hold the examples from index 0.
+        """
+        allocated = min(self.capacity, max(size, 2 * len(self.vs)))
+        i = (self.start + np.arange(self.size)) % max(len(self.vs), 1)
+        for name in ('boards', 'pis', 'vs'):
+            store = getattr(self, name)
+            grown = np.zeros((allocated,) + store.shape[1:], dtype=store.dtype)
+            grown[:self.size] = store[i]
+            setattr(self, name, grown)
+        self.start = 0
+
+    def numIterations(self):
+        return len(self.sizes)
+
+    def __len__(self):
+        return self.size
+
+    def numSamples(self):
+        """
+        Number of distinct examples sample draws from, what an epoch of
+        training over the buffer should cover.
+        """
+        return self.size * self.symmetries
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self.size
+        if not 0 <= i < self.size:
+            raise IndexError('example index out of range')
+        i = (self.start + i) % len(self.vs)
+        return self.boards[i], self.pis[i], float(self.vs[i])
+
+    def __iter__(self):
+        for i in range(self.size):
+            yield self[i]
+
+    def append(self, examples):
+        """
+        Adds the examples of one iteration, a sequence of (board, pi, v) as
+        Coach.executeEpisode returns them.
+        """
+        examples = list(examples)
+        if examples:
+            boards, pis, vs = zip(*examples)
+        else:
+            boards, pis, vs = self.boards[:0], self.pis[:0], self.vs[:0]
+        self.appendArrays(boards, pis, vs)
+
+    def appendArrays(self, boards, pis, vs):
+        """
+        Adds the examples of one iteration given as arrays of boards,
+        policies and values. If there are more than capacity of them only the
+        latest are kept.
+        """
+        boards = np.asarray(boards)
+        if not np.array_equal(boards.astype(self.boards.dtype), boards):
+            raise ValueError(f'ReplayBuffer stores boards as {self.boards.dtype}, these boards do not fit')
+        n = min(len(boards), self.capacity)
+        boards, pis, vs = boards[len(boards) - n:], np.asarray(pis)[len(pis) - n:], np.asarray(vs)[len(vs) - n:]
+
+        while self.sizes and (len(self.sizes) >= self.window or self.size + n > self.capacity):
+            self.retire()
+        if self.size + n > len(self.vs):
+            self.grow(self.size + n)
+
+        if n:
+            allocated = len(self.vs)
+            end = (self.start + self.size) % allocated
+            first = min(n, allocated - end)
+            for store, data in ((self.boards, boards), (self.pis, pis), (self.vs, vs)):
+                store[end:end + first] = data[:first]
+                store[:n - first] = data[first:]
+        self.sizes.append(n)
+        self.size += n
+
+    def retire(self):
+        """
+        Drops the oldest iteration.
+        """
+        n = self.sizes.popleft()
+        self.start = (self.start + n) % len(self.vs)
+        self.size -= n
+        log.info(f'Retired {n} examples of the oldest iteration, {self.size} examples left')
+
+    def sample(self, batchSize, rng=np.random):
+        """
+        Returns batchSize examples drawn uniformly with replacement, as arrays
+        boards (int8 or boardDtype), pis and vs (float32), each in a random
+        symmetrical form if the buffer has augment.
+        """
+        boards, pis, vs = self.gather(rng.randint(self.size, size=batchSize))
+        if self.augment is not None:
+            boards, pis = self.augment(boards, pis, rng)
+        return boards, pis, vs
+
+    def gather(self, indices):
+        """
+        Returns the examples at indices (an array, oldest is 0) as arrays
+        boards, pis and vs, gathered straight from the ring.
+        """
+        i = (self.start + np.asarray(indices)) % len(self.vs)
+        return self.boards[i], self.pis[i], self.vs[i]
+
+    def iteration(self, k):
+        """
+        Returns iteration k of the iterations held (oldest is 0, newest is
+        -1) as a tuple of arrays (boards, pis, vs) in the form appendArrays
+        takes.
+        """
+        if k < 0:
+            k += len(self.sizes)
+        if not 0 <= k < len(self.sizes):
+            raise IndexError('iteration index out of range')
+        offset = sum(self.sizes[j] for j in range(k))
+        i = (self.start + offset + np.arange(self.sizes[k])) % len(self.vs)
+        return self.boards[i], self.pis[i], self.vs[i]
+
+    def iterations(self):
+        """
+        Returns the iterations held, oldest first, see iteration.
+        """
+        return [self.iteration(k) for k in range(len(self.sizes))]
+
+    def __getstate__(self):
+        # only the examples held are pickled, not the free end of the arrays;
+        # augment is left for the owner to set again
+        return {'boardShape': self.boards.shape[1:], 'actionSize': self.pis.shape[1],
+                'capacity': self.capacity, 'window': self.window, 'boardDtype': self.boards.dtype,
+                'iterations': self.iterations()}
+
+    def __setstate__(self, state):
+        self.__init__(state['boardShape'], state['actionSize'], state['capacity'], state['window'],
+                      state['boardDtype'])
+        for boards, pis, vs in state['iterations']:
+            self.appendArrays(boards, pis, vs)
@@ -0,0 +1,422 @@
+"""
+Benchmarks for the connect6 self-play hot paths.
+
+    python benchmark.py keys [--net uniform|pytorch] [--sims 25]
+    python benchmark.py search [--net uniform|pytorch] [--sims 25]
+    python benchmark.py batch [--net uniform|pytorch] [--sims 25] [--moves 20]
+    python benchmark.py reuse [--net uniform|pytorch] [--sims 25]
+    python benchmark.py depth [--sims 20]
+    python benchmark.py budget [--net uniform|pytorch] [--sims 25] [--moves 60]
+    python benchmark.py lockstep [--net uniform|pytorch] [--sims 25] [--size 19]
+    python benchmark.py infer [--size 19] [--arch fc|resnet] [--checkpoint FOLDER/FILE]
+    python benchmark.py loader [--size 19] [--moves 20000]
+
+The uniform network returns a flat policy and a zero value without any
+computation, which isolates the cost of the search itself.
+"""
+import argparse
+import math
+import sys
+import time
+
+import numpy as np
+
+from Coach import LockstepSelfPlay
+from MCTS import EPS, MCTS, NodeMCTS, maskPolicy, valueOf
+from connect6.BitboardGame import BitboardGobangGame
+from connect6.GobangGame import GobangGame
+from utils import dotdict
+
+
+class UniformNet():
+    def __init__(self, game):
+        self.pi = np.ones(game.getActionSize()) / game.getActionSize()
+
+    def predict(self, board):
+        return self.pi, 0.0
+
+
+class CountingNet():
+    """Wraps a network and counts the positions it evaluates."""
+
+    def __init__(self, nnet):
+        self.nnet = nnet
+        self.calls = 0
+
+    def predict(self, board):
+        self.calls += 1
+        return self.nnet.predict(board)
+
+    def predict_batch(self, boards):
+        self.calls += len(boards)
+        if hasattr(self.nnet, 'predict_batch'):
+            return self.nnet.predict_batch(boards)
+        return tuple(zip(*[self.nnet.predict(board) for board in boards]))
+
+
+class LineNet():
+    """Puts all of the policy on the first valid move, so every simulation
+    follows the same line one ply deeper than the previous one."""
+
+    def __init__(self, game):
+        self.game = game
+
+    def predict(self, board):
+        pi = np.zeros(self.game.getActionSize())
+        pi[np.argmax(self.game.getValidMoves(board, 1))] = 1
+        return pi, 0.0
+
+
+class RecursiveMCTS(MCTS):
+    """The recursive search MCTS had before it walked the path in a loop,
+    kept as the baseline of bench_depth."""
+
+    def search(self, canonicalBoard, action=None, prevValids=None):
+        s = self.game.stringRepresentation(canonicalBoard)
+
+        if s not in self.Es:
+            if action is None:
+                self.Es[s] = self.game.getGameEnded(canonicalBoard, 1)
+            else:
+                self.Es[s] = self.game.getGameEndedAfter(canonicalBoard, 1, action)
+        if self.Es[s] != 0:
+            return -self.Es[s]
+
+        if s not in self.Ps:
+            pi, v = self.nnet.predict(canonicalBoard)
+            if action is None or prevValids is None:
+                valids = self.game.getValidMoves(canonicalBoard, 1)
+            else:
+                valids = self.game.getValidMovesAfter(canonicalBoard, 1, action, prevValids)
+            self.Ps[s] = maskPolicy(pi, valids)
+            self.Vs[s] = valids
+            self.Ns[s] = 0
+            return -valueOf(v)
+
+        valids = self.Vs[s]
+        cur_best = -float('inf')
+        best_act = -1
+        for a in range(self.game.getActionSize()):
+            if valids[a]:
+                if (s, a) in self.Qsa:
+                    u = self.Qsa[(s, a)] + self.args.cpuct * self.Ps[s][a] * math.sqrt(self.Ns[s]) / (
+                            1 + self.Nsa[(s, a)])
+                else:
+                    u = self.args.cpuct * self.Ps[s][a] * math.sqrt(self.Ns[s] + EPS)
+
+                if u > cur_best:
+                    cur_best = u
+                    best_act = a
+
+        a = best_act
+        next_s, next_player = self.game.getNextState(canonicalBoard, 1, a)
+        next_s = self.game.getCanonicalForm(next_s, next_player)
+
+        v = self.search(next_s, a, valids)
+
+        if (s, a) in self.Qsa:
+            self.Qsa[(s, a)] = (self.Nsa[(s, a)] * self.Qsa[(s, a)] + v) / (self.Nsa[(s, a)] + 1)
+            self.Nsa[(s, a)] += 1
+        else:
+            self.Qsa[(s, a)] = v
+            self.Nsa[(s, a)] = 1
+
+        self.Ns[s] += 1
+        return -v
+
+
+def make_net(name, game):
+    if name == 'pytorch':
+        from connect6.pytorch.NNet import NNetWrapper
+        return NNetWrapper(game)
+    return UniformNet(game)
+
+
+def mcts_bytes(mcts):
+    """Approximate memory held by the tables of an MCTS: dict slots, the
+    state keys, the (s, a) tuples and the stored values."""
+    if isinstance(mcts, NodeMCTS):
+        return node_mcts_bytes(mcts)
+    total = 0
+    for table in (mcts.Qsa, mcts.Nsa, mcts.Ns, mcts.Ps, mcts.Es, mcts.Vs):
+        total += sys.getsizeof(table)
+    total += sum(sys.getsizeof(s) for s in mcts.Ns)
+    total += sum(sys.getsizeof(sa) + sys.getsizeof(q) for sa, q in mcts.Qsa.items())
+    total += sum(p.nbytes + v.nbytes for p, v in zip(mcts.Ps.values(), mcts.Vs.values()))
+    return total
+
+
+def node_mcts_bytes(mcts):
+    total = sys.getsizeof(mcts.nodes)
+    for s, node in mcts.nodes.items():
+        total += sys.getsizeof(s) + sys.getsizeof(node)
+        if node.actions is not None:
+            total += sum(a.nbytes for a in (node.actions, node.P, node.N, node.Q))
+            total += sys.getsizeof(node.children)
+    return total
+
+
+def selfplay_game(game, nnet, args, seed=0, mcts_class=MCTS, max_moves=None, reuse=False):
+    """Plays one self-play game (or its first max_moves moves) the way
+    Coach.executeEpisode does and returns (moves, simulations, seconds, peak
+    MCTS bytes). With reuse the tree is advanced after every move."""
+    np.random.seed(seed)
+    mcts = mcts_class(game, nnet, args)
+    board, player = game.getInitBoard(), 1
+    moves, seconds, peak = 0, 0.0, 0
+    while True:
+        canonical = game.getCanonicalForm(board, player)
+        start = time.time()
+        pi = mcts.getActionProb(canonical, temp=int(moves < args.tempThreshold))
+        seconds += time.time() - start
+        peak = max(peak, mcts_bytes(mcts))
+        action = np.random.choice(len(pi), p=pi)
+        if reuse:
+            mcts.advance(action)
+        board, player = game.getNextState(board, player, action)
+        moves += 1
+        if game.getGameEndedAfter(board, player, action) != 0 or moves == max_moves:
+            return moves, moves * args.numMCTSSims, seconds, peak
+
+
+def bench_keys(opts):
+    args = dotdict({'numMCTSSims': opts.sims, 'cpuct': 1.0, 'tempThreshold': 15})
+    configs = [
+        ('numpy, board.tobytes()', GobangGame(19)),
+        ('numpy, zobrist', GobangGame(19, zobrist=True)),
+        ('numpy, zobrist + verify', GobangGame(19, zobrist=True, verifyKeys=True)),
+        ('bitboard, (first, second)', BitboardGobangGame(19)),
+        ('bitboard, zobrist', BitboardGobangGame(19, zobrist=True)),
+        ('bitboard, zobrist + verify', BitboardGobangGame(19, zobrist=True, verifyKeys=True)),
+    ]
+    nnet = make_net(opts.net, configs[0][1])
+    print('%-28s %6s %10s %12s' % ('position keys', 'moves', 'sims/s', 'peak MCTS MB'))
+    for name, game in configs:
+        moves, sims, seconds, peak = selfplay_game(game, nnet, args, opts.seed)
+        print('%-28s %6d %10.0f %12.1f' % (name, moves, sims / seconds, peak / 2 ** 20))
+
+
+def bench_search(opts):
+    args = dotdict({'numMCTSSims': opts.sims, 'cpuct': 1.0, 'tempThreshold': 15})
+    configs = [
+        ('MCTS, numpy', MCTS, GobangGame(19)),
+        ('NodeMCTS, numpy', NodeMCTS, GobangGame(19)),
+        ('MCTS, bitboard zobrist', MCTS, BitboardGobangGame(19, zobrist=True)),
+        ('NodeMCTS, bitboard zobrist', NodeMCTS, BitboardGobangGame(19, zobrist=True)),
+    ]
+    nnet = make_net(opts.net, configs[0][2])
+    print('%-28s %6s %10s %12s' % ('search', 'moves', 'sims/s', 'peak MCTS MB'))
+    for name, mcts_class, game in configs:
+        moves, sims, seconds, peak = selfplay_game(game, nnet, args, opts.seed, mcts_class)
+        print('%-28s %6d %10.0f %12.1f' % (name, moves, sims / seconds, peak / 2 ** 20))
+
+
+def bench_batch(opts):
+    game = BitboardGobangGame(19, zobrist=True)
+    nnet = make_net(opts.net, game)
+    print('%-28s %6s %10s' % ('NodeMCTS, bitboard zobrist', 'moves', 'sims/s'))
+    for batch in (1, 4, 8, 16, 32):
+        args = dotdict({'numMCTSSims': opts.sims, 'cpuct': 1.0, 'tempThreshold': 15, 'mctsBatchSize': batch})
+        moves, sims, seconds, _ = selfplay_game(game, nnet, args, opts.seed, NodeMCTS, opts.moves)
+        print('%-28s %6d %10.0f' % ('mctsBatchSize %d' % batch, moves, sims / seconds))
+
+
+def bench_reuse(opts):
+    game = BitboardGobangGame(19, zobrist=True)
+    base = {'numMCTSSims': opts.sims, 'cpuct': 1.0, 'tempThreshold': 15}
+    configs = [
+        ('no reuse', False, {}),
+        ('reuse', True, {}),
+        ('reuse, count reused visits', True, {'countReusedVisits': True}),
+    ]
+    print('%-28s %6s %12s %10s %12s' % ('NodeMCTS, bitboard zobrist', 'moves', 'evals/move', 'seconds', 'peak MCTS MB'))
+    for name, reuse, extra in configs:
+        nnet = CountingNet(make_net(opts.net, game))
+        args = dotdict(dict(base, **extra))
+        moves, _, seconds, peak = selfplay_game(game, nnet, args, opts.seed, NodeMCTS, opts.moves, reuse)
+        print('%-28s %6d %12.1f %10.2f %12.1f' % (name, moves, nnet.calls / float(moves), seconds, peak / 2 ** 20))
+
+
+def bench_depth(opts):
+    """Times simulations down a line of the given depth with the iterative
+    search of MCTS and with the recursive one it replaced."""
+    game = GobangGame(19)
+    args = dotdict({'numMCTSSims': opts.sims, 'cpuct': 1.0})
+    print('%-28s %6s %12s' % ('MCTS, numpy', 'depth', 'us/sim'))
+    for name, mctsClass in (('recursive', RecursiveMCTS), ('iterative', MCTS)):
+        for depth in (50, 100, 150):
+            mcts = mctsClass(game, LineNet(game), args)
+            board = game.getInitBoard()
+            for _ in range(depth):
+                mcts.search(board)
+            start = time.time()
+            for _ in range(opts.sims):
+                mcts.search(board)
+            seconds = time.time() - start
+            print('%-28s %6d %12.0f' % (name, depth, seconds / opts.sims * 1e6))
+
+
+def bench_budget(opts):
+    """Plays games with one MCTS per side kept across games, as Coach's
+    arena does, and prints the size of the tree after every game."""
+    game = GobangGame(19)
+    nnet = make_net(opts.net, game)
+    print('%-28s %6s %8s %10s %10s %10s' % ('MCTS kept across games', 'game', 'nodes', 'est. MB', 'evicted', 'sims/s'))
+    for name, budget in (('no limit', {}), ('mctsMaxNodes 2000', {'mctsMaxNodes': 2000})):
+        # a byte budget that is never reached turns on the size tracking
+        args = dotdict(dict({'numMCTSSims': opts.sims, 'cpuct': 1.0, 'mctsMaxBytes': 10 ** 12}, **budget))
+        mcts = MCTS(game, nnet, args)
+        np.random.seed(opts.seed)
+        for g in range(4):
+            board, player = game.getInitBoard(), 1
+            moves, start = 0, time.time()
+            while moves != opts.moves:
+                pi = mcts.getActionProb(game.getCanonicalForm(board, player), temp=1)
+                action = np.random.choice(len(pi), p=pi)
+                board, player = game.getNextState(board, player, action)
+                moves += 1
+                if game.getGameEndedAfter(board, player, action) != 0:
+                    break
+            stats = mcts.stats()
+            print('%-28s %6d %8d %10.1f %10d %10.0f' % (name, g + 1, stats['nodes'], stats['bytes'] / 2 ** 20,
+                                                        stats['evictions'], moves * opts.sims / (time.time() - start)))
+
+
+def bench_lockstep(opts):
+    game = GobangGame(opts.size)
+    print('%-28s %8s %8s %10s %10s' % ('LockstepSelfPlay, %dx%d' % (opts.size, opts.size), 'games', 'moves', 'evals/s', 'moves/s'))
+    for games in (1, 4, 16, 32):
+        nnet = CountingNet(make_net(opts.net, game))
+        args = dotdict({'numMCTSSims': opts.sims, 'cpuct': 1.0, 'tempThreshold': 15, 'lockstepGames': games})
+        moves = 0
+        start = time.time()
+        for _, examples in LockstepSelfPlay(game, nnet, args).play((e, opts.seed + e) for e in range(games)):
+            moves += len(examples) // 8  # every position comes with its 8 symmetries
+        seconds = time.time() - start
+        print('%-28s %8d %8d %10.0f %10.1f' % ('lockstepGames %d' % games, games, moves,
+                                               nnet.calls / seconds, moves / seconds))
+
+
+def bench_infer(opts):
+    """Predictions per second of the pytorch network and of its CPU inference
+    exports, and how far their outputs drift from the fp32 network on the
+    positions of random games."""
+    import os
+    import tempfile
+    from connect6.pytorch.NNet import NNetWrapper, args
+    args.arch = opts.arch
+    game = GobangGame(opts.size)
+    nnet = NNetWrapper(game)
+    if opts.checkpoint:
+        nnet.load_checkpoint(*os.path.split(opts.checkpoint))
+    rng = np.random.RandomState(opts.seed)
+    boards = []
+    for _ in range(8):
+        board, player = game.getInitBoard(), 1
+        for _ in range(rng.randint(1, opts.moves or 60)):
+            action = rng.choice(np.flatnonzero(game.getValidMoves(board, player)))
+            board, player = game.getNextState(board, player, action)
+            if game.getGameEnded(board, player) != 0:
+                break
+        boards.append(game.getCanonicalForm(board, player))
+    boards = (boards * 4)[:32]
+    expected = nnet.predict_batch(boards)
+
+    print('%-28s %10s %10s %12s %10s' % ('connect6 %dx%d, %s' % (opts.size, opts.size, opts.arch), 'batch 1/s', 'batch 16/s',
+                                         'max |d pi|', 'max |d v|'))
+    with tempfile.TemporaryDirectory() as folder:
+        configs = [('fp32', nnet)]
+        for name, quantize in (('folded, traced', False), ('folded, traced, int8 fc', True)):
+            nnet.save_inference(folder, name.replace(', ', '_') + '.pt', quantize)
+            exported = NNetWrapper(game)
+            exported.load_checkpoint(folder, name.replace(', ', '_') + '.pt')
+            configs.append((name, exported))
+        for name, net in configs:
+            start = time.time()
+            for board in boards:
+                net.predict(board)
+            single = len(boards) / (time.time() - start)
+            start = time.time()
+            for i in range(0, len(boards), 16):
+                net.predict_batch(boards[i:i + 16])
+            batched = len(boards) / (time.time() - start)
+            pis, vs = net.predict_batch(boards)
+            print('%-28s %10.0f %10.0f %12.2e %10.2e' % (name, single, batched, np.abs(pis - expected[0]).max(),
+                                                         np.abs(vs - expected[1]).max()))
+
+
+def bench_loader(opts):
+    """Samples per second NNetWrapper.train gets its batches at, for a list
+    of examples as the gen_data*.py files hold them (policies as lists) and
+    for a ReplayBuffer: the way train used to draw them against the tensor
+    dataset of NNetWrapper.loader, without and with worker processes. Only
+    the batches are built, nothing is trained; the loader times include
+    building the dataset."""
+    import torch
+    from ReplayBuffer import ReplayBuffer
+    from connect6.pytorch.NNet import NNetWrapper, args
+    game = GobangGame(opts.size)
+    nnet = NNetWrapper(game)
+    rng = np.random.RandomState(opts.seed)
+    count = opts.moves or 20000
+    boards = rng.randint(-1, 2, size=(count, opts.size, opts.size)).astype(np.int8)
+    pis = rng.dirichlet(np.ones(game.getActionSize()), size=count).astype(np.float32)
+    vs = rng.choice([-1.0, 1.0], size=count)
+    examples = [(board, list(pi), v) for board, pi, v in zip(boards, pis, vs)]
+    buffer = ReplayBuffer(boards.shape[1:], game.getActionSize(), count, 1)
+    buffer.appendArrays(boards, pis, vs)
+    batches = count // args.batch_size
+
+    def list_loop():
+        for _ in range(batches):
+            sample_ids = np.random.randint(len(examples), size=args.batch_size)
+            b, p, v = list(zip(*[examples[i] for i in sample_ids]))
+            torch.FloatTensor(np.array(b).astype(np.float64)), torch.FloatTensor(np.array(p))
+            torch.FloatTensor(np.array(v).astype(np.float64))
+
+    def buffer_sample():
+        for _ in range(batches):
+            b, p, v = buffer.sample(args.batch_size)
+            nnet.inputTensor(b), torch.from_numpy(p), torch.from_numpy(v)
+
+    def loader(data):
+        def run():
+            for b, p, v in nnet.loader(data):
+                nnet.inputTensor(b.numpy())
+        return run
+
+    print('%-36s %12s' % ('batch %d, %dx%d, %d examples' % (args.batch_size, opts.size, opts.size, count), 'samples/s'))
+    configs = [('list, old loop', 0, list_loop), ('list, loader', 0, loader(examples)),
+               ('ReplayBuffer, sample', 0, buffer_sample), ('ReplayBuffer, loader', 0, loader(buffer)),
+               ('ReplayBuffer, loader, 2 workers', 2, loader(buffer))]
+    for name, workers, run in configs:
+        args.num_workers = workers
+        start = time.time()
+        run()
+        print('%-36s %12.0f' % (name, batches * args.batch_size / (time.time() - start)))
+
+
+BENCHMARKS = {
+    'keys': bench_keys,
+    'search': bench_search,
+    'batch': bench_batch,
+    'reuse': bench_reuse,
+    'depth': bench_depth,
+    'budget': bench_budget,
+    'lockstep': bench_lockstep,
+    'infer': bench_infer,
+    'loader': bench_loader,
+}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('benchmark', choices=sorted(BENCHMARKS))
+    parser.add_argument('--net', choices=['uniform', 'pytorch'], default='uniform')
+    parser.add_argument('--sims', type=int, default=25)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--moves', type=int, default=None)
+    parser.add_argument('--size', type=int, default=19)
+    parser.add_argument('--checkpoint', default=None)
+    parser.add_argument('--arch', choices=['fc', 'resnet'], default='fc')
+    opts = parser.parse_args()
+    BENCHMARKS[opts.benchmark](opts)
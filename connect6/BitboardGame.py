@@ -0,0 +1,156 @@
+from __future__ import print_function
+import numpy as np
+
+from .BitboardLogic import Bitboard, bits_to_array, dilate, has_run, popcount, stride
+from .GobangGame import GobangGame
+from .Zobrist import ZobristKey
+
+
+class BitboardGobangGame(GobangGame):
+    """
+    Connect6 with the same rules, actions and move masking as GobangGame, but
+    positions are Bitboard objects instead of n x n numpy arrays. Every board
+    handed out can be turned into the numpy board of GobangGame with
+    np.asarray(board) (or toArray), and fromArray goes the other way, so
+    networks, checkpoints and example files are shared between the two.
+
+    With a radius the candidate mask (cells within radius of any stone) is
+    carried in the position itself and grown by one precomputed neighbourhood
+    per stone, so children inherit it from their parent for free.
+
+    With zobrist the position also carries its Zobrist key, updated with one
+    XOR per stone in getNextState and swapped with the key of the
+    colour-swapped position in getCanonicalForm.
+    """
+
+    def __init__(self, n=19, nir=6, radius=None, zobrist=False, verifyKeys=False):
+        super(BitboardGobangGame, self).__init__(n, nir, radius, zobrist, verifyKeys)
+        s = stride(n)
+        self.cellBits = [1 << (x * s + y) for x in range(n) for y in range(n)]
+        self.allCells = sum(self.cellBits)
+        self.rowBits = [((1 << n) - 1) << (x * s) for x in range(n)]
+        center = n // 2
+        self.centerBits = sum(1 << (x * s + y)
+                              for x in range(center - 1, center + 2)
+                              for y in range(center - 1, center + 2))
+        if radius is not None:
+            self.nearBits = [dilate(bit, n, radius) for bit in self.cellBits]
+        if zobrist:
+            self.zobristInts = [(int(z1), int(z2)) for z1, z2 in self.zobristTable]
+
+    def toArray(self, board):
+        return np.asarray(board)
+
+    def fromArray(self, board):
+        bits = Bitboard.from_array(board, self.radius)
+        if self.zobristTable is not None:
+            key, swapped = self.zobristKeys(board)
+            bits = bits._replace(key=key, swappedKey=swapped)
+        return bits
+
+    def getInitBoard(self):
+        return Bitboard(self.n, 0, 0)
+
+    def getNextState(self, board, player, action):
+        if action == self.n * self.n:
+            return (board, -player)
+
+        n, first, second, near, key, swappedKey = board
+        bit = self.cellBits[action]
+        assert not (first | second) & bit
+        if self.radius is not None:
+            near |= self.nearBits[action]
+        if self.zobristTable is not None:
+            z1, z2 = self.zobristInts[action]
+            if player != 1:
+                z1, z2 = z2, z1
+            key, swappedKey = key ^ z1, swappedKey ^ z2
+        if player == 1:
+            first |= bit
+        else:
+            second |= bit
+        board = Bitboard(n, first, second, near, key, swappedKey)
+
+        # 下完后总子数为奇数则换人，偶数则同一方继续（六子棋规则，同 GobangGame）
+        if popcount(first | second) % 2 != 0:
+            return (board, -player)
+        return (board, player)
+
+    def getValidMoves(self, board, player):
+        occupied = board.occupied()
+        empty = self.allCells & ~occupied
+        valids = np.zeros(self.getActionSize(), dtype=np.int64)
+        if not empty:
+            valids[-1] = 1
+            return valids
+
+        if not occupied:
+            moves = self.centerBits
+        else:
+            if self.radius is not None:
+                moves = empty & board.near
+            else:
+                moves = empty & self.regionOfInterest(occupied)
+            if not moves:
+                moves = empty
+        valids[:-1] = bits_to_array(moves, self.n)
+        return valids
+
+    def getValidMovesAfter(self, board, player, action, prevValids):
+        # 候选点已经随局面一起维护，直接生成即可
+        return self.getValidMoves(board, player)
+
+    def regionOfInterest(self, occupied):
+        """Bit set of the bounding box of occupied grown by 3 cells, the same
+        region GobangGame.getValidMoves restricts moves to."""
+        s = stride(self.n)
+        min_r = max(0, ((occupied & -occupied).bit_length() - 1) // s - 3)
+        max_r = min(self.n - 1, (occupied.bit_length() - 1) // s + 3)
+        columns = 0
+        for x in range(self.n):
+            columns |= (occupied & self.rowBits[x]) >> (x * s)
+        min_c = max(0, (columns & -columns).bit_length() - 1 - 3)
+        max_c = min(self.n - 1, columns.bit_length() - 1 + 3)
+        row = ((1 << (max_c + 1)) - 1) & ~((1 << min_c) - 1)
+        return sum(row << (x * s) for x in range(min_r, max_r + 1))
+
+    def getGameEnded(self, board, player):
+        if has_run(board.first, self.n, self.n_in_row):
+            return 1
+        if has_run(board.second, self.n, self.n_in_row):
+            return -1
+        if board.occupied() != self.allCells:
+            return 0
+        return 1e-4
+
+    def getGameEndedAfter(self, board, player, action):
+        if action != self.n * self.n:
+            if board.first & self.cellBits[action]:
+                if has_run(board.first, self.n, self.n_in_row):
+                    return 1
+            elif has_run(board.second, self.n, self.n_in_row):
+                return -1
+        if board.occupied() != self.allCells:
+            return 0
+        return 1e-4
+
+    def getCanonicalForm(self, board, player):
+        if player == 1:
+            return board
+        return board._replace(first=board.second, second=board.first,
+                              key=board.swappedKey, swappedKey=board.key)
+
+    def getSymmetries(self, board, pi):
+        # 训练样本仍然使用 numpy 棋盘，与 GobangGame 生成的样本文件兼容
+        return super(BitboardGobangGame, self).getSymmetries(self.toArray(board), pi)
+
+    def stringRepresentation(self, board):
+        if self.zobristTable is None:
+            return (board.first, board.second)
+        if self.verifyKeys:
+            return ZobristKey(board.key, (board.first, board.second))
+        return board.key
+
+    @staticmethod
+    def display(board):
+        GobangGame.display(np.asarray(board))
@@ -0,0 +1,107 @@
+'''
+Bitboard representation of a Connect6 position.
+
+Each colour is stored as one python int used as a bit set. Cell (x, y) of
+an n x n board lives in bit x * (n + 1) + y: every row is followed by one
+padding bit that is never set, so shifting a bit set left or right can not
+wrap a line from one row into the next. Runs of stones along the four
+directions are found with shift-and-AND:
+
+    horizontal  (x, y) -> (x, y + 1)      shift 1
+    vertical    (x, y) -> (x + 1, y)      shift n + 1
+    diagonal    (x, y) -> (x + 1, y + 1)  shift n + 2
+    antidiagonal(x, y) -> (x + 1, y - 1)  shift n
+'''
+from collections import namedtuple
+
+import numpy as np
+
+
+if hasattr(int, 'bit_count'):
+    def popcount(x):
+        return x.bit_count()
+else:
+    def popcount(x):
+        return bin(x).count('1')
+
+
+def stride(n):
+    return n + 1
+
+
+def has_run(x, n, length):
+    """Returns True if bit set x contains length stones in a row in any
+    direction."""
+    s = stride(n)
+    for d in (1, s, s + 1, s - 1):
+        m = x
+        run = 1
+        while run < length and m:
+            step = min(run, length - run)
+            m &= m >> (d * step)
+            run += step
+        if m:
+            return True
+    return False
+
+
+def bits_to_array(x, n):
+    """Returns a flat uint8 array of length n * n with the cells of bit set x
+    in action order (action = n * x + y)."""
+    s = stride(n)
+    raw = np.frombuffer(x.to_bytes((n * s + 7) // 8, 'little'), dtype=np.uint8)
+    return np.unpackbits(raw, count=n * s, bitorder='little').reshape(n, s)[:, :n].ravel()
+
+
+def array_to_bits(mask):
+    """Inverse of bits_to_array for a boolean n x n array."""
+    n = mask.shape[0]
+    padded = np.zeros((n, stride(n)), dtype=bool)
+    padded[:, :n] = mask
+    return int.from_bytes(np.packbits(padded.ravel(), bitorder='little').tobytes(), 'little')
+
+
+def dilate(x, n, radius):
+    """Returns the bit set of all cells within Chebyshev distance radius of a
+    cell in bit set x."""
+    s = stride(n)
+    cells = sum(((1 << n) - 1) << (r * s) for r in range(n))
+    for _ in range(radius):
+        x = (x | (x << 1) | (x >> 1)) & cells
+    for _ in range(radius):
+        x = (x | (x << s) | (x >> s)) & cells
+    return x
+
+
+class Bitboard(namedtuple('Bitboard', ['n', 'first', 'second', 'near', 'key', 'swappedKey'],
+                          defaults=(0, 0, 0))):
+    """
+    Immutable Connect6 position. first holds the stones of player 1 (1 in the
+    numpy board), second the stones of player -1. near is the candidate mask
+    maintained by games that restrict moves to the neighbourhood of existing
+    stones, key and swappedKey the Zobrist keys of the position and of the
+    position with colours swapped, for games that hash positions (all 0
+    otherwise).
+
+    np.asarray(board) gives the same int board GobangGame uses, so bitboards
+    can be fed to the existing neural networks.
+    """
+    __slots__ = ()
+
+    def occupied(self):
+        return self.first | self.second
+
+    def __array__(self, dtype=None, copy=None):
+        board = bits_to_array(self.first, self.n).view(np.int8) - bits_to_array(self.second, self.n).view(np.int8)
+        board = board.reshape(self.n, self.n)
+        if dtype is not None:
+            board = board.astype(dtype)
+        return board
+
+    @classmethod
+    def from_array(cls, board, radius=None):
+        board = np.asarray(board)
+        n = board.shape[0]
+        first, second = array_to_bits(board == 1), array_to_bits(board == -1)
+        near = 0 if radius is None else dilate(first | second, n, radius)
+        return cls(n, first, second, near)
@@ -3,17 +3,42 @@ import sys
 import numpy as np
 # 注意：如果你把文件夹改名了，这里要相应修改，比如 from .Connect6Logic import Board
 from .GobangLogic import Board 
+from .Zobrist import ZobristKey, zobrist_table
 from Game import Game
 
 class GobangGame(Game):
-    def __init__(self, n=19, nir=6):
+    def __init__(self, n=19, nir=6, radius=None, zobrist=False, verifyKeys=False):
         # 修改点1：默认大小改为19x19，连珠数改为6
         self.n = n
         self.n_in_row = nir
+        # radius 不为 None 时，候选点改为"距任意棋子 radius 格以内（切比雪夫距离）的空点"，
+        # 代替整块 ROI 包围盒；每个点的邻域预先算好，落子时增量更新
+        self.radius = radius
+        if radius is not None:
+            self.neighbours = []
+            for x in range(n):
+                for y in range(n):
+                    xs = np.arange(max(0, x - radius), min(n, x + radius + 1))
+                    ys = np.arange(max(0, y - radius), min(n, y + radius + 1))
+                    self.neighbours.append((xs[:, None] * n + ys[None, :]).ravel())
+        # zobrist=True 时 stringRepresentation 返回 64 位 Zobrist 键，代替 2888 字节的
+        # board.tobytes()；verifyKeys=True 时键在哈希命中后还会比较完整棋盘，防止碰撞
+        self.zobristTable = zobrist_table(n) if zobrist else None
+        self.verifyKeys = verifyKeys
+        # getSymmetries 的 8 种变换写成下标表：第 k 种变换后的展平棋盘为 flat[symmetryIndices[k]]，
+        # getRandomSymmetries 用它对整批样本一次性做随机变换
+        cells = np.arange(n * n).reshape(n, n)
+        self.symmetryIndices = np.array([np.fliplr(np.rot90(cells, i)).ravel() if j else np.rot90(cells, i).ravel()
+                                         for i in range(1, 5) for j in [True, False]])
+        # 加上 pass（最后一个动作，变换后不动）就是策略向量的下标表，getSymmetryForms 用
+        self.symmetryActions = np.concatenate(
+            [self.symmetryIndices, np.full((len(self.symmetryIndices), 1), n * n)], axis=1)
 
     def getInitBoard(self):
+        # 棋盘用 int8 保存（每格只有 -1/0/1），复制、哈希、存样本都只有 int64 的 1/8，
+        # getNextState 和 getCanonicalForm 都保持 int8
         b = Board(self.n)
-        return np.array(b.pieces)
+        return np.array(b.pieces, dtype=np.int8)
 
     def getBoardSize(self):
         return (self.n, self.n)
@@ -52,6 +77,9 @@ class GobangGame(Game):
 # connect6/GobangGame.py 中的 getValidMoves 方法
 
     def getValidMoves(self, board, player):
+        if self.radius is not None:
+            return self.getNearValidMoves(board)
+
         # 初始化全为 0 (不可走)
         valids = [0] * self.getActionSize()
         b = Board(self.n)
@@ -96,6 +124,56 @@ class GobangGame(Game):
                 
         return np.array(valids)
 
+    def getNearValidMoves(self, board):
+        # 候选点 = 距离任意棋子 radius 格以内的空点
+        valids = np.zeros(self.getActionSize(), dtype=np.int64)
+        empty = board == 0
+        if not empty.any():
+            valids[-1] = 1
+            return valids
+        if empty.all():
+            # 第一手仍然只能下天元周围 3x3
+            center = self.n // 2
+            valids[:-1].reshape(self.n, self.n)[center - 1:center + 2, center - 1:center + 2] = 1
+            return valids
+
+        # 先按行、再按列膨胀，得到切比雪夫距离 radius 以内的区域
+        occupied = ~empty
+        near = occupied.copy()
+        for d in range(1, self.radius + 1):
+            near[d:] |= occupied[:-d]
+            near[:-d] |= occupied[d:]
+        rows = near.copy()
+        for d in range(1, self.radius + 1):
+            near[:, d:] |= rows[:, :-d]
+            near[:, :-d] |= rows[:, d:]
+
+        valids[:-1] = (near & empty).ravel()
+        if not valids.any():
+            valids[:-1] = empty.ravel()
+        return valids
+
+    def getValidMovesAfter(self, board, player, action, prevValids):
+        if self.radius is None:
+            return self.getValidMoves(board, player)
+        if action == self.n * self.n:
+            return np.copy(prevValids)
+
+        # 增量更新：父节点候选点去掉刚落的点，再并上该点邻域内的空点。
+        # 第一手（父节点是天元 3x3）以及父节点已经是"所有空点"的兜底情况重新计算
+        flat = board.ravel()
+        stones = np.count_nonzero(flat)
+        if stones == 1 or np.count_nonzero(prevValids[:-1]) == flat.size - stones + 1:
+            return self.getValidMoves(board, player)
+
+        valids = np.copy(prevValids)
+        valids[action] = 0
+        idx = self.neighbours[action]
+        valids[idx] |= flat[idx] == 0
+        if not valids.any():
+            return self.getValidMoves(board, player)
+        return valids
+
     def getGameEnded(self, board, player):
         # 胜利判断逻辑
         # 因为我们在 __init__ 里设置了 self.n_in_row = 6
@@ -127,6 +205,29 @@ class GobangGame(Game):
             return 0
         return 1e-4
 
+    def getGameEndedAfter(self, board, player, action):
+        # 增量胜负判断：上一步之前棋局未结束，所以新的连珠一定经过刚落下的子，
+        # 只需检查经过该子的 4 条线，结果与 getGameEnded 的全盘扫描一致
+        if action != self.n * self.n:
+            x, y = action // self.n, action % self.n
+            color = int(board[x, y])
+            for dx, dy in ((1, 0), (0, 1), (1, 1), (1, -1)):
+                count = 1
+                i, j = x + dx, y + dy
+                while 0 <= i < self.n and 0 <= j < self.n and board[i, j] == color:
+                    count += 1
+                    i, j = i + dx, j + dy
+                i, j = x - dx, y - dy
+                while 0 <= i < self.n and 0 <= j < self.n and board[i, j] == color:
+                    count += 1
+                    i, j = i - dx, j - dy
+                if count >= self.n_in_row:
+                    return color
+
+        if (board == 0).any():
+            return 0
+        return 1e-4
+
     def getCanonicalForm(self, board, player):
         return player * board
 
@@ -145,8 +246,37 @@ class GobangGame(Game):
                 l += [(newB, list(newPi.ravel()) + [pi[-1]])]
         return l
 
+    def getRandomSymmetries(self, boards, pis, rng=np.random):
+        # 每个样本随机取一种变换，整批用一次 take_along_axis 完成，不逐个调用 getSymmetries
+        count = len(boards)
+        indices = self.symmetryIndices[rng.randint(len(self.symmetryIndices), size=count)]
+        boards = np.take_along_axis(np.asarray(boards).reshape(count, -1), indices, axis=1).reshape(np.shape(boards))
+        pis = np.array(pis)
+        pis[:, :-1] = np.take_along_axis(pis[:, :-1], indices, axis=1)
+        return boards, pis
+
+    def getSymmetryForms(self, board):
+        # 8 种变换一次取下标得到，与 getSymmetries 的顺序相同
+        flat = np.asarray(board).reshape(-1)
+        return flat[self.symmetryIndices].reshape(-1, self.n, self.n), self.symmetryActions
+
     def stringRepresentation(self, board):
-        return board.tobytes()
+        if self.zobristTable is None:
+            return board.tobytes()
+        key, _ = self.zobristKeys(board)
+        if self.verifyKeys:
+            flat = board.ravel()
+            return ZobristKey(key, np.packbits(flat == 1).tobytes() + np.packbits(flat == -1).tobytes())
+        return key
+
+    def zobristKeys(self, board):
+        """Returns the Zobrist keys of board and of board with the colours
+        swapped."""
+        flat = np.asarray(board).ravel()
+        first, second = self.zobristTable[flat == 1], self.zobristTable[flat == -1]
+        key = np.bitwise_xor.reduce(first[:, 0]) ^ np.bitwise_xor.reduce(second[:, 1])
+        swapped = np.bitwise_xor.reduce(first[:, 1]) ^ np.bitwise_xor.reduce(second[:, 0])
+        return int(key), int(swapped)
 
     @staticmethod
     def display(board):
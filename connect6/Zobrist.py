@@ -0,0 +1,45 @@
+'''
+Zobrist hashing for Connect6 positions.
+
+A position is keyed by the XOR of one random 64-bit number per (cell, colour)
+pair. Placing a stone XORs a single number into the key, and keeping the key
+of the colour-swapped position next to it lets getCanonicalForm flip the key
+by swapping the two.
+'''
+import numpy as np
+
+ZOBRIST_SEED = 20180117
+
+
+def zobrist_table(n, seed=ZOBRIST_SEED):
+    """Returns a (n * n, 2) uint64 array: column 0 for stones of player 1,
+    column 1 for stones of player -1. The fixed seed gives the same keys in
+    every process."""
+    rng = np.random.RandomState(seed)
+    return rng.randint(0, 2 ** 63, size=(n * n, 2), dtype=np.int64).astype(np.uint64) ^ \
+        (rng.randint(0, 2, size=(n * n, 2), dtype=np.int64).astype(np.uint64) << np.uint64(63))
+
+
+class ZobristKey(object):
+    """
+    Position key for the collision-safe mode: hashes as the 64-bit Zobrist key
+    but only compares equal when the stones match too, so a dict lookup that
+    hits a different position with the same key falls through to a miss.
+    """
+    __slots__ = ('key', 'stones')
+
+    def __init__(self, key, stones):
+        self.key = key
+        self.stones = stones
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def __eq__(self, other):
+        return self.key == other.key and self.stones == other.stones
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __repr__(self):
+        return 'ZobristKey(%#018x)' % self.key
@@ -26,15 +26,27 @@ args = dotdict({
 
 
 class NNetWrapper(NeuralNet):
+    lazySymmetries = True  # train 对 augment 的 ReplayBuffer 每批随机取对称
+
     def __init__(self, game):
         self.nnet = onnet(game, args)
+        self.game = game
         self.board_x, self.board_y = game.getBoardSize()
         self.action_size = game.getActionSize()
+        self.inputs = None  # preallocated float32 input, see inputArray
+        self.saver = None  # model save_snapshot writes through, built on first use
 
     def train(self, examples):
         """
-        examples: list of examples, each example is of form (board, pi, v)
+        examples: list of examples, each example is of form (board, pi, v), or
+                  a ReplayBuffer
         """
+        if getattr(examples, 'augment', None) is not None:
+            # one form of every position is stored, draw the symmetries afresh every epoch
+            for epoch in range(args.epochs):
+                input_boards, target_pis, target_vs = examples.sample(examples.numSamples())
+                self.nnet.model.fit(x = input_boards, y = [target_pis, target_vs], batch_size = args.batch_size, epochs = 1)
+            return
         input_boards, target_pis, target_vs = list(zip(*examples))
         input_boards = np.asarray(input_boards)
         target_pis = np.asarray(target_pis)
@@ -49,12 +61,37 @@ class NNetWrapper(NeuralNet):
         # start = time.time()
 
         # preparing input
-        board = board[np.newaxis, :, :]
-        
-        pi, v = self.nnet.model.predict(board, verbose=False)
+        board = self.inputArray(np.asarray(board))
+
+        # run: predict_on_batch skips the input pipeline model.predict builds on every call
+        pi, v = self.nnet.model.predict_on_batch(board)
 
         #print('PREDICTION TIME TAKEN : {0:03f}'.format(time.time()-start))
-        return pi[0], v[0]
+        return np.asarray(pi[0]), np.asarray(v[0])
+
+    def predict_batch(self, boards):
+        """
+        boards: list of np arrays with boards, evaluated in one forward pass
+        """
+        boards = self.inputArray(np.stack([np.asarray(board) for board in boards]))
+        pi, v = self.nnet.model.predict_on_batch(boards)
+        return np.asarray(pi), np.asarray(v)
+
+    def inputArray(self, boards):
+        """
+        boards: array of boards
+
+        Returns the boards converted to float32 in one copy into a
+        preallocated input array, grown when needed, which the returned array
+        is a view of until the next call.
+        """
+        boards = boards.reshape(-1, self.board_x, self.board_y)
+        count = len(boards)
+        if self.inputs is None or len(self.inputs) < count:
+            self.inputs = np.empty((max(count, args.batch_size), self.board_x, self.board_y), dtype=np.float32)
+        inputs = self.inputs[:count]
+        inputs[...] = boards
+        return inputs
 
     def save_checkpoint(self, folder='checkpoint', filename='checkpoint.pth.tar'):
         # change extension
@@ -68,6 +105,20 @@ class NNetWrapper(NeuralNet):
             print("Checkpoint Directory exists! ")
         self.nnet.model.save_weights(filepath)
 
+    def snapshot(self):
+        return self.nnet.model.get_weights()
+
+    def restore(self, snapshot):
+        self.nnet.model.set_weights(snapshot)
+
+    def save_snapshot(self, snapshot, folder='checkpoint', filename='checkpoint.pth.tar'):
+        # keras 只能从模型写 h5：经过一个单独的模型，不动正在训练的网络
+        if self.saver is None:
+            self.saver = onnet(self.game, args)
+        self.saver.model.set_weights(snapshot)
+        os.makedirs(folder, exist_ok=True)
+        self.saver.model.save_weights(os.path.join(folder, filename.split(".")[0] + ".h5"))
+
     def load_checkpoint(self, folder='checkpoint', filename='checkpoint.pth.tar'):
         # change extension
         filename = filename.split(".")[0] + ".h5"
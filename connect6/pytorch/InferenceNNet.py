@@ -0,0 +1,60 @@
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+from torch.nn.utils.fusion import fuse_conv_bn_eval, fuse_linear_bn_eval
+
+
+class InferenceNNet(nn.Module):
+    """
+    推理专用的 OthelloNNet：BatchNorm 已经折叠进前面的卷积层/全连接层，dropout 去掉，
+    输入输出与 OthelloNNet 相同（log 策略和价值）。用 fold 从训练好的网络生成。
+    """
+
+    def __init__(self, nnet):
+        super(InferenceNNet, self).__init__()
+        self.board_x, self.board_y = nnet.board_x, nnet.board_y
+        self.flat_size = nnet.flat_size
+        self.conv1 = fuse_conv_bn_eval(nnet.conv1, nnet.bn1)
+        self.conv2 = fuse_conv_bn_eval(nnet.conv2, nnet.bn2)
+        self.conv3 = fuse_conv_bn_eval(nnet.conv3, nnet.bn3)
+        self.conv4 = fuse_conv_bn_eval(nnet.conv4, nnet.bn4)
+        self.fc1 = fuse_linear_bn_eval(nnet.fc1, nnet.fc_bn1)
+        self.fc2 = fuse_linear_bn_eval(nnet.fc2, nnet.fc_bn2)
+        self.fc3 = nnet.fc3
+        self.fc4 = nnet.fc4
+
+    def forward(self, s):
+        s = s.view(-1, 1, self.board_x, self.board_y)
+        s = F.relu(self.conv1(s))
+        s = F.relu(self.conv2(s))
+        s = F.relu(self.conv3(s))
+        s = F.relu(self.conv4(s))
+        s = s.view(-1, self.flat_size)
+        s = F.relu(self.fc1(s))
+        s = F.relu(self.fc2(s))
+        pi = self.fc3(s)
+        v = self.fc4(s)
+        return F.log_softmax(pi, dim=1), torch.tanh(v)
+
+
+def fold(nnet, quantize=False):
+    """
+    Returns a TorchScript module computing what nnet (an OthelloNNet or a
+    ResNet) computes in eval mode, for CPU inference: BatchNorm folded into
+    the weights of the layer before it, no dropout, traced into a graph. With
+    quantize the fully connected layers fc1 and fc2 run with dynamically
+    quantized int8 weights (the large ones of OthelloNNet, the value head of
+    ResNet). nnet itself is left unchanged.
+    """
+    training = nnet.training
+    nnet.eval()
+    try:
+        with torch.no_grad():
+            model = nnet.fused() if hasattr(nnet, 'fused') else InferenceNNet(nnet)
+            model = model.cpu().eval()
+            if quantize:
+                model = torch.ao.quantization.quantize_dynamic(model, {'fc1', 'fc2'}, dtype=torch.qint8)
+            example = torch.zeros(1, nnet.board_x, nnet.board_y)
+            return torch.jit.trace(model, example)
+    finally:
+        nnet.train(training)
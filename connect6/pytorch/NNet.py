@@ -11,8 +11,11 @@ from NeuralNet import NeuralNet
 
 import torch
 import torch.optim as optim
+from torch.utils.data import DataLoader, Dataset
 
+from .InferenceNNet import fold
 from .OthelloNNet import OthelloNNet as onnet
+from .ResNet import ResNet
 
 args = dotdict({
     'lr': 0.001,
@@ -25,23 +28,130 @@ args = dotdict({
     # 原来可能是 512，现在改为 64。
     # 64 个通道对于简单的棋类逻辑已经足够了，能极大提升速度。
     'num_channels': 64, 
+
+    # 'fc'：OthelloNNet（卷积后接全连接，只能用于一种棋盘大小）；
+    # 'resnet'：ResNet（全卷积残差网络，同一份权重可用于 15x15 和 19x19）
+    'arch': 'fc',
+    'res_channels': 32,
+    'num_res_blocks': 4,
+
+    # train 时后台组批的 DataLoader 进程数，0 表示在主进程里组批
+    'num_workers': 0,
 })
 
 
+class ExampleDataset(Dataset):
+    """
+    The examples of one train call as arrays: boards as stored (int8 for
+    connect6), pis and vs float32. Indexed with an array of indices it
+    returns that whole batch as tensors, one gather per array, so batches
+    are assembled without any Python loop over examples. A ReplayBuffer is
+    not copied: the batches are gathered straight from its ring (see
+    ReplayBuffer.gather). Examples from a ReplayBuffer with lazy symmetries
+    get a random symmetry in every batch, as ReplayBuffer.sample gives them.
+    """
+
+    def __init__(self, examples):
+        self.augment, self.symmetries = None, 1
+        if hasattr(examples, 'gather'):
+            self.buffer = examples
+            self.augment, self.symmetries = examples.augment, examples.symmetries
+        else:
+            self.buffer = None
+            boards, pis, vs = zip(*examples)
+            self.boards = np.ascontiguousarray(np.array([np.asarray(board) for board in boards]))
+            self.pis = np.asarray(pis, dtype=np.float32)
+            self.vs = np.asarray(vs, dtype=np.float32)
+
+    def __len__(self):
+        return len(self.buffer) if self.buffer is not None else len(self.boards)
+
+    def __getitem__(self, indices):
+        if self.buffer is not None:
+            boards, pis, vs = self.buffer.gather(indices)
+        else:
+            boards, pis, vs = self.boards[indices], self.pis[indices], self.vs[indices]
+        if self.augment is not None:
+            boards, pis = self.augment(boards, pis, np.random)
+        return torch.from_numpy(boards), torch.from_numpy(pis), torch.from_numpy(vs)
+
+
+class EpochSampler(object):
+    """
+    Batches of indices for one epoch over dataset: numSamples indices (the
+    examples times their symmetries) in random order, each example as many
+    times as it has symmetries, in full batches of batchSize. The symmetry
+    of every draw is random (see ExampleDataset), so an epoch is not
+    guaranteed to see every symmetry of an example.
+    """
+
+    def __init__(self, dataset, batchSize):
+        self.size = len(dataset)
+        self.numSamples = len(dataset) * dataset.symmetries
+        self.batchSize = batchSize
+
+    def __len__(self):
+        return self.numSamples // self.batchSize
+
+    def __iter__(self):
+        repeats = -(-self.numSamples // self.size) if self.size else 0
+        order = np.concatenate([np.random.permutation(self.size) for _ in range(repeats)] + [np.zeros(0, np.int64)])
+        for i in range(len(self)):
+            yield order[i * self.batchSize:(i + 1) * self.batchSize]
+
+
+def seedWorker(worker):
+    # 每个 DataLoader 进程的 np.random 各不相同，否则随机对称变换在进程间重复
+    np.random.seed(torch.initial_seed() % 2 ** 32)
+
+
 class NNetWrapper(NeuralNet):
+    lazySymmetries = True  # train 对 augment 的 ReplayBuffer 每批随机取对称
+
     def __init__(self, game):
-        self.nnet = onnet(game, args)
+        self.nnet = ResNet(game, args) if args.arch == 'resnet' else onnet(game, args)
         self.board_x, self.board_y = game.getBoardSize()
         self.action_size = game.getActionSize()
+        self.inputs = None  # preallocated float input, see inputTensor
+        self.inference = False  # True once an export of save_inference is loaded
 
         if args.cuda:
             self.nnet.cuda()
 
+    def inputTensor(self, boards):
+        """
+        boards: array of int8 boards (anything np.asarray stacks into one)
+
+        Returns the boards as a float tensor. They are converted to float in
+        one copy into a preallocated input tensor, grown when needed, which
+        the returned tensor is a view of until the next call. With cuda the
+        input tensor is pinned and copied to the GPU asynchronously.
+        """
+        boards = np.ascontiguousarray(boards).reshape(-1, self.board_x, self.board_y)
+        count = len(boards)
+        if self.inputs is None or len(self.inputs) < count:
+            self.inputs = torch.empty((max(count, args.batch_size), self.board_x, self.board_y),
+                                      dtype=torch.float32, pin_memory=args.cuda)
+        inputs = self.inputs[:count]
+        inputs.copy_(torch.from_numpy(boards))
+        if args.cuda and not self.inference:
+            inputs = inputs.cuda(non_blocking=True)
+        return inputs
+
+    def evalMode(self):
+        # train() leaves the network in training mode, switch back only then
+        if getattr(self.nnet, 'training', False):
+            self.nnet.eval()
+
     def train(self, examples):
         """
-        examples: list of examples, each example is of form (board, pi, v)
+        examples: list of examples, each example is of form (board, pi, v), or
+                  a ReplayBuffer
         """
+        if self.inference:
+            raise RuntimeError('an exported inference model cannot be trained')
         optimizer = optim.Adam(self.nnet.parameters())
+        loader = self.loader(examples)
 
         for epoch in range(args.epochs):
             print('EPOCH ::: ' + str(epoch + 1))
@@ -49,19 +159,14 @@ class NNetWrapper(NeuralNet):
             pi_losses = AverageMeter()
             v_losses = AverageMeter()
 
-            batch_count = int(len(examples) / args.batch_size)
-
-            t = tqdm(range(batch_count), desc='Training Net')
-            for _ in t:
-                sample_ids = np.random.randint(len(examples), size=args.batch_size)
-                boards, pis, vs = list(zip(*[examples[i] for i in sample_ids]))
-                boards = torch.FloatTensor(np.array(boards).astype(np.float64))
-                target_pis = torch.FloatTensor(np.array(pis))
-                target_vs = torch.FloatTensor(np.array(vs).astype(np.float64))
+            t = tqdm(loader, desc='Training Net')
+            for boards, target_pis, target_vs in t:
+                boards = self.inputTensor(boards.numpy())
 
                 # predict
                 if args.cuda:
-                    boards, target_pis, target_vs = boards.contiguous().cuda(), target_pis.contiguous().cuda(), target_vs.contiguous().cuda()
+                    target_pis = target_pis.cuda(non_blocking=True)
+                    target_vs = target_vs.cuda(non_blocking=True)
 
                 # compute output
                 out_pi, out_v = self.nnet(boards)
@@ -79,6 +184,21 @@ class NNetWrapper(NeuralNet):
                 total_loss.backward()
                 optimizer.step()
 
+    def loader(self, examples):
+        """
+        Returns a DataLoader over the examples (a list or a ReplayBuffer) for
+        train: every epoch goes through a fresh random permutation of the
+        examples in full batches of args.batch_size, each example once (as
+        many times as it has symmetries with lazy symmetries, each time in a
+        random form). With args.num_workers the batches
+        are assembled in that many processes ahead of time, in pinned memory
+        with cuda.
+        """
+        dataset = ExampleDataset(examples)
+        sampler = EpochSampler(dataset, args.batch_size)
+        return DataLoader(dataset, sampler=sampler, batch_size=None, num_workers=args.num_workers,
+                          pin_memory=args.cuda, worker_init_fn=seedWorker)
+
     def predict(self, board):
         """
         board: np array with board
@@ -87,15 +207,24 @@ class NNetWrapper(NeuralNet):
         start = time.time()
 
         # preparing input
-        board = torch.FloatTensor(board.astype(np.float64))
-        if args.cuda: board = board.contiguous().cuda()
-        board = board.view(1, self.board_x, self.board_y)
-        self.nnet.eval()
+        board = self.inputTensor(np.asarray(board))
+        self.evalMode()
         with torch.no_grad():
             pi, v = self.nnet(board)
 
         # print('PREDICTION TIME TAKEN : {0:03f}'.format(time.time()-start))
-        return torch.exp(pi).data.cpu().numpy()[0], v.data.cpu().numpy()[0]
+        return torch.exp(pi[0]).cpu().numpy(), v[0].cpu().numpy()
+
+    def predict_batch(self, boards):
+        """
+        boards: list of np arrays with boards, evaluated in one forward pass
+        """
+        boards = self.inputTensor(np.stack([np.asarray(board) for board in boards]))
+        self.evalMode()
+        with torch.no_grad():
+            pi, v = self.nnet(boards)
+
+        return torch.exp(pi).cpu().numpy(), v.cpu().numpy()
 
     def loss_pi(self, targets, outputs):
         return -torch.sum(targets * outputs) / targets.size()[0]
@@ -114,11 +243,41 @@ class NNetWrapper(NeuralNet):
             'state_dict': self.nnet.state_dict(),
         }, filepath)
 
+    def save_inference(self, folder='checkpoint', filename='inference.pt', quantize=False):
+        """
+        Exports the network for CPU inference (see InferenceNNet.fold): a
+        TorchScript file that load_checkpoint loads in place of a checkpoint
+        when its name ends with .pt. predict and predict_batch then give the
+        same results up to rounding (or up to the int8 quantization of fc1
+        and fc2 with quantize), but the network can no longer be trained.
+        """
+        filepath = os.path.join(folder, filename)
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+        torch.jit.save(fold(self.nnet, quantize), filepath)
+
+    def snapshot(self):
+        # 参数的 CPU 副本，不经过序列化；可以 pickle 给其他进程
+        return {k: v.detach().to('cpu', copy=True) for k, v in self.nnet.state_dict().items()}
+
+    def restore(self, snapshot):
+        self.nnet.load_state_dict(snapshot)
+
+    def save_snapshot(self, snapshot, folder='checkpoint', filename='checkpoint.pth.tar'):
+        # 与 save_checkpoint 同样的格式，直接写快照里的参数，不动正在训练的网络
+        os.makedirs(folder, exist_ok=True)
+        torch.save({'state_dict': snapshot}, os.path.join(folder, filename))
+
     def load_checkpoint(self, folder='checkpoint', filename='checkpoint.pth.tar'):
         # https://github.com/pytorch/examples/blob/master/imagenet/main.py#L98
         filepath = os.path.join(folder, filename)
         if not os.path.exists(filepath):
             raise ("No model in path {}".format(filepath))
         map_location = None if args.cuda else 'cpu'
+        if filename.endswith('.pt'):
+            # 推理导出（save_inference），直接替换网络
+            self.nnet = torch.jit.load(filepath, map_location='cpu')
+            self.inference = True
+            return
         checkpoint = torch.load(filepath, map_location=map_location)
         self.nnet.load_state_dict(checkpoint['state_dict'])
@@ -0,0 +1,82 @@
+import copy
+
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+from torch.nn.utils.fusion import fuse_conv_bn_eval
+
+
+class ResBlock(nn.Module):
+    def __init__(self, channels):
+        super(ResBlock, self).__init__()
+        self.conv1 = nn.Conv2d(channels, channels, 3, stride=1, padding=1, bias=False)
+        self.bn1 = nn.BatchNorm2d(channels)
+        self.conv2 = nn.Conv2d(channels, channels, 3, stride=1, padding=1, bias=False)
+        self.bn2 = nn.BatchNorm2d(channels)
+
+    def forward(self, s):
+        out = F.relu(self.bn1(self.conv1(s)))
+        out = self.bn2(self.conv2(out))
+        return F.relu(out + s)
+
+
+class ResNet(nn.Module):
+    """
+    全卷积残差网络，可以代替 OthelloNNet（NNet.py 里 args.arch = 'resnet'）：
+    没有依赖棋盘大小的参数，同一份权重可以直接用在 15x15 和 19x19 上。
+
+    策略头：1x1 卷积给每个点一个 logit，pass 的 logit 由全局平均池化后的特征给出，
+    输出顺序与动作编号一致（n * x + y，最后是 pass）。
+    价值头：1x1 卷积后全局平均池化，再经过两层全连接（fc1、fc2）得到 tanh 价值。
+    """
+
+    def __init__(self, game, args):
+        super(ResNet, self).__init__()
+        self.board_x, self.board_y = game.getBoardSize()
+        self.action_size = game.getActionSize()
+        channels = args.get('res_channels', 32)
+
+        self.conv = nn.Conv2d(1, channels, 3, stride=1, padding=1, bias=False)
+        self.bn = nn.BatchNorm2d(channels)
+        self.blocks = nn.Sequential(*[ResBlock(channels) for _ in range(args.get('num_res_blocks', 4))])
+
+        self.policy_conv = nn.Conv2d(channels, 2, 1, bias=False)
+        self.policy_bn = nn.BatchNorm2d(2)
+        self.policy_point = nn.Conv2d(2, 1, 1)
+        self.policy_pass = nn.Linear(channels, 1)
+
+        self.value_conv = nn.Conv2d(channels, 32, 1, bias=False)
+        self.value_bn = nn.BatchNorm2d(32)
+        self.fc1 = nn.Linear(32, 64)
+        self.fc2 = nn.Linear(64, 1)
+
+    def forward(self, s):
+        # s: batch_size x board_x x board_y，任意大小的正方形棋盘
+        s = s.unsqueeze(1)                                           # batch_size x 1 x n x n
+        s = F.relu(self.bn(self.conv(s)))
+        s = self.blocks(s)                                           # batch_size x channels x n x n
+
+        p = F.relu(self.policy_bn(self.policy_conv(s)))
+        points = self.policy_point(p).flatten(1)                     # batch_size x n*n
+        passes = self.policy_pass(s.mean(dim=(2, 3)))                # batch_size x 1
+        pi = torch.cat([points, passes], dim=1)                      # batch_size x (n*n + 1)
+
+        v = F.relu(self.value_bn(self.value_conv(s))).mean(dim=(2, 3))
+        v = self.fc2(F.relu(self.fc1(v)))                            # batch_size x 1
+
+        return F.log_softmax(pi, dim=1), torch.tanh(v)
+
+    def fused(self):
+        """
+        Returns a copy for inference with every BatchNorm folded into the
+        convolution before it (and replaced by an identity); self is left
+        unchanged. Both must be in eval mode.
+        """
+        model = copy.deepcopy(self)
+        pairs = [(model, 'conv', 'bn'), (model, 'policy_conv', 'policy_bn'), (model, 'value_conv', 'value_bn')]
+        for block in model.blocks:
+            pairs += [(block, 'conv1', 'bn1'), (block, 'conv2', 'bn2')]
+        for module, conv, bn in pairs:
+            setattr(module, conv, fuse_conv_bn_eval(getattr(module, conv), getattr(module, bn)))
+            setattr(module, bn, nn.Identity())
+        return model
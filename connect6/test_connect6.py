@@ -0,0 +1,284 @@
+"""
+To run tests:
+pytest connect6
+"""
+
+import numpy as np
+import pytest
+
+from .BitboardGame import BitboardGobangGame
+from .GobangGame import GobangGame
+from .Zobrist import ZobristKey
+
+
+def play_random_game(game, seed):
+    """Plays uniformly random stones until the game ends.
+
+    Returns the list of (board, player, action) tuples after every move."""
+    rng = np.random.RandomState(seed)
+    board, player = game.getInitBoard(), 1
+    history = []
+    while True:
+        empty = np.flatnonzero(board.ravel() == 0)
+        action = int(rng.choice(empty))
+        board, player = game.getNextState(board, player, action)
+        history.append((board, player, action))
+        if game.getGameEnded(board, player) != 0:
+            return history
+
+
+def test_game_ended_after_matches_full_scan():
+    for n in (6, 9, 19):
+        game = GobangGame(n)
+        for seed in range(5):
+            for board, player, action in play_random_game(game, seed):
+                assert game.getGameEnded(board, player) == game.getGameEndedAfter(board, player, action)
+
+
+def test_game_ended_after_lines():
+    game = GobangGame(19)
+    lines = [
+        [(3, y) for y in range(4, 10)],
+        [(x, 7) for x in range(10, 16)],
+        [(x, x) for x in range(13, 19)],
+        [(x, 18 - x) for x in range(0, 6)],
+    ]
+    for line in lines:
+        for last in range(len(line)):
+            board = game.getInitBoard()
+            for x, y in line:
+                board[x][y] = -1
+            x, y = line[last]
+            assert game.getGameEndedAfter(board, 1, game.n * x + y) == -1
+            board[line[-1 if last == 0 else 0]] = 0
+            assert game.getGameEndedAfter(board, 1, game.n * x + y) == 0
+
+
+def test_game_ended_after_draw():
+    game = GobangGame(6)
+    board = np.array([[1, 1, -1, -1, 1, 1]] * 3 + [[-1, -1, 1, 1, -1, -1]] * 3)
+    assert game.getGameEnded(board, 1) == 1e-4
+    assert game.getGameEndedAfter(board, 1, 0) == 1e-4
+    assert game.getGameEndedAfter(board, 1, game.n * game.n) == 1e-4
+
+
+def test_bitboard_matches_numpy_game():
+    for n, radius, zobrist in ((6, None, False), (9, None, True), (19, None, False), (6, 1, True), (19, 2, True)):
+        game = GobangGame(n, radius=radius, zobrist=zobrist)
+        bit_game = BitboardGobangGame(n, radius=radius, zobrist=zobrist)
+        for seed in range(5):
+            rng = np.random.RandomState(seed)
+            board, bit_board, player = game.getInitBoard(), bit_game.getInitBoard(), 1
+            while True:
+                canonical = game.getCanonicalForm(board, player)
+                bit_canonical = bit_game.getCanonicalForm(bit_board, player)
+                assert (canonical == np.asarray(bit_canonical)).all()
+                assert bit_game.fromArray(canonical) == bit_canonical
+                if zobrist:
+                    assert game.stringRepresentation(canonical) == bit_game.stringRepresentation(bit_canonical)
+                valids = game.getValidMoves(canonical, 1)
+                assert (valids == bit_game.getValidMoves(bit_canonical, 1)).all()
+
+                action = int(rng.choice(np.flatnonzero(valids)))
+                board, next_player = game.getNextState(board, player, action)
+                bit_board, bit_next_player = bit_game.getNextState(bit_board, player, action)
+                assert next_player == bit_next_player
+                player = next_player
+
+                ended = game.getGameEnded(board, player)
+                assert ended == bit_game.getGameEnded(bit_board, player)
+                assert ended == bit_game.getGameEndedAfter(bit_board, player, action)
+                if ended != 0:
+                    break
+
+
+def test_bitboard_symmetries_are_numpy():
+    game, bit_game = GobangGame(9), BitboardGobangGame(9)
+    board, player = game.getInitBoard(), 1
+    for action in (40, 41, 30, 12):
+        board, player = game.getNextState(board, player, action)
+    pi = list(np.random.RandomState(0).rand(game.getActionSize()))
+    for (b1, p1), (b2, p2) in zip(game.getSymmetries(board, pi),
+                                  bit_game.getSymmetries(bit_game.fromArray(board), pi)):
+        assert isinstance(b2, np.ndarray)
+        assert (b1 == b2).all() and p1 == p2
+
+
+def test_boards_stay_int8():
+    for game in (GobangGame(9), BitboardGobangGame(9)):
+        board, player = game.getInitBoard(), 1
+        for action in (40, 41, 31, 49):
+            board, player = game.getNextState(board, player, action)
+            canonical = game.getCanonicalForm(board, player)
+            assert np.asarray(canonical).dtype == np.int8
+            assert all(np.asarray(b).dtype == np.int8
+                       for b, _ in game.getSymmetries(canonical, np.ones(game.getActionSize())))
+
+
+def test_random_symmetries_match_get_symmetries():
+    game = GobangGame(7)
+    rng = np.random.RandomState(0)
+    boards = rng.randint(-1, 2, size=(50, 7, 7)).astype(np.int8)
+    pis = rng.dirichlet(np.ones(game.getActionSize()), size=50).astype(np.float32)
+    out_boards, out_pis = game.getRandomSymmetries(boards, pis, np.random.RandomState(1))
+    forms = np.random.RandomState(1).randint(8, size=50)
+    assert out_boards.dtype == np.int8 and out_pis.dtype == np.float32
+    for board, pi, form, out_board, out_pi in zip(boards, pis, forms, out_boards, out_pis):
+        expected_board, expected_pi = game.getSymmetries(board, pi)[form]
+        assert np.array_equal(out_board, expected_board)
+        assert np.array_equal(out_pi, np.array(expected_pi, dtype=np.float32))
+
+
+def test_symmetry_forms_match_get_symmetries():
+    game = GobangGame(7)
+    board = np.random.RandomState(0).randint(-1, 2, size=(7, 7)).astype(np.int8)
+    pi = np.random.RandomState(1).dirichlet(np.ones(game.getActionSize()))
+    forms, permutations = game.getSymmetryForms(board)
+    assert forms.dtype == np.int8
+    for (expected_board, expected_pi), form, permutation in zip(game.getSymmetries(board, pi), forms, permutations):
+        assert np.array_equal(form, expected_board)
+        assert np.array_equal(pi[permutation], expected_pi)
+
+
+def test_near_valid_moves():
+    game = GobangGame(19, radius=2)
+    board = game.getInitBoard()
+    board[0][0] = 1
+    board[10][12] = -1
+    valids = game.getValidMoves(board, 1)
+    expected = np.zeros((19, 19), dtype=int)
+    expected[0:3, 0:3] = 1
+    expected[8:13, 10:15] = 1
+    expected[0][0] = expected[10][12] = 0
+    assert (valids[:-1].reshape(19, 19) == expected).all() and valids[-1] == 0
+
+
+def test_valid_moves_after_matches_full():
+    for n, radius in ((6, 1), (9, 2), (19, 1), (19, 3)):
+        game = GobangGame(n, radius=radius)
+        for seed in range(5):
+            rng = np.random.RandomState(seed)
+            board, player = game.getInitBoard(), 1
+            valids = game.getValidMoves(board, player)
+            while game.getGameEnded(board, player) == 0:
+                # 一半的步数从全部空点中随机选择，制造远离已有棋子的落点
+                if rng.rand() < 0.5:
+                    action = int(rng.choice(np.flatnonzero(valids)))
+                else:
+                    action = int(rng.choice(np.flatnonzero(board.ravel() == 0)))
+                board, player = game.getNextState(board, player, action)
+                valids = game.getValidMovesAfter(board, player, action, valids)
+                assert (valids == game.getValidMoves(board, player)).all()
+
+
+def test_zobrist_keys():
+    for game in (GobangGame(9, zobrist=True), BitboardGobangGame(9, zobrist=True)):
+        board, player = game.getInitBoard(), 1
+        keys = {game.stringRepresentation(board)}
+        for action in (40, 41, 30, 12, 13, 50):
+            board, player = game.getNextState(board, player, action)
+            keys.add(game.stringRepresentation(board))
+            keys.add(game.stringRepresentation(game.getCanonicalForm(board, -1)))
+        assert len(keys) == 13
+        assert all(isinstance(k, int) and 0 <= k < 2 ** 64 for k in keys)
+
+
+def test_verified_zobrist_keys():
+    game = BitboardGobangGame(9, zobrist=True, verifyKeys=True)
+    board, _ = game.getNextState(game.getInitBoard(), 1, 40)
+    key = game.stringRepresentation(board)
+    assert key == game.stringRepresentation(game.fromArray(np.asarray(board)))
+    # 构造一个 64 位键相同但棋子不同的"碰撞"，校验模式下必须视为不同局面
+    collision = ZobristKey(key.key, (0, 0))
+    table = {key: 'a'}
+    assert hash(collision) == hash(key) and collision not in table
+    table[collision] = 'b'
+    assert table[key] == 'a' and len(table) == 2
+
+    numpy_game = GobangGame(9, zobrist=True, verifyKeys=True)
+    numpy_key = numpy_game.stringRepresentation(np.asarray(board))
+    assert hash(numpy_key) == hash(key) and numpy_key.key == key.key
+
+
+def test_resnet_runs_on_any_board_size():
+    torch = pytest.importorskip('torch')
+    from utils import dotdict
+    from .pytorch.InferenceNNet import fold
+    from .pytorch.ResNet import ResNet
+
+    args = dotdict({'res_channels': 8, 'num_res_blocks': 2})
+    nnet = ResNet(GobangGame(19), args).eval()
+    other = ResNet(GobangGame(15), args).eval()
+    other.load_state_dict(nnet.state_dict())
+    for n, net in ((19, nnet), (15, other)):
+        game = GobangGame(n)
+        boards = torch.tensor(np.array([np.asarray(b, dtype=np.float32)
+                                        for b, _, _ in play_random_game(game, 0)[-4:]]))
+        with torch.no_grad():
+            pi, v = net(boards)
+            folded_pi, folded_v = fold(net)(boards)
+        assert pi.shape == (4, game.getActionSize()) and v.shape == (4, 1)
+        assert torch.allclose(pi.exp().sum(dim=1), torch.ones(4))
+        assert torch.allclose(pi, folded_pi, atol=1e-4) and torch.allclose(v, folded_v, atol=1e-5)
+
+
+def test_training_epochs_cover_every_example():
+    pytest.importorskip('torch')
+    from ReplayBuffer import ReplayBuffer
+    from .pytorch.NNet import ExampleDataset, EpochSampler
+
+    game = GobangGame(6)
+    rng = np.random.RandomState(0)
+    boards = rng.randint(-1, 2, size=(100, 6, 6)).astype(np.int8)
+    pis = rng.dirichlet(np.ones(game.getActionSize()), size=100).astype(np.float32)
+    vs = np.arange(100, dtype=np.float32)  # the value identifies the example
+
+    dataset = ExampleDataset(list(zip(boards, pis, vs)))
+    seen = np.concatenate([dataset[indices][2].numpy() for indices in EpochSampler(dataset, 16)])
+    assert len(seen) == 96 and len(set(seen)) == 96
+
+    buffer = ReplayBuffer((6, 6), game.getActionSize(), 100, 1, augment=game.getRandomSymmetries, symmetries=8)
+    buffer.appendArrays(boards, pis, vs)
+    dataset = ExampleDataset(buffer)
+    seen = np.concatenate([dataset[indices][2].numpy() for indices in EpochSampler(dataset, 16)])
+    assert len(seen) == 800 and (np.bincount(seen.astype(np.int64)) == 8).all()
+
+
+def test_inference_export_round_trip(tmp_path):
+    torch = pytest.importorskip('torch')
+    from .pytorch.NNet import NNetWrapper
+
+    torch.manual_seed(0)
+    game = GobangGame(6)
+    nnet = NNetWrapper(game)
+    boards = [np.asarray(b) for b, _, _ in play_random_game(game, 0)[-4:]]
+    pi, v = nnet.predict_batch(boards)
+    # int8 fc1 and fc2 drift by a few 1e-5 at most on the value
+    for quantize, atol in ((False, 1e-6), (True, 1e-3)):
+        nnet.save_inference(str(tmp_path), 'inference.pt', quantize)
+        loaded = NNetWrapper(game)
+        loaded.load_checkpoint(str(tmp_path), 'inference.pt')
+        loaded_pi, loaded_v = loaded.predict_batch(boards)
+        assert np.allclose(loaded_pi, pi, atol=atol) and np.allclose(loaded_v, v, atol=atol)
+        single_pi, single_v = loaded.predict(boards[0])
+        assert np.allclose(single_pi, pi[0], atol=atol) and np.allclose(single_v, v[0], atol=atol)
+        with pytest.raises(RuntimeError):
+            loaded.train(list(zip(boards, pi, v[:, 0])))
+
+
+def test_save_snapshot_is_a_checkpoint(tmp_path):
+    torch = pytest.importorskip('torch')
+    from .pytorch.NNet import NNetWrapper
+
+    torch.manual_seed(0)
+    game = GobangGame(6)
+    nnet = NNetWrapper(game)
+    snapshot = nnet.snapshot()
+    with torch.no_grad():
+        for p in nnet.nnet.parameters():
+            p.add_(1)  # the network moves on, the snapshot is what gets saved
+    nnet.save_snapshot(snapshot, str(tmp_path), 'checkpoint_1.pth.tar')
+    loaded = NNetWrapper(game)
+    loaded.load_checkpoint(str(tmp_path), 'checkpoint_1.pth.tar')
+    for name, value in loaded.nnet.state_dict().items():
+        assert torch.equal(value, snapshot[name])
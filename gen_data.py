@@ -13,6 +13,8 @@ from connect6.GobangGame import GobangGame as Game
 NUM_GAMES = 500 
 OUTPUT_FILE = "checkpoint_0.pth.tar"
 FOLDER = "./temp/"
+# 只存规范局面本身，不存 8 个对称形式；训练时由 ReplayBuffer 随机取对称（需在 main.py 里打开 lazySymmetries）
+LAZY_SYMMETRIES = False
 
 class LinearGreedyPlayer:
     def __init__(self, game):
@@ -45,12 +47,12 @@ class LinearGreedyPlayer:
                 
                 # A. 绝杀判定
                 next_b, _ = self.game.getNextState(board, 1, a)
-                if self.game.getGameEnded(next_b, 1) == 1:
+                if self.game.getGameEndedAfter(next_b, 1, a) == 1:
                     return a 
                 
                 # B. 必救判定
                 next_b_opp, _ = self.game.getNextState(board, -1, a)
-                if self.game.getGameEnded(next_b_opp, 1) == -1:
+                if self.game.getGameEndedAfter(next_b_opp, 1, a) == -1:
                     score = 200000 
                 else:
                     score = 0
@@ -115,11 +117,11 @@ def generate():
             
             pi = np.zeros(game.getActionSize())
             pi[action] = 1
-            sym = game.getSymmetries(canonical, pi)
+            sym = [(canonical, pi)] if LAZY_SYMMETRIES else game.getSymmetries(canonical, pi)
             for b, p in sym: ep_data.append([b, curPlayer, p])
             
             board, curPlayer = game.getNextState(board, curPlayer, action)
-            r = game.getGameEnded(board, 1)
+            r = game.getGameEndedAfter(board, 1, action)
             if r != 0:
                 for d in ep_data:
                     v = 1 if r == d[1] else -1
@@ -11,6 +11,8 @@ from connect6.GobangGame import GobangGame as Game
 NUM_GAMES = 50   # 改为50局，足够热启动验证了！
 OUTPUT_FILE = "checkpoint_0.pth.tar"
 FOLDER = "./temp/"
+# 只存规范局面本身，不存 8 个对称形式；训练时由 ReplayBuffer 随机取对称（需在 main.py 里打开 lazySymmetries）
+LAZY_SYMMETRIES = False
 
 class FastGreedyPlayer:
     def __init__(self, game):
@@ -45,11 +47,11 @@ class FastGreedyPlayer:
                 
                 # A. 绝杀 (Win)
                 next_b, _ = self.game.getNextState(board, 1, a)
-                if self.game.getGameEnded(next_b, 1) == 1: return a 
+                if self.game.getGameEndedAfter(next_b, 1, a) == 1: return a 
                 
                 # B. 必救 (Block)
                 next_b_opp, _ = self.game.getNextState(board, -1, a)
-                if self.game.getGameEnded(next_b_opp, 1) == -1:
+                if self.game.getGameEndedAfter(next_b_opp, 1, a) == -1:
                     score = 10000 
                 else:
                     # C. 快速评分 (只算进攻，防守弱化以提速)
@@ -122,11 +124,11 @@ def generate():
             
             pi = np.zeros(game.getActionSize())
             pi[action] = 1
-            sym = game.getSymmetries(canonical, pi)
+            sym = [(canonical, pi)] if LAZY_SYMMETRIES else game.getSymmetries(canonical, pi)
             for b, p in sym: ep_data.append([b, curPlayer, p])
             
             board, curPlayer = game.getNextState(board, curPlayer, action)
-            r = game.getGameEnded(board, 1)
+            r = game.getGameEndedAfter(board, 1, action)
             
             # 防止死循环：如果超过150手还没赢，强行平局结束
             if r != 0 or step > 150:
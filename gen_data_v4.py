@@ -17,6 +17,8 @@ except ImportError:
 NUM_GAMES = 100  # 先跑100局，确保能快速出结果
 OUTPUT_FILE = "checkpoint_0.pth.tar"
 FOLDER = "./temp/"
+# 只存规范局面本身，不存 8 个对称形式；训练时由 ReplayBuffer 随机取对称（需在 main.py 里打开 lazySymmetries）
+LAZY_SYMMETRIES = False
 
 class AgileGreedyPlayer:
     def __init__(self, game):
@@ -50,11 +52,11 @@ class AgileGreedyPlayer:
                 
                 # A. 绝杀 (Win in 1)
                 next_b, _ = self.game.getNextState(board, 1, a)
-                if self.game.getGameEnded(next_b, 1) == 1: return a 
+                if self.game.getGameEndedAfter(next_b, 1, a) == 1: return a 
                 
                 # B. 必救 (Block Win)
                 next_b_opp, _ = self.game.getNextState(board, -1, a)
-                if self.game.getGameEnded(next_b_opp, 1) == -1:
+                if self.game.getGameEndedAfter(next_b_opp, 1, a) == -1:
                     # 发现必救点，给予高分，但不直接返回，
                     # 因为可能存在既能必救又能进攻的双重好点
                     score = 50000 
@@ -133,11 +135,11 @@ def generate():
             
             pi = np.zeros(game.getActionSize())
             pi[action] = 1
-            sym = game.getSymmetries(canonical, pi)
+            sym = [(canonical, pi)] if LAZY_SYMMETRIES else game.getSymmetries(canonical, pi)
             for b, p in sym: ep_data.append([b, curPlayer, p])
             
             board, curPlayer = game.getNextState(board, curPlayer, action)
-            r = game.getGameEnded(board, 1)
+            r = game.getGameEndedAfter(board, 1, action)
             
             # 限制 120 手，防止死局
             if r != 0 or step > 120:
@@ -17,6 +17,8 @@ except ImportError:
 TOTAL_GAMES = 500  # 总目标局数
 OUTPUT_FILE = "checkpoint_0.pth.tar"
 FOLDER = "./temp/"
+# 只存规范局面本身，不存 8 个对称形式；训练时由 ReplayBuffer 随机取对称（需在 main.py 里打开 lazySymmetries）
+LAZY_SYMMETRIES = False
 
 class DrunkenPlayer:
     def __init__(self, game):
@@ -49,12 +51,12 @@ class DrunkenPlayer:
                 
                 # A. 绝杀 (Win)
                 next_b, _ = self.game.getNextState(board, 1, a)
-                if self.game.getGameEnded(next_b, 1) == 1: return a 
+                if self.game.getGameEndedAfter(next_b, 1, a) == 1: return a 
                 
                 # B. 必救 (Block) - 稍微降低权重，给进攻留机会
                 score = 0
                 next_b_opp, _ = self.game.getNextState(board, -1, a)
-                if self.game.getGameEnded(next_b_opp, 1) == -1:
+                if self.game.getGameEndedAfter(next_b_opp, 1, a) == -1:
                     score = 20000 
                 
                 # C. 评分
@@ -108,11 +110,11 @@ def worker_play_game(game_id):
         
         pi = np.zeros(game.getActionSize())
         pi[action] = 1
-        sym = game.getSymmetries(canonical, pi)
+        sym = [(canonical, pi)] if LAZY_SYMMETRIES else game.getSymmetries(canonical, pi)
         for b, p in sym: ep_data.append([b, curPlayer, p])
         
         board, curPlayer = game.getNextState(board, curPlayer, action)
-        r = game.getGameEnded(board, 1)
+        r = game.getGameEndedAfter(board, 1, action)
         
         # 限制步数，或者分出胜负
         if r != 0 or step > 150:
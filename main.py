@@ -16,17 +16,42 @@ coloredlogs.install(level='INFO')  # Change this to DEBUG to see more info.
 args = dotdict({
     'numIters': 1000,
     'numEps': 100,              # Number of complete self-play games to simulate during a new iteration.
+    'numSelfPlayWorkers': 1,    # Processes playing the self-play games (1 = play them in this process).
+    'coordinatorAddress': None, # (host, port) to hand out self-play to remote workers on (see selfplay_worker.py).
+    'coordinatorAuthkey': None, # Secret the remote workers must give to connect to the coordinator.
+    'remoteJobTimeout': 1800,   # Seconds a remote worker has to send back the episodes of a job before they are handed out again.
+    'remoteStallTimeout': 3600, # Stop learning with an error when no remote episode arrives for this many seconds.
+    'lockstepGames': 1,         # Self-play games each process plays at once, sharing batched network calls.
+    'pipeline': False,          # Play, train and pit at the same time: actors, a learner and an evaluator process.
+    'pipelineQueueSize': 0,     # Pipeline: self-play episodes waiting for the learner before the actors wait (0 = numEps).
+    'evalCacheSize': 0,         # Network evaluations self-play keeps for all games of an iteration, all symmetries as one (0 = none).
+    'evalCacheShared': False,   # One evaluation cache in shared memory for all self-play worker processes.
+    'seed': 0,                  # Base seed of the self-play workers' random number generators.
     'tempThreshold': 15,        #
     'updateThreshold': 0.6,     # During arena playoff, new neural net will be accepted if threshold or more of games are won.
     'maxlenOfQueue': 200000,    # Number of game examples to train the neural networks.
     'numMCTSSims': 25,          # Number of games moves for MCTS to simulate.
+    'mctsBatchSize': 1,         # Leaves NodeMCTS evaluates per batched network call (1 = one simulation at a time).
+    'virtualLoss': 1,           # Virtual loss added to the edges of a path while its leaf waits for the network.
+    'countReusedVisits': False, # NodeMCTS: visits carried over from the previous move count towards numMCTSSims.
     'arenaCompare': 40,         # Number of games to play during arena play to determine if new net will be accepted.
+    'numArenaWorkers': 1,       # Processes playing the arena games (1 = play them in this process).
+    'sprt': False,              # Stop the arena as soon as a sequential probability ratio test decides (arenaCompare games at most).
+    'sprtAlpha': 0.05,          # SPRT: chance of accepting a network that wins only updateThreshold - sprtDelta of decisive games.
+    'sprtBeta': 0.05,           # SPRT: chance of rejecting a network that wins updateThreshold + sprtDelta of decisive games.
+    'sprtDelta': 0.05,          # SPRT: half width of the indifference zone around updateThreshold.
     'cpuct': 1,
+    'nodeMCTS': False,          # Use the array-backed NodeMCTS instead of the dict-based MCTS (same results, faster).
+    'mctsMaxNodes': 0,          # MCTS: evict least recently visited states beyond this many (0 = no limit).
+    'mctsMaxBytes': 0,          # MCTS: same, for the estimated size of the tree in bytes (0 = no limit).
 
     'checkpoint': './temp/',
+    'keepCheckpoints': 0,       # Keep only the latest accepted checkpoint_<i> files (0 = keep all).
     'load_model': True,
     'load_folder_file': ('./temp','best.pth.tar'),
     'numItersForTrainExamplesHistory': 10,
+    'replayCapacity': 0,        # Examples the replay buffer holds (0 = maxlenOfQueue * numItersForTrainExamplesHistory).
+    'lazySymmetries': False,    # Store one form of every position and draw a random symmetry of it per training batch.
 
 })
 
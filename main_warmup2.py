@@ -73,12 +73,12 @@ class SmartGreedyPlayer:
                 
                 # A. 绝杀
                 next_b, _ = self.game.getNextState(board, 1, a)
-                if self.game.getGameEnded(next_b, 1) == 1: return a 
+                if self.game.getGameEndedAfter(next_b, 1, a) == 1: return a 
                 
                 # B. 必救
                 score = 0
                 next_b_opp, _ = self.game.getNextState(board, -1, a)
-                if self.game.getGameEnded(next_b_opp, 1) == -1:
+                if self.game.getGameEndedAfter(next_b_opp, 1, a) == -1:
                     score = 500000 
                 
                 # C. 评分 (进攻1.0 防守2.0 -> 稳健)
@@ -133,7 +133,7 @@ def worker_sim(seed):
             pi = np.zeros(g.getActionSize()); pi[a] = 1
             for sb, sp in g.getSymmetries(can, pi): ep.append([sb, cur, sp])
             b, cur = g.getNextState(b, cur, a)
-            r = g.getGameEnded(b, 1)
+            r = g.getGameEndedAfter(b, 1, a)
             if r!=0 or step>150:
                 if r!=0 and r!=1e-4:
                     res = []
@@ -28,6 +28,7 @@ class NNetWrapper(NeuralNet):
         self.nnet = onnet(game, args)
         self.board_x, self.board_y = game.getBoardSize()
         self.action_size = game.getActionSize()
+        self.inputs = None  # preallocated float32 input, see inputArray
 
     def train(self, examples):
         """
@@ -47,13 +48,37 @@ class NNetWrapper(NeuralNet):
         start = time.time()
 
         # preparing input
-        board = board[np.newaxis, :, :]
+        board = self.inputArray(np.asarray(board))
 
-        # run
-        pi, v = self.nnet.model.predict(board, verbose=False)
+        # run: predict_on_batch skips the input pipeline model.predict builds on every call
+        pi, v = self.nnet.model.predict_on_batch(board)
 
         #print('PREDICTION TIME TAKEN : {0:03f}'.format(time.time()-start))
-        return pi[0], v[0]
+        return np.asarray(pi[0]), np.asarray(v[0])
+
+    def predict_batch(self, boards):
+        """
+        boards: list of np arrays with boards, evaluated in one forward pass
+        """
+        boards = self.inputArray(np.stack([np.asarray(board) for board in boards]))
+        pi, v = self.nnet.model.predict_on_batch(boards)
+        return np.asarray(pi), np.asarray(v)
+
+    def inputArray(self, boards):
+        """
+        boards: array of boards
+
+        Returns the boards converted to float32 in one copy into a
+        preallocated input array, grown when needed, which the returned array
+        is a view of until the next call.
+        """
+        boards = boards.reshape(-1, self.board_x, self.board_y)
+        count = len(boards)
+        if self.inputs is None or len(self.inputs) < count:
+            self.inputs = np.empty((max(count, args.batch_size), self.board_x, self.board_y), dtype=np.float32)
+        inputs = self.inputs[:count]
+        inputs[...] = boards
+        return inputs
 
     def save_checkpoint(self, folder='checkpoint', filename='checkpoint.pth.tar'):
         # change extension
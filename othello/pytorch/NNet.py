@@ -29,10 +29,36 @@ class NNetWrapper(NeuralNet):
         self.nnet = onnet(game, args)
         self.board_x, self.board_y = game.getBoardSize()
         self.action_size = game.getActionSize()
+        self.inputs = None  # preallocated float input, see inputTensor
 
         if args.cuda:
             self.nnet.cuda()
 
+    def inputTensor(self, boards):
+        """
+        boards: array of boards (anything np.asarray stacks into one)
+
+        Returns the boards as a float tensor. They are converted to float in
+        one copy into a preallocated input tensor, grown when needed, which
+        the returned tensor is a view of until the next call. With cuda the
+        input tensor is pinned and copied to the GPU asynchronously.
+        """
+        boards = np.ascontiguousarray(boards).reshape(-1, self.board_x, self.board_y)
+        count = len(boards)
+        if self.inputs is None or len(self.inputs) < count:
+            self.inputs = torch.empty((max(count, args.batch_size), self.board_x, self.board_y),
+                                      dtype=torch.float32, pin_memory=args.cuda)
+        inputs = self.inputs[:count]
+        inputs.copy_(torch.from_numpy(boards))
+        if args.cuda:
+            inputs = inputs.cuda(non_blocking=True)
+        return inputs
+
+    def evalMode(self):
+        # train() leaves the network in training mode, switch back only then
+        if self.nnet.training:
+            self.nnet.eval()
+
     def train(self, examples):
         """
         examples: list of examples, each example is of form (board, pi, v)
@@ -83,15 +109,24 @@ class NNetWrapper(NeuralNet):
         start = time.time()
 
         # preparing input
-        board = torch.FloatTensor(board.astype(np.float64))
-        if args.cuda: board = board.contiguous().cuda()
-        board = board.view(1, self.board_x, self.board_y)
-        self.nnet.eval()
+        board = self.inputTensor(board)
+        self.evalMode()
         with torch.no_grad():
             pi, v = self.nnet(board)
 
         # print('PREDICTION TIME TAKEN : {0:03f}'.format(time.time()-start))
-        return torch.exp(pi).data.cpu().numpy()[0], v.data.cpu().numpy()[0]
+        return torch.exp(pi[0]).cpu().numpy(), v[0].cpu().numpy()
+
+    def predict_batch(self, boards):
+        """
+        boards: list of np arrays with boards, evaluated in one forward pass
+        """
+        boards = self.inputTensor(np.stack([np.asarray(board) for board in boards]))
+        self.evalMode()
+        with torch.no_grad():
+            pi, v = self.nnet(boards)
+
+        return torch.exp(pi).cpu().numpy(), v.cpu().numpy()
 
     def loss_pi(self, targets, outputs):
         return -torch.sum(targets * outputs) / targets.size()[0]
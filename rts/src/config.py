@@ -509,6 +509,12 @@ class Configuration:
             self.save_train_examples = save_train_examples
             self.load_train_examples = load_train_examples
 
+            self.replayBoardDtype = 'int32'  # health, gold and timeouts do not fit in int8
+
+        def get(self, name, default=None):
+            # Coach reads its optional arguments with args.get, as from a dotdict
+            return getattr(self, name, default)
+
     class BoardTile:
         def __init__(self,
                      player: int,
@@ -0,0 +1,49 @@
+"""
+Plays self-play episodes for a Coach running with args.coordinatorAddress,
+on this machine, until the coordinator stops:
+
+    python selfplay_worker.py HOST:PORT --authkey KEY --processes 4
+
+The game, the network and the search args all come from the coordinator;
+the network classes must be importable here as they are there (run it from
+a checkout of the same code).
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+
+import coloredlogs
+
+from Coach import remoteSelfPlayWorker
+
+log = logging.getLogger(__name__)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('address', help='HOST:PORT of the coordinator')
+    parser.add_argument('--authkey', default=os.environ.get('SELFPLAY_AUTHKEY'),
+                        help='args.coordinatorAuthkey of the coordinator (default: $SELFPLAY_AUTHKEY)')
+    parser.add_argument('--processes', type=int, default=1, help='workers to run on this machine')
+    opts = parser.parse_args()
+    if not opts.authkey:
+        parser.error('--authkey or $SELFPLAY_AUTHKEY is needed')
+
+    coloredlogs.install(level='INFO')
+    if opts.processes == 1:
+        remoteSelfPlayWorker(opts.address, opts.authkey)
+        return
+    # one network thread per worker, the workers use the cores
+    context = multiprocessing.get_context('spawn')
+    processes = [context.Process(target=remoteSelfPlayWorker, args=(opts.address, opts.authkey, 1))
+                 for _ in range(opts.processes)]
+    for process in processes:
+        process.start()
+    log.info(f'Started {opts.processes} self-play workers for {opts.address}')
+    for process in processes:
+        process.join()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""
+Tests for Arena.py, with simple deterministic players and the fake network
+of test_mcts.py:
+
+    python -m pytest test_arena.py
+"""
+
+import unittest
+
+import numpy as np
+
+from Arena import Arena
+from MCTS import MCTSPlayerSpec
+from connect6.GobangGame import GobangGame
+from test_mcts import FakeNNet
+from utils import dotdict
+
+
+class OrderedPlayerSpec(object):
+    """Builds a player that plays the valid move with the lowest (or highest)
+    action number."""
+
+    def __init__(self, last=False):
+        self.last = last
+
+    def build(self, game):
+        def play(board):
+            moves = np.flatnonzero(game.getValidMoves(board, 1))
+            return int(moves[-1] if self.last else moves[0])
+        return play
+
+
+class TestParallelArena(unittest.TestCase):
+
+    def test_same_results_as_serial(self):
+        game = GobangGame(6)
+        # with these two players the second mover always wins, so every game
+        # counts towards the player that did not start it
+        serial = Arena(OrderedPlayerSpec(), OrderedPlayerSpec(last=True), game).playGames(6)
+        parallel = Arena(OrderedPlayerSpec(), OrderedPlayerSpec(last=True), game).playGames(6, numWorkers=2)
+        self.assertEqual(parallel, serial)
+        self.assertEqual(serial, (3, 3, 0))
+
+    def test_stop(self):
+        game = GobangGame(6)
+        stops = []
+
+        def stop(oneWon, twoWon, draws):
+            stops.append((oneWon, twoWon, draws))
+            return oneWon + twoWon + draws == 3
+
+        # the starting player alternates, and the second mover always wins
+        result = Arena(OrderedPlayerSpec(), OrderedPlayerSpec(last=True), game).playGames(10, stop=stop)
+        self.assertEqual(result, (1, 2, 0))
+        self.assertEqual(stops, [(0, 1, 0), (1, 1, 0), (1, 2, 0)])
+
+        result = Arena(OrderedPlayerSpec(), OrderedPlayerSpec(last=True), game).playGames(
+            10, numWorkers=2, stop=lambda *counts: sum(counts) == 3)
+        self.assertEqual(sum(result), 3)
+
+    def test_mcts_players(self):
+        game = GobangGame(6)
+        args = dotdict({'numMCTSSims': 10, 'cpuct': 1.0, 'nodeMCTS': True})
+        arena = Arena(MCTSPlayerSpec(FakeNNet, args), MCTSPlayerSpec(FakeNNet, args), game)
+        oneWon, twoWon, draws = arena.playGames(4, numWorkers=2)
+        self.assertEqual(oneWon + twoWon + draws, 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
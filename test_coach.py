@@ -0,0 +1,353 @@
+"""
+Tests for the self-play side of Coach.py, with the fake network of
+test_mcts.py:
+
+    python -m pytest test_coach.py
+"""
+
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from Coach import SPRT, CheckpointWriter, Coach, LockstepSelfPlay, SelfPlayer, SelfPlayWorkers, episodeSeed
+from NeuralNet import NeuralNet
+from connect6.GobangGame import GobangGame
+from test_mcts import FakeNNet
+from utils import dotdict
+
+
+def episode_key(examples):
+    return [(np.asarray(board, dtype=np.int8).tobytes(), tuple(np.float32(pi)), np.float32(v))
+            for board, pi, v in examples]
+
+
+class TestSelfPlayWorkers(unittest.TestCase):
+
+    def setUp(self):
+        self.game = GobangGame(6)
+        self.args = dotdict({'numEps': 5, 'numMCTSSims': 10, 'cpuct': 1.0, 'tempThreshold': 15,
+                             'maxlenOfQueue': 200000, 'numItersForTrainExamplesHistory': 2, 'numSelfPlayWorkers': 2, 'seed': 7})
+
+    def test_same_episodes_as_one_process(self):
+        player = SelfPlayer(self.game, FakeNNet(self.game), self.args)
+        expected = []
+        for episode in range(self.args.numEps):
+            np.random.seed(episodeSeed(self.args.seed, 3, episode))
+            player.mcts = player.newMCTS(player.nnet)
+            expected.append(episode_key(player.executeEpisode()))
+
+        workers = SelfPlayWorkers(self.game, player.nnet, self.args)
+        try:
+            actual = [episode_key(examples) for examples in workers.play(3, player.nnet, self.args.numEps)]
+            # the pool keeps running from one iteration to the next
+            again = [episode_key(examples) for examples in workers.play(3, player.nnet, self.args.numEps)]
+        finally:
+            workers.close()
+        self.assertEqual(sorted(actual), sorted(expected))
+        self.assertEqual(sorted(again), sorted(expected))
+        self.assertFalse(any(process.is_alive() for process in workers.processes))
+
+    def test_coach_self_play(self):
+        coach = Coach(self.game, FakeNNet(self.game), self.args)
+        coach.workers = SelfPlayWorkers(self.game, coach.nnet, self.args)
+        try:
+            examples = coach.selfPlay(1)
+        finally:
+            coach.workers.close()
+        # every position comes with its 8 symmetries
+        self.assertTrue(len(examples) > 0 and len(examples) % 8 == 0)
+        self.assertTrue(all(v in (1, -1, 1e-4, -1e-4) for _, _, v in examples))
+
+
+class TestLockstepSelfPlay(unittest.TestCase):
+
+    def test_same_episodes_as_execute_episode(self):
+        game = GobangGame(6)
+        args = dotdict({'numEps': 5, 'numMCTSSims': 10, 'cpuct': 1.0, 'tempThreshold': 15,
+                        'maxlenOfQueue': 200000, 'numItersForTrainExamplesHistory': 2, 'nodeMCTS': True, 'lockstepGames': 3})
+        nnet = FakeNNet(game)
+        coach = Coach(game, nnet, args)
+        expected = {}
+        for episode in range(args.numEps):
+            np.random.seed(100 + episode)
+            coach.mcts = coach.newMCTS(coach.nnet)
+            expected[episode] = episode_key(coach.executeEpisode())
+
+        nnet.batch_sizes = []
+        episodes = LockstepSelfPlay(game, nnet, args).play((e, 100 + e) for e in range(args.numEps))
+        actual = dict((episode, episode_key(examples)) for episode, examples in episodes)
+        self.assertEqual(actual, expected)
+        # the leaves of the three games are evaluated together
+        self.assertEqual(max(nnet.batch_sizes), 3)
+
+    def test_batched_leaves(self):
+        game = GobangGame(6)
+        args = dotdict({'numEps': 4, 'numMCTSSims': 16, 'cpuct': 1.0, 'tempThreshold': 15,
+                        'maxlenOfQueue': 200000, 'numItersForTrainExamplesHistory': 2, 'lockstepGames': 4, 'mctsBatchSize': 4})
+        nnet = FakeNNet(game)
+        examples = Coach(game, nnet, args).selfPlay(1)
+        self.assertTrue(len(examples) > 0 and len(examples) % 8 == 0)
+        self.assertTrue(max(nnet.batch_sizes) > 4)
+
+    def test_lazy_symmetries(self):
+        game = GobangGame(6)
+        args = dotdict({'numEps': 2, 'numMCTSSims': 10, 'cpuct': 1.0, 'tempThreshold': 15,
+                        'maxlenOfQueue': 800, 'numItersForTrainExamplesHistory': 2, 'lockstepGames': 2})
+        nnet = FakeNNet(game)
+        eager = LockstepSelfPlay(game, nnet, args).play((e, 100 + e) for e in range(2))
+        lazy = LockstepSelfPlay(game, nnet, dotdict(args, lazySymmetries=True)).play((e, 100 + e) for e in range(2))
+        for (_, expected), (_, actual) in zip(sorted(eager, key=lambda x: x[0]), sorted(lazy, key=lambda x: x[0])):
+            # of the 8 forms only the position itself (the last one, rot90 by 4) is kept
+            self.assertEqual(episode_key(actual), episode_key(expected[7::8]))
+
+        # a network whose train does not draw the symmetries is refused
+        with self.assertRaises(ValueError):
+            Coach(game, nnet, dotdict(args, lazySymmetries=True))
+        nnet.lazySymmetries = True
+        coach = Coach(game, nnet, dotdict(args, lazySymmetries=True))
+        buffer = coach.trainExamplesHistory
+        self.assertEqual((buffer.capacity, buffer.symmetries), (1600, 8))
+        buffer.append(coach.selfPlay(1))
+        boards, pis, vs = buffer.sample(64)
+        self.assertEqual(boards.dtype, np.int8)
+        self.assertTrue(np.allclose(pis.sum(axis=1), 1))
+
+    def test_workers(self):
+        game = GobangGame(6)
+        args = dotdict({'numEps': 4, 'numMCTSSims': 10, 'cpuct': 1.0, 'tempThreshold': 15,
+                        'maxlenOfQueue': 200000, 'numItersForTrainExamplesHistory': 2, 'lockstepGames': 2, 'numSelfPlayWorkers': 2})
+        nnet = FakeNNet(game)
+        expected = [episode_key(examples) for _, examples in LockstepSelfPlay(game, nnet, args).play(
+            (e, episodeSeed(0, 1, e)) for e in range(args.numEps))]
+        workers = SelfPlayWorkers(game, nnet, args)
+        try:
+            actual = [episode_key(examples) for examples in workers.play(1, nnet, args.numEps)]
+        finally:
+            workers.close()
+        self.assertEqual(sorted(actual), sorted(expected))
+
+
+class TestTrainExamples(unittest.TestCase):
+
+    def test_save_and_load(self):
+        game = GobangGame(6)
+        with tempfile.TemporaryDirectory() as folder:
+            args = dotdict({'numEps': 2, 'numMCTSSims': 5, 'cpuct': 1.0, 'tempThreshold': 15,
+                            'maxlenOfQueue': 200000, 'numItersForTrainExamplesHistory': 2,
+                            'checkpoint': folder, 'load_folder_file': (folder, 'checkpoint_0.pth.tar')})
+            coach = Coach(game, FakeNNet(game), args)
+            iterations = [coach.selfPlay(i) for i in range(3)]
+            for examples in iterations:
+                coach.trainExamplesHistory.append(examples)
+                coach.saveTrainExamples()
+
+            loaded = Coach(game, FakeNNet(game), args)
+            loaded.loadTrainExamples()
+            self.assertEqual(loaded.trainExamplesHistory.numIterations(), 2)
+            self.assertEqual(episode_key(loaded.trainExamplesHistory),
+                             episode_key(iterations[1]) + episode_key(iterations[2]))
+
+            # a resumed run adds its iterations after those of the first run
+            resumed = loaded.selfPlay(3)
+            loaded.trainExamplesHistory.append(resumed)
+            loaded.saveTrainExamples()
+            store = coach.getExampleStore(folder)
+            self.assertEqual([shard['iteration'] for shard in store.shards], [0, 1, 2, 3])
+            again = Coach(game, FakeNNet(game), args)
+            again.loadTrainExamples()
+            self.assertEqual(episode_key(again.trainExamplesHistory),
+                             episode_key(iterations[2]) + episode_key(resumed))
+
+            # files written before the example store hold a list of deques
+            shutil.rmtree(os.path.join(folder, 'examples'))
+            with open(os.path.join(folder, 'checkpoint_0.pth.tar.examples'), 'wb') as f:
+                pickle.dump(iterations, f)
+            loaded.loadTrainExamples()
+            self.assertEqual(episode_key(loaded.trainExamplesHistory),
+                             episode_key(iterations[1]) + episode_key(iterations[2]))
+
+
+class WeightsNNet(FakeNNet):
+    """FakeNNet with weights, saved as two files like the keras wrappers do."""
+
+    def __init__(self, game):
+        super(WeightsNNet, self).__init__(game)
+        self.weights = np.zeros(3)
+
+    def snapshot(self):
+        return self.weights.copy()
+
+    def restore(self, snapshot):
+        self.weights = snapshot.copy()
+
+    def train(self, examples):
+        self.weights += 1
+        self.trained = len(examples)
+
+    def save_checkpoint(self, folder='checkpoint', filename='checkpoint.pth.tar'):
+        self.save_snapshot(self.weights, folder, filename)
+
+    def save_snapshot(self, snapshot, folder='checkpoint', filename='checkpoint.pth.tar'):
+        if snapshot[0] < 0:
+            raise IOError('disk full')
+        np.save(os.path.join(folder, filename + '.npy'), snapshot)
+        with open(os.path.join(folder, filename), 'w') as f:
+            f.write(filename + '.npy')
+
+
+class FirstMoveNNet(WeightsNNet):
+    """WeightsNNet that puts all of its policy on the first valid move. On a
+    6x6 board with lines of 3 the player that starts then always wins, so
+    an arena of two games always ends even."""
+
+    def __init__(self, game):
+        super(FirstMoveNNet, self).__init__(game)
+        self.game = game
+
+    def predict(self, board):
+        pi = np.zeros(self.action_size, dtype=np.float32)
+        pi[np.argmax(self.game.getValidMoves(board, 1))] = 1
+        return pi, np.zeros(1, dtype=np.float32)
+
+
+class H5NNet(WeightsNNet):
+    """WeightsNNet with the default snapshot, saved under another extension
+    like the keras wrappers do."""
+
+    def snapshot(self):
+        return NeuralNet.snapshot(self)
+
+    def restore(self, snapshot):
+        NeuralNet.restore(self, snapshot)
+
+    def save_snapshot(self, snapshot, folder, filename):
+        NeuralNet.save_snapshot(self, snapshot, folder, filename)
+
+    def save_checkpoint(self, folder='checkpoint', filename='checkpoint.pth.tar'):
+        np.save(os.path.join(folder, filename.split('.')[0] + '.h5.npy'), self.weights)
+
+    def load_checkpoint(self, folder='checkpoint', filename='checkpoint.pth.tar'):
+        self.weights = np.load(os.path.join(folder, filename.split('.')[0] + '.h5.npy'))
+
+
+class TestCheckpointWriter(unittest.TestCase):
+
+    def test_writes_in_background(self):
+        game = GobangGame(6)
+        nnet = WeightsNNet(game)
+        with tempfile.TemporaryDirectory() as folder:
+            with open(os.path.join(folder, 'checkpoint_0.pth.tar.examples'), 'wb') as f:
+                f.write(b'examples of an older version')
+            writer = CheckpointWriter(keep=2)
+            for i in range(1, 5):
+                nnet.weights[:] = i
+                writer.save(nnet, folder, 'checkpoint_%d.pth.tar' % i)
+                writer.save(nnet, folder, 'best.pth.tar')
+            nnet.weights[:] = 10  # saved networks are snapshots, later changes are not written
+            writer.close()
+
+            # only the latest two checkpoints written are kept, no partial folder is left
+            self.assertEqual(sorted(os.listdir(folder)),
+                             ['best.pth.tar', 'best.pth.tar.npy', 'checkpoint_0.pth.tar.examples',
+                              'checkpoint_3.pth.tar', 'checkpoint_3.pth.tar.npy',
+                              'checkpoint_4.pth.tar', 'checkpoint_4.pth.tar.npy'])
+            np.testing.assert_array_equal(np.load(os.path.join(folder, 'best.pth.tar.npy')), [4, 4, 4])
+            np.testing.assert_array_equal(np.load(os.path.join(folder, 'checkpoint_3.pth.tar.npy')), [3, 3, 3])
+
+    def test_default_save_snapshot(self):
+        nnet = H5NNet(GobangGame(6))
+        with tempfile.TemporaryDirectory() as folder:
+            writer = CheckpointWriter()
+            nnet.weights[:] = 5
+            writer.save(nnet, folder, 'checkpoint_1.pth.tar')
+            nnet.weights[:] = 6
+            writer.close()
+            self.assertEqual(os.listdir(folder), ['checkpoint_1.h5.npy'])
+            nnet.load_checkpoint(folder, 'checkpoint_1.pth.tar')
+            np.testing.assert_array_equal(nnet.weights, [5, 5, 5])
+
+    def test_failed_write(self):
+        game = GobangGame(6)
+        nnet = WeightsNNet(game)
+        with tempfile.TemporaryDirectory() as folder:
+            writer = CheckpointWriter()
+            nnet.weights[:] = -1
+            writer.save(nnet, folder, 'checkpoint_1.pth.tar')
+            nnet.weights[:] = 2
+            writer.save(nnet, folder, 'checkpoint_2.pth.tar')
+            writer.flush()
+            # the failed checkpoint leaves nothing behind and the next one is written
+            self.assertEqual(writer.errors, ['checkpoint_1.pth.tar'])
+            self.assertEqual(sorted(os.listdir(folder)), ['checkpoint_2.pth.tar', 'checkpoint_2.pth.tar.npy'])
+            writer.close()
+
+
+class TestPipeline(unittest.TestCase):
+
+    def test_learn(self):
+        game = GobangGame(6, 3)
+        with tempfile.TemporaryDirectory() as folder:
+            args = dotdict({'numIters': 3, 'numEps': 2, 'numMCTSSims': 3, 'cpuct': 1.0, 'tempThreshold': 15,
+                            'maxlenOfQueue': 200000, 'numItersForTrainExamplesHistory': 2,
+                            'arenaCompare': 2, 'updateThreshold': 0.0, 'checkpoint': folder,
+                            'pipeline': True, 'numSelfPlayWorkers': 2})
+            nnet = FirstMoveNNet(game)
+            coach = Coach(game, nnet, args)
+            with self.assertLogs('Coach', level='INFO') as logs:
+                coach.learn()
+
+            # one shard per iteration, the buffer keeping the latest two
+            store = coach.getExampleStore(folder)
+            self.assertEqual([shard['iteration'] for shard in store.shards], [0, 1, 2])
+            self.assertEqual(coach.trainExamplesHistory.numIterations(), 2)
+            self.assertEqual(nnet.trained, len(coach.trainExamplesHistory))
+            np.testing.assert_array_equal(nnet.weights, [3, 3, 3])
+            # the arenas end even, which updateThreshold 0 accepts: every network
+            # evaluated (the first always is, a later one may find the evaluator
+            # busy) is written, best being the latest
+            evaluated = [int(line.split('Iter #')[1].split()[0]) for line in logs.output if 'NEW/PREV WINS' in line]
+            self.assertEqual(evaluated[0], 1)
+            self.assertFalse(any('REJECTING' in line for line in logs.output))
+            accepted = sorted(int(name.split('_')[1].split('.')[0]) for name in os.listdir(folder)
+                              if name.startswith('checkpoint_') and name.endswith('.npy'))
+            self.assertEqual(accepted, sorted(evaluated))
+            for i in accepted:
+                np.testing.assert_array_equal(np.load(os.path.join(folder, 'checkpoint_%d.pth.tar.npy' % i)), [i] * 3)
+            np.testing.assert_array_equal(np.load(os.path.join(folder, 'best.pth.tar.npy')), [max(accepted)] * 3)
+
+
+class TestSPRT(unittest.TestCase):
+
+    def test_decisions(self):
+        sprt = SPRT(0.6, alpha=0.05, beta=0.05, delta=0.05)
+        self.assertIsNone(sprt.test(0, 0))
+        self.assertIsNone(sprt.test(6, 4))
+        # a clear winner or loser is decided long before 40 games
+        self.assertTrue(sprt.test(30, 5))
+        self.assertFalse(sprt.test(5, 15))
+        self.assertEqual(sprt.test(30, 5), sprt.llr(30, 5) >= sprt.upper)
+
+    def test_error_rates(self):
+        # a network exactly on the edge of either hypothesis is accepted with
+        # about the chosen error rate
+        rng = np.random.RandomState(0)
+        sprt = SPRT(0.6, alpha=0.1, beta=0.1, delta=0.1)
+        for p, wrong in ((0.5, True), (0.7, False)):
+            errors = 0
+            for _ in range(400):
+                wins = losses = 0
+                while sprt.test(wins, losses) is None:
+                    if rng.uniform() < p:
+                        wins += 1
+                    else:
+                        losses += 1
+                errors += sprt.test(wins, losses) is wrong
+            self.assertTrue(errors / 400.0 < 0.15)
+
+
+if __name__ == '__main__':
+    unittest.main()
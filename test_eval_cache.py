@@ -0,0 +1,117 @@
+"""
+Tests for EvalCache.py, with the fake network of test_mcts.py:
+
+    python -m pytest test_eval_cache.py
+"""
+
+import multiprocessing
+import unittest
+
+import numpy as np
+
+from Coach import Coach, SelfPlayWorkers
+from EvalCache import CachedNNet, EvalCache, SharedEvalCache, positionKey
+from connect6.GobangGame import GobangGame
+from test_mcts import FakeNNet
+from utils import dotdict
+
+
+def fill_cache(cache, start, count):
+    """Puts count entries in cache from another process."""
+    for i in range(start, start + count):
+        cache.put(positionKey(np.array([i]), 0), np.full(4, i, dtype=np.float32), float(i))
+    cache.close()
+
+
+class TestEvalCache(unittest.TestCase):
+
+    def test_lru(self):
+        cache = EvalCache(2)
+        keys = [positionKey(np.array([i]), 0) for i in range(3)]
+        cache.put(keys[0], np.zeros(3), 0.0)
+        cache.put(keys[1], np.ones(3), 1.0)
+        self.assertIsNotNone(cache.get(keys[0]))  # keys[1] is now the least recently used
+        cache.put(keys[2], np.ones(3), 2.0)
+        self.assertIsNone(cache.get(keys[1]))
+        self.assertEqual(cache.get(keys[2])[1], 2.0)
+        self.assertEqual(cache.counts(), (2, 1, 1, 2))
+
+    def test_symmetries_share_one_entry(self):
+        game = GobangGame(7)
+        nnet = FakeNNet(game)
+        cached = CachedNNet(game, nnet, EvalCache(100))
+        board = np.random.RandomState(0).randint(-1, 2, size=(7, 7)).astype(np.int8)
+        forms, permutations = game.getSymmetryForms(board)
+
+        # the network is asked once, for the form with the smallest bytes,
+        # and the policy of every form is the policy of board permuted
+        k = min(range(len(forms)), key=lambda j: forms[j].tobytes())
+        pi, v = FakeNNet(game).predict(forms[k])
+        boardPi, _ = cached.predict(board)
+        np.testing.assert_array_equal(boardPi[permutations[k]], pi)
+        for form, permutation in zip(forms, permutations):
+            cachedPi, cachedV = cached.predict(form)
+            np.testing.assert_array_equal(cachedPi, boardPi[permutation])
+            self.assertEqual(cachedV[0], v[0])
+            self.assertEqual(cachedPi.dtype, np.float32)
+        self.assertEqual(nnet.calls, 1)
+        self.assertEqual(cached.cache.counts()[:2], (8, 1))
+
+        # a new version of the network evaluates again
+        cached.setVersion(1)
+        cached.predict_batch([board, board])
+        self.assertEqual(nnet.calls, 2)
+
+    def test_shared(self):
+        cache = SharedEvalCache(8, 4)  # a single bucket
+        try:
+            process = multiprocessing.get_context('spawn').Process(target=fill_cache, args=(cache, 0, 8))
+            process.start()
+            process.join()
+            self.assertEqual(process.exitcode, 0)
+            for i in range(8):
+                pi, v = cache.get(positionKey(np.array([i]), 0))
+                np.testing.assert_array_equal(pi, [i] * 4)
+                self.assertEqual(v, i)
+            cache.get(positionKey(np.array([0]), 0))
+            # the least recently used entry makes way for a new one
+            cache.put(positionKey(np.array([8]), 0), np.zeros(4), 0.0)
+            self.assertIsNone(cache.get(positionKey(np.array([1]), 0)))
+            self.assertIsNotNone(cache.get(positionKey(np.array([0]), 0)))
+            self.assertEqual(cache.counts(), (10, 1, 1, 8))
+        finally:
+            cache.close()
+
+
+class TestSelfPlayCache(unittest.TestCase):
+
+    def setUp(self):
+        self.game = GobangGame(6)
+        self.args = dotdict({'numEps': 4, 'numMCTSSims': 10, 'cpuct': 1.0, 'tempThreshold': 15,
+                             'maxlenOfQueue': 200000, 'numItersForTrainExamplesHistory': 2, 'seed': 7,
+                             'evalCacheSize': 10000})
+
+    def test_games_share_evaluations(self):
+        coach = Coach(self.game, FakeNNet(self.game), self.args)
+        coach.selfPlay(1)
+        hits, misses, _, _ = coach.evalCache.counts()
+        # every game starts from the same positions
+        self.assertTrue(hits > 0)
+        # only the positions missing from the cache reach the network
+        self.assertEqual(coach.nnet.calls, misses)
+
+    def test_shared_by_workers(self):
+        self.args.update({'numSelfPlayWorkers': 2, 'evalCacheShared': True})
+        coach = Coach(self.game, FakeNNet(self.game), self.args)
+        coach.workers = SelfPlayWorkers(self.game, coach.nnet, self.args)
+        try:
+            coach.selfPlay(1)
+            hits, misses, _, entries = coach.workers.evalCache.counts()
+        finally:
+            coach.workers.close()
+        self.assertTrue(hits > 0)
+        self.assertTrue(0 < entries <= misses)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+"""
+Tests for ExampleStore.py:
+
+    python -m pytest test_example_store.py
+"""
+
+import os
+import pickle
+import tempfile
+import unittest
+from collections import deque
+
+import numpy as np
+
+from ExampleStore import ExampleStore, convert
+from ReplayBuffer import ReplayBuffer
+
+
+def make_arrays(rng, n, size=5, actions=26, dtype=np.int8):
+    boards = rng.randint(-1, 2, size=(n, size, size)).astype(dtype)
+    pis = np.zeros((n, actions), dtype=np.float32)
+    for pi in pis:
+        # sparse like a search policy, a few visited moves
+        moves = rng.choice(actions, size=3, replace=False)
+        pi[moves] = rng.dirichlet(np.ones(3))
+    vs = rng.choice([-1, 1], size=n).astype(np.float32)
+    return boards, pis, vs
+
+
+class TestExampleStore(unittest.TestCase):
+
+    def assert_same(self, actual, expected):
+        for a, e in zip(actual, expected):
+            np.testing.assert_array_equal(a, e)
+
+    def test_round_trip(self):
+        rng = np.random.RandomState(0)
+        with tempfile.TemporaryDirectory() as folder:
+            store = ExampleStore(folder)
+            iterations = [make_arrays(rng, n) for n in (30, 0, 17)]
+            for i, arrays in enumerate(iterations):
+                store.write(i, *arrays)
+
+            # a new store reads the index written by the first one
+            store = ExampleStore(folder)
+            self.assertEqual([shard['count'] for shard in store.shards], [30, 0, 17])
+            for shard, expected in zip(store.shards, iterations):
+                boards, pis, vs = store.read(shard)
+                self.assertEqual(boards.dtype, np.int8)
+                self.assert_same((boards, pis, vs), expected)
+
+            # an iteration written again replaces its shard
+            replacement = make_arrays(rng, 4)
+            store.write(1, *replacement)
+            self.assertEqual([shard['iteration'] for shard in store.shards], [0, 1, 2])
+            self.assert_same(store.read(store.shards[1]), replacement)
+
+    def test_append_after_existing_shards(self):
+        rng = np.random.RandomState(5)
+        with tempfile.TemporaryDirectory() as folder:
+            store = ExampleStore(folder)
+            self.assertEqual(store.append(*make_arrays(rng, 3)), 0)
+            store.write(4, *make_arrays(rng, 3))
+            appended = make_arrays(rng, 5)
+            # a store reopened on the folder numbers new shards after the latest
+            self.assertEqual(ExampleStore(folder).append(*appended), 5)
+            store = ExampleStore(folder)
+            self.assertEqual([shard['iteration'] for shard in store.shards], [0, 4, 5])
+            self.assert_same(store.read(store.shards[-1]), appended)
+
+    def test_boards_outside_bits(self):
+        rng = np.random.RandomState(1)
+        boards, pis, vs = make_arrays(rng, 10, dtype=np.int32)
+        boards[0, 0, 0] = 300
+        with tempfile.TemporaryDirectory() as folder:
+            store = ExampleStore(folder)
+            store.write(0, boards, pis, vs)
+            self.assertEqual(store.shards[0]['boardEncoding'], 'int32')
+            self.assert_same(store.read(store.shards[0]), (boards, pis, vs))
+
+    def test_load_window(self):
+        rng = np.random.RandomState(2)
+        with tempfile.TemporaryDirectory() as folder:
+            store = ExampleStore(folder)
+            iterations = [make_arrays(rng, 10 + i) for i in range(5)]
+            for i, arrays in enumerate(iterations):
+                store.write(i, *arrays)
+            buffer = ReplayBuffer((5, 5), 26, capacity=100, window=2)
+            store.load(buffer, 2)
+            self.assertEqual(buffer.numIterations(), 2)
+            self.assert_same(buffer.iteration(0), iterations[3])
+            self.assert_same(buffer.iteration(1), iterations[4])
+
+    def test_smaller_than_pickle(self):
+        boards, pis, vs = make_arrays(np.random.RandomState(3), 500, size=19, actions=362)
+        examples = list(zip(boards.astype(np.int64), pis.astype(np.float64), vs.tolist()))
+        with tempfile.TemporaryDirectory() as folder:
+            store = ExampleStore(folder)
+            store.write(0, boards, pis, vs)
+            path = os.path.join(folder, store.shards[0]['name'])
+            size = sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+            self.assertTrue(size * 20 < len(pickle.dumps(examples)))
+
+    def test_convert(self):
+        rng = np.random.RandomState(4)
+        iterations = [make_arrays(rng, n) for n in (6, 8, 5)]
+
+        def examples(arrays):
+            return [(board, pi, float(v)) for board, pi, v in zip(*arrays)]
+
+        with tempfile.TemporaryDirectory() as folder:
+            files = [os.path.join(folder, name) for name in ('flat', 'deques', 'buffer')]
+            # gen_data*.py: one flat list of examples
+            with open(files[0], 'wb') as f:
+                pickle.dump([list(example) for example in examples(iterations[0])], f)
+            # Coach before the replay buffer: a list of deques, one per iteration
+            with open(files[1], 'wb') as f:
+                pickle.dump([deque(examples(iterations[1]))], f)
+            # Coach before the example store: a ReplayBuffer
+            buffer = ReplayBuffer((5, 5), 26, capacity=100, window=2)
+            buffer.appendArrays(*iterations[2])
+            with open(files[2], 'wb') as f:
+                pickle.dump(buffer, f)
+
+            output = os.path.join(folder, 'examples')
+            convert(output, files)
+            store = ExampleStore(output)
+            self.assertEqual([shard['iteration'] for shard in store.shards], [0, 1, 2])
+            for shard, expected in zip(store.shards, iterations):
+                self.assert_same(store.read(shard), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
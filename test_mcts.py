@@ -0,0 +1,265 @@
+"""
+Tests for the search implementations in MCTS.py. They use a small fake
+network so they run without Pytorch or Keras:
+
+    python -m pytest test_mcts.py
+"""
+
+import sys
+import unittest
+import zlib
+
+import numpy as np
+
+from Arena import Arena
+from MCTS import ARRAY_BYTES, EDGE_BYTES, STATE_BYTES, MCTS, MCTSPlayer, NodeMCTS
+from NeuralNet import NeuralNet
+from connect6.BitboardGame import BitboardGobangGame
+from connect6.GobangGame import GobangGame
+from utils import dotdict
+
+
+class FakeNNet(NeuralNet):
+    """Deterministic network: policy and value are pseudo random functions of
+    the board, returned as float32 arrays like the real wrappers do."""
+
+    def __init__(self, game):
+        self.action_size = game.getActionSize()
+        self.batch_sizes = []
+        self.calls = 0
+
+    def predict_batch(self, boards):
+        self.batch_sizes.append(len(boards))
+        return super(FakeNNet, self).predict_batch(boards)
+
+    def predict(self, board):
+        self.calls += 1
+        rng = np.random.RandomState(zlib.crc32(np.asarray(board).tobytes()))
+        pi = rng.dirichlet(np.ones(self.action_size)).astype(np.float32)
+        v = np.array([rng.uniform(-1, 1)], dtype=np.float32)
+        return pi, v
+
+
+def play_with(mcts_class, game, args, moves, temp=0, seed=0):
+    """Plays moves moves with one search tree and returns the policy of every
+    move."""
+    np.random.seed(seed)
+    mcts = mcts_class(game, FakeNNet(game), args)
+    board, player = game.getInitBoard(), 1
+    policies = []
+    for _ in range(moves):
+        canonical = game.getCanonicalForm(board, player)
+        pi = mcts.getActionProb(canonical, temp=temp)
+        policies.append(pi)
+        action = int(np.argmax(pi))
+        board, player = game.getNextState(board, player, action)
+        if game.getGameEnded(board, player) != 0:
+            break
+    return policies
+
+
+class TestNodeMCTS(unittest.TestCase):
+
+    def assert_same_policies(self, game, moves, temp=0, numMCTSSims=30):
+        args = dotdict({'numMCTSSims': numMCTSSims, 'cpuct': 1.0})
+        expected = play_with(MCTS, game, args, moves, temp)
+        actual = play_with(NodeMCTS, game, args, moves, temp)
+        self.assertEqual(expected, actual)
+
+    def test_connect6(self):
+        self.assert_same_policies(GobangGame(9), 12)
+
+    def test_connect6_near_moves(self):
+        self.assert_same_policies(GobangGame(9, radius=1), 12, temp=1)
+
+    def test_connect6_bitboard(self):
+        self.assert_same_policies(BitboardGobangGame(9, zobrist=True), 12)
+
+    def test_connect6_to_the_end(self):
+        self.assert_same_policies(GobangGame(6), 36, numMCTSSims=200)
+
+
+class TestBatchedNodeMCTS(unittest.TestCase):
+
+    def test_batched_search(self):
+        game = GobangGame(9)
+        args = dotdict({'numMCTSSims': 64, 'cpuct': 1.0, 'mctsBatchSize': 8})
+        nnet = FakeNNet(game)
+        mcts = NodeMCTS(game, nnet, args)
+        board = game.getInitBoard()
+        for action in (40, 41):
+            board, _ = game.getNextState(board, 1, action)
+
+        pi = mcts.getActionProb(board, temp=1)
+        root = mcts.nodes[game.stringRepresentation(board)]
+        self.assertAlmostEqual(sum(pi), 1.0)
+        # the first simulation only expands the root
+        self.assertEqual(root.Ns, args.numMCTSSims - 1)
+        self.assertEqual(root.N.sum(), args.numMCTSSims - 1)
+        self.assertTrue(max(nnet.batch_sizes) > 1 and max(nnet.batch_sizes) <= 8)
+        for node in mcts.nodes.values():
+            self.assertEqual(node.vlTotal, 0)
+            self.assertFalse(node.evaluating)
+            if node.VL is not None:
+                self.assertFalse(node.VL.any())
+
+    def test_batch_of_one_matches_sequential(self):
+        game = GobangGame(9)
+        args = dotdict({'numMCTSSims': 30, 'cpuct': 1.0})
+        expected = play_with(NodeMCTS, game, args, 8, temp=1)
+        mcts = NodeMCTS(game, FakeNNet(game), args)
+        board, player = game.getInitBoard(), 1
+        for pi in expected:
+            canonical = game.getCanonicalForm(board, player)
+            for _ in range(args.numMCTSSims):
+                self.assertEqual(mcts.searchBatch(canonical, 1), 1)
+            node = mcts.nodes[game.stringRepresentation(canonical)]
+            counts = [0] * game.getActionSize()
+            for a, n in zip(node.actions, node.N):
+                counts[a] = int(n)
+            self.assertEqual([x / float(sum(counts)) for x in counts], pi)
+            board, player = game.getNextState(board, player, int(np.argmax(pi)))
+
+
+class TestTreeReuse(unittest.TestCase):
+
+    def reachable(self, root):
+        seen, stack = set(), [root]
+        while stack:
+            node = stack.pop()
+            if id(node) not in seen:
+                seen.add(id(node))
+                stack.extend(c for c in node.children or () if c is not None)
+        return seen
+
+    def test_advance_keeps_the_subtree(self):
+        game = GobangGame(9)
+        mcts = NodeMCTS(game, FakeNNet(game), dotdict({'numMCTSSims': 50, 'cpuct': 1.0}))
+        board = game.getInitBoard()
+        pi = mcts.getActionProb(board, temp=0)
+        action = int(np.argmax(pi))
+        root = mcts.root
+        child = root.children[int(np.searchsorted(root.actions, action))]
+        size = len(mcts.nodes)
+
+        mcts.advance(action)
+        self.assertIs(mcts.root, child)
+        self.assertTrue(0 < len(mcts.nodes) < size)
+        self.assertEqual(set(map(id, mcts.nodes.values())), self.reachable(child))
+
+        # the next search starts from the promoted node and keeps its visits
+        board, player = game.getNextState(board, 1, action)
+        visits = child.Ns
+        mcts.getActionProb(game.getCanonicalForm(board, player), temp=0)
+        self.assertIs(mcts.root, child)
+        self.assertEqual(child.Ns, visits + mcts.args.numMCTSSims)
+
+    def test_advance_to_unknown_state_drops_the_tree(self):
+        game = GobangGame(9)
+        mcts = NodeMCTS(game, FakeNNet(game), dotdict({'numMCTSSims': 10, 'cpuct': 1.0}))
+        mcts.getActionProb(game.getInitBoard(), temp=0)
+        mcts.advance(0)  # outside the centre, not a valid first move
+        self.assertIsNone(mcts.root)
+        self.assertEqual(mcts.nodes, {})
+
+    def test_count_reused_visits(self):
+        game = GobangGame(9)
+        args = dotdict({'numMCTSSims': 50, 'cpuct': 1.0, 'countReusedVisits': True})
+        nnet = FakeNNet(game)
+        mcts = NodeMCTS(game, nnet, args)
+        board, player = game.getInitBoard(), 1
+        for _ in range(6):
+            canonical = game.getCanonicalForm(board, player)
+            reused = mcts.getNode(canonical).Ns
+            calls = nnet.calls
+            action = int(np.argmax(mcts.getActionProb(canonical, temp=0)))
+            # a fresh root spends its first simulation on being expanded
+            expected = max(reused, args.numMCTSSims) if reused else args.numMCTSSims - 1
+            self.assertEqual(mcts.root.Ns, expected)
+            self.assertTrue(nnet.calls - calls <= args.numMCTSSims - reused)
+            mcts.advance(action)
+            board, player = game.getNextState(board, player, action)
+
+    def test_arena_players_follow_the_game(self):
+        game = GobangGame(6)
+        args = dotdict({'numMCTSSims': 20, 'cpuct': 1.0})
+        players = [MCTSPlayer(NodeMCTS(game, FakeNNet(game), args)) for _ in range(2)]
+
+        class Watcher(object):
+            def __init__(self, player):
+                self.player = player
+
+            def __call__(self, canonicalBoard):
+                # during a game the root follows the position being played
+                root = self.player.mcts.root
+                if root is not None and canonicalBoard.any():
+                    self.test.assertEqual(root.board.tolist(), canonicalBoard.tolist())
+                return self.player(canonicalBoard)
+
+            def notify(self, board, action):
+                self.player.notify(board, action)
+
+        watchers = [Watcher(player) for player in players]
+        for watcher in watchers:
+            watcher.test = self
+        oneWon, twoWon, draws = Arena(watchers[0], watchers[1], game).playGames(2)
+        self.assertEqual(oneWon + twoWon + draws, 2)
+
+
+class TestBoundedMCTS(unittest.TestCase):
+
+    def play(self, game, args, moves=20):
+        mcts = MCTS(game, FakeNNet(game), args)
+        board, player = game.getInitBoard(), 1
+        for _ in range(moves):
+            canonical = game.getCanonicalForm(board, player)
+            pi = mcts.getActionProb(canonical, temp=0)
+            self.check_tree(mcts)
+            board, player = game.getNextState(board, player, int(np.argmax(pi)))
+        return mcts
+
+    def check_tree(self, mcts):
+        self.assertEqual(set(mcts.Ps), set(mcts.Vs))
+        self.assertEqual(set(mcts.Ps), set(mcts.Ns))
+        self.assertTrue(set(mcts.Ps) <= set(mcts.Es))
+        self.assertEqual(set(mcts.Qsa), set(mcts.Nsa))
+        self.assertTrue(all(s in mcts.Ps for s, a in mcts.Qsa))
+        if mcts.bounded:
+            self.assertEqual(list(mcts.lru), [s for s in mcts.lru if s in mcts.Es])
+            self.assertEqual(len(mcts.lru), len(mcts.Es))
+
+    def test_large_budget_changes_nothing(self):
+        game = GobangGame(9)
+        args = dotdict({'numMCTSSims': 30, 'cpuct': 1.0})
+        expected = play_with(MCTS, game, args, 12)
+        actual = play_with(MCTS, game, dotdict(args, mctsMaxNodes=10 ** 6, mctsMaxBytes=10 ** 9), 12)
+        self.assertEqual(expected, actual)
+
+    def test_node_budget(self):
+        args = dotdict({'numMCTSSims': 30, 'cpuct': 1.0, 'mctsMaxNodes': 50})
+        mcts = self.play(GobangGame(9), args)
+        stats = mcts.stats()
+        self.assertEqual(stats['nodes'], 50)
+        self.assertTrue(stats['evictions'] > 0)
+
+    def test_byte_budget(self):
+        game = GobangGame(9)
+        unbounded = self.play(game, dotdict({'numMCTSSims': 30, 'cpuct': 1.0, 'mctsMaxBytes': 10 ** 9}))
+        budget = unbounded.stats()['bytes'] // 4
+        mcts = self.play(game, dotdict({'numMCTSSims': 30, 'cpuct': 1.0, 'mctsMaxBytes': budget}))
+        stats = mcts.stats()
+        self.assertTrue(0 < stats['bytes'] <= budget)
+        self.assertTrue(stats['evictions'] > 0)
+
+        # the running estimate matches a count from scratch
+        mcts.maxBytes = 0
+        mcts.maxNodes = len(mcts.Es) - 10
+        mcts.evict(None)
+        expected = sum(sys.getsizeof(s) + STATE_BYTES for s in mcts.Es)
+        expected += sum(2 * ARRAY_BYTES + mcts.Ps[s].nbytes + mcts.Vs[s].nbytes for s in mcts.Ps)
+        expected += EDGE_BYTES * len(mcts.Qsa)
+        self.assertEqual(mcts.residentBytes, expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
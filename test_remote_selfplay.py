@@ -0,0 +1,167 @@
+"""
+Tests for RemoteSelfPlay.py, with local worker processes and the fake
+network of test_mcts.py:
+
+    python -m pytest test_remote_selfplay.py
+"""
+
+import multiprocessing
+import pickle
+import threading
+import unittest
+from multiprocessing import AuthenticationError
+
+import numpy as np
+
+from Coach import Coach, episodeSeed, remoteSelfPlayWorker
+from RemoteSelfPlay import Coordinator, RemoteWorker, packExamples, unpackExamples
+from connect6.GobangGame import GobangGame
+from test_coach import episode_key
+from test_mcts import FakeNNet
+from utils import dotdict
+
+
+class TestRemoteSelfPlay(unittest.TestCase):
+
+    def setUp(self):
+        self.game = GobangGame(6)
+        self.args = dotdict({'numEps': 5, 'numMCTSSims': 10, 'cpuct': 1.0, 'tempThreshold': 15,
+                             'maxlenOfQueue': 200000, 'numItersForTrainExamplesHistory': 2, 'seed': 7,
+                             'coordinatorAddress': ('127.0.0.1', 0), 'coordinatorAuthkey': 'secret'})
+        self.nnet = FakeNNet(self.game)
+        self.coordinator = Coordinator(self.game, self.nnet, self.args)
+        self.address = self.coordinator.address
+
+    def tearDown(self):
+        self.coordinator.close()
+
+    def expected(self, iteration, episodes):
+        coach = Coach(self.game, FakeNNet(self.game), self.args)
+        expected = []
+        for episode in episodes:
+            np.random.seed(episodeSeed(self.args.seed, iteration, episode))
+            coach.mcts = coach.newMCTS(coach.nnet)
+            expected.append(episode_key(coach.executeEpisode()))
+        return expected
+
+    def play(self, iteration, numEps):
+        """Plays an iteration in a thread, returns the thread and the list
+        the examples of the episodes are added to."""
+        played = []
+        thread = threading.Thread(target=lambda: played.extend(
+            episode_key(examples) for examples in self.coordinator.play(iteration, self.nnet, numEps)))
+        thread.start()
+        return thread, played
+
+    def test_same_episodes_as_one_process(self):
+        context = multiprocessing.get_context('spawn')
+        processes = [context.Process(target=remoteSelfPlayWorker, args=(self.address, 'secret', 1))
+                     for _ in range(2)]
+        for process in processes:
+            process.start()
+        try:
+            for iteration in (1, 2):
+                actual = list(self.coordinator.play(iteration, self.nnet, self.args.numEps))
+                self.assertEqual(sorted(episode_key(examples) for examples in actual),
+                                 sorted(self.expected(iteration, range(self.args.numEps))))
+        finally:
+            self.coordinator.close()
+            for process in processes:
+                process.join(timeout=30)
+        self.assertFalse(any(process.is_alive() for process in processes))
+
+    def test_weights_fetched_once(self):
+        worker = RemoteWorker(self.address, 'secret')
+        worker.register()
+        jobs = worker.jobs(1)
+        for iteration in (1, 2):
+            thread, played = self.play(iteration, 2)
+            for _ in range(2):
+                _, episodes, weights = next(jobs)
+                worker.send(iteration, episodes[0], self.expected_examples(iteration, episodes[0]))
+            thread.join()
+            self.assertEqual(len(played), 2)
+        # the weights did not change from one iteration to the next
+        self.assertEqual(worker.downloads, 1)
+        worker.close()
+
+    def expected_examples(self, iteration, episode):
+        coach = Coach(self.game, FakeNNet(self.game), self.args)
+        np.random.seed(episodeSeed(self.args.seed, iteration, episode))
+        coach.mcts = coach.newMCTS(coach.nnet)
+        return coach.executeEpisode()
+
+    def test_lost_worker(self):
+        thread, played = self.play(1, 3)
+        lost = RemoteWorker(self.address, 'secret')
+        lost.register()
+        _, episodes, _ = next(lost.jobs(2))
+        self.assertEqual(episodes, [0, 1])
+        lost.close()
+
+        # the episodes of the lost worker are handed out again
+        worker = RemoteWorker(self.address, 'secret')
+        worker.register()
+        jobs = worker.jobs(1)
+        handed = []
+        while thread.is_alive() and len(handed) < 3:
+            _, episodes, _ = next(jobs)
+            handed += episodes
+            worker.send(1, episodes[0], self.expected_examples(1, episodes[0]))
+            # examples of an episode already received are dropped
+            worker.send(1, episodes[0], self.expected_examples(1, episodes[0]))
+        thread.join()
+        worker.close()
+        self.assertEqual(sorted(handed), [0, 1, 2])
+        self.assertEqual(sorted(played), sorted(self.expected(1, range(3))))
+
+    def restart(self, **args):
+        """Replaces the coordinator of setUp with one with args."""
+        self.coordinator.close()
+        self.args.update(args)
+        self.coordinator = Coordinator(self.game, self.nnet, self.args)
+        self.address = self.coordinator.address
+
+    def test_hung_worker(self):
+        self.restart(remoteJobTimeout=0.5)
+        thread, played = self.play(1, 3)
+        hung = RemoteWorker(self.address, 'secret')
+        hung.register()
+        _, episodes, _ = next(hung.jobs(2))
+        self.assertEqual(episodes, [0, 1])
+
+        # the hung worker stays connected, its episodes are handed out again after the deadline
+        worker = RemoteWorker(self.address, 'secret')
+        worker.register()
+        jobs = worker.jobs(1)
+        handed = []
+        while thread.is_alive() and len(handed) < 3:
+            _, episodes, _ = next(jobs)
+            handed += episodes
+            worker.send(1, episodes[0], self.expected_examples(1, episodes[0]))
+        thread.join()
+        # examples the hung worker sends too late are dropped
+        hung.send(1, 0, self.expected_examples(1, 0))
+        worker.close()
+        hung.close()
+        self.assertEqual(sorted(handed), [0, 1, 2])
+        self.assertEqual(sorted(played), sorted(self.expected(1, range(3))))
+
+    def test_stalled_workers(self):
+        self.restart(remoteStallTimeout=0.5)
+        with self.assertRaises(RuntimeError):
+            list(self.coordinator.play(1, self.nnet, 2))
+
+    def test_wrong_authkey(self):
+        with self.assertRaises(AuthenticationError):
+            RemoteWorker(self.address, 'wrong')
+
+    def test_pack_examples(self):
+        examples = self.expected_examples(1, 0)
+        data = packExamples(examples)
+        self.assertEqual(episode_key(unpackExamples(data)), episode_key(examples))
+        self.assertTrue(len(data) * 5 < len(pickle.dumps(examples)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+"""
+Tests for ReplayBuffer.py:
+
+    python -m pytest test_replay_buffer.py
+"""
+
+import pickle
+import unittest
+
+import numpy as np
+
+from ReplayBuffer import ReplayBuffer
+
+
+def make_iteration(rng, n, size=3, actions=10):
+    return [(rng.randint(-1, 2, size=(size, size)), rng.dirichlet(np.ones(actions)), float(rng.choice([-1, 1])))
+            for _ in range(n)]
+
+
+class TestReplayBuffer(unittest.TestCase):
+
+    def assert_holds(self, buffer, iterations):
+        expected = [example for iteration in iterations for example in iteration]
+        self.assertEqual(len(buffer), len(expected))
+        for (board, pi, v), (eboard, epi, ev) in zip(buffer, expected):
+            self.assertEqual(board.dtype, np.int8)
+            np.testing.assert_array_equal(board, eboard)
+            np.testing.assert_allclose(pi, epi, rtol=1e-6)
+            self.assertEqual(v, ev)
+
+    def test_window_and_capacity(self):
+        rng = np.random.RandomState(0)
+        buffer = ReplayBuffer((3, 3), 10, capacity=50, window=3)
+        held = []
+        for n in (20, 5, 17, 30, 0, 12, 50, 8):
+            iteration = make_iteration(rng, n)
+            buffer.append(iteration)
+            held.append(iteration)
+            # oldest first, until both the window and the capacity are respected
+            while len(held) > 3 or sum(map(len, held)) > 50:
+                held.pop(0)
+            self.assertEqual(buffer.numIterations(), len(held))
+            self.assert_holds(buffer, held)
+
+    def test_grows_up_to_capacity(self):
+        rng = np.random.RandomState(4)
+        buffer = ReplayBuffer((3, 3), 10, capacity=10 ** 12, window=2)
+        self.assertEqual(buffer.nbytes, 0)
+        iterations = [make_iteration(rng, n) for n in (6, 0, 5, 9)]
+        for iteration in iterations:
+            buffer.append(iteration)
+        self.assertEqual(len(buffer.vs), 14)
+        self.assert_holds(buffer, iterations[2:])
+
+        buffer = ReplayBuffer((3, 3), 10, capacity=12, window=3)
+        for n in (4, 5, 7):
+            buffer.append(make_iteration(rng, n))
+        self.assertEqual(len(buffer.vs), 12)
+
+    def test_iteration_larger_than_capacity(self):
+        rng = np.random.RandomState(1)
+        buffer = ReplayBuffer((3, 3), 10, capacity=10, window=3)
+        iteration = make_iteration(rng, 25)
+        buffer.append(iteration)
+        self.assert_holds(buffer, [iteration[-10:]])
+
+    def test_sample(self):
+        rng = np.random.RandomState(2)
+        buffer = ReplayBuffer((3, 3), 10, capacity=40, window=4)
+        for _ in range(6):
+            buffer.append(make_iteration(rng, 15))
+        boards, pis, vs = buffer.sample(64, rng)
+        self.assertEqual((boards.shape, boards.dtype), ((64, 3, 3), np.int8))
+        self.assertEqual((pis.shape, pis.dtype), ((64, 10), np.float32))
+        self.assertEqual((vs.shape, vs.dtype), ((64,), np.float32))
+        held = set(board.tobytes() + pi.tobytes() for board, pi, _ in buffer)
+        self.assertTrue(all(board.tobytes() + pi.tobytes() in held for board, pi in zip(boards, pis)))
+
+    def test_pickle(self):
+        rng = np.random.RandomState(3)
+        buffer = ReplayBuffer((3, 3), 10, capacity=1000, window=3)
+        iterations = [make_iteration(rng, 7) for _ in range(2)]
+        for iteration in iterations:
+            buffer.append(iteration)
+        data = pickle.dumps(buffer)
+        self.assertTrue(len(data) < buffer.capacity * (9 + 4 * 10 + 4) / 10)
+        copy = pickle.loads(data)
+        self.assertEqual(copy.numIterations(), 2)
+        self.assert_holds(copy, iterations)
+
+    def test_boards_must_fit_int8(self):
+        buffer = ReplayBuffer((3, 3), 10, capacity=10, window=3)
+        with self.assertRaises(ValueError):
+            buffer.append([(np.full((3, 3), 300), np.ones(10) / 10, 1)])
+
+    def test_augment(self):
+        rng = np.random.RandomState(5)
+        buffer = ReplayBuffer((3, 3), 10, capacity=50, window=3,
+                              augment=lambda boards, pis, rng: (-boards, pis[:, ::-1]), symmetries=2)
+        buffer.append(make_iteration(rng, 20))
+        self.assertEqual(buffer.numSamples(), 40)
+        boards, pis, vs = buffer.sample(8, np.random.RandomState(0))
+        i = np.random.RandomState(0).randint(20, size=8)
+        np.testing.assert_array_equal(boards, -buffer.boards[i])
+        np.testing.assert_array_equal(pis, buffer.pis[i][:, ::-1])
+        np.testing.assert_array_equal(vs, buffer.vs[i])
+
+
+if __name__ == '__main__':
+    unittest.main()